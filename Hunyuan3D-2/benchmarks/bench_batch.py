@@ -0,0 +1,86 @@
+"""
+Batched inference benchmark: meshes per minute of Hunyuan3DDiTFlowMatchingPipeline
+as a function of the batch size (the worker's HY3DGEN_BATCH_SIZE).
+
+Every batch is the given images cycled to the batch size, run with the worker's
+settings (run_me.PIPELINE_SETTINGS) unless overridden. The first call is a warm-up.
+
+    python benchmarks/bench_batch.py --images ../static/processed/*.png --batch-sizes 1 2 4 8
+"""
+import argparse
+import itertools
+import json
+import os
+import resource
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from run_me import PIPELINE_SETTINGS, get_pipeline
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 ** 2 if sys.platform == 'darwin' else rss / 1024
+
+
+def run_batch(pipeline, images, call_kwargs):
+    start = time.perf_counter()
+    meshes = pipeline(image=images, output_type='mesh', enable_pbar=False, **call_kwargs)
+    seconds = time.perf_counter() - start
+    if len(meshes) != len(images):
+        raise AssertionError(f"{len(images)} images in, {len(meshes)} meshes out")
+    failed = sum(mesh is None for mesh in meshes)
+    faces = [len(mesh.mesh_f) for mesh in meshes if mesh is not None]
+    return seconds, failed, faces
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', nargs='+', required=True, help="input images (background removed)")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--repeats', type=int, default=2)
+    parser.add_argument('--steps', type=int, help="override num_inference_steps")
+    parser.add_argument('--octree-resolution', type=int, help="override octree_resolution")
+    parser.add_argument('--output', help="write all runs as JSON here")
+    args = parser.parse_args()
+
+    call_kwargs = {k: v for k, v in PIPELINE_SETTINGS.items() if k != 'model'}
+    if args.steps:
+        call_kwargs['num_inference_steps'] = args.steps
+    if args.octree_resolution:
+        call_kwargs['octree_resolution'] = args.octree_resolution
+
+    pipeline = get_pipeline()
+    images = [str(Path(p).resolve()) for p in args.images]
+    run_batch(pipeline, images[:1], call_kwargs)  # warm-up: lazy inits, allocator, caches
+
+    runs = []
+    print(f"{'batch':>5} | {'best (s)':>8} | {'s/mesh':>7} | {'meshes/min':>10} | {'speed-up':>8} | "
+          f"{'peak RSS (MB)':>13} | failed")
+    baseline = None
+    for batch_size in args.batch_sizes:
+        batch = list(itertools.islice(itertools.cycle(images), batch_size))
+        times, failed = [], 0
+        for _ in range(args.repeats):
+            seconds, batch_failed, faces = run_batch(pipeline, batch, call_kwargs)
+            times.append(seconds)
+            failed += batch_failed
+            runs.append({'batch_size': batch_size, 'seconds': seconds, 'failed': batch_failed, 'faces': faces})
+        per_mesh = min(times) / batch_size
+        baseline = baseline or per_mesh
+        print(f"{batch_size:>5} | {min(times):8.1f} | {per_mesh:7.1f} | {60 / per_mesh:10.2f} | "
+              f"{baseline / per_mesh:7.2f}x | {peak_rss_mb():13.0f} | {failed}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'device': str(pipeline.device), 'cpu_count': os.cpu_count(), 'settings': call_kwargs,
+                       'runs': runs}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+End-to-end CPU latency report per pipeline stage (image encoding, diffusion, volume decoding,
+surface extraction, export) for:
+
+    fp16     the pipeline as loaded (from_pretrained's fp16 default), default threads
+    fp32     apply_cpu_profile with everything in fp32
+    profile  apply_cpu_profile: bf16 DiT/encoder where the CPU supports it, tuned threads
+    compile  profile + torch.compile(inductor) of the DiT (the warm-up pays the compilation)
+
+Every mode runs in a fresh process (thread pools and compiled graphs cannot be reset), with a
+short warm-up call first.
+
+    python benchmarks/bench_cpu_profile.py --image ../static/processed/gen2.png --output cpu_profile.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+MODES = ('fp16', 'fp32', 'profile', 'compile')
+# synchronize_timer names, in pipeline order
+STAGES = ('Encode cond', 'Diffusion Sampling', 'Volume decoding', 'Surface extraction', 'Export mesh')
+
+
+def run_mode(mode, image, steps, octree_resolution):
+    # The pipeline is tuned here, not by run_me, and encoding must not be served from the cache
+    os.environ['HY3DGEN_CPU_PROFILE'] = '0'
+    import torch
+    from run_me import PIPELINE_SETTINGS, get_pipeline
+    from hy3dgen.shapegen import apply_cpu_profile, export_mesh
+    from hy3dgen.shapegen.utils import collect_timings
+
+    pipeline = get_pipeline()
+    pipeline.disable_cond_cache()
+    if pipeline.device.type != 'cpu':
+        raise SystemExit(f"{pipeline.device} pipeline: run with CUDA_VISIBLE_DEVICES= on a CPU node")
+    if mode == 'fp32':
+        apply_cpu_profile(pipeline, dtype=torch.float32)
+    elif mode in ('profile', 'compile'):
+        apply_cpu_profile(pipeline, compile=mode == 'compile')
+
+    call_kwargs = {k: v for k, v in PIPELINE_SETTINGS.items() if k != 'model'}
+    call_kwargs.update(num_inference_steps=steps or call_kwargs['num_inference_steps'],
+                       octree_resolution=octree_resolution or call_kwargs['octree_resolution'])
+    warmup_start = time.perf_counter()
+    pipeline(image=image, output_type='latent', enable_pbar=False, **dict(call_kwargs, num_inference_steps=2))
+    warmup = time.perf_counter() - warmup_start
+
+    with tempfile.TemporaryDirectory() as tmp, collect_timings() as timings:
+        start = time.perf_counter()
+        mesh = pipeline(image=image, output_type='mesh', enable_pbar=False,
+                        generator=torch.Generator().manual_seed(0), **call_kwargs)[0]
+        if mesh is not None:
+            export_mesh(mesh, [os.path.join(tmp, 'mesh.glb'), os.path.join(tmp, 'mesh.stl')])
+        total = time.perf_counter() - start
+    return {
+        'mode': mode,
+        'total': total,
+        'warmup': warmup,
+        'stages': {name: ms / 1000 for name, ms in timings.items()},
+        'dtypes': {name: str(next(getattr(pipeline, name).parameters()).dtype)
+                   for name in ('model', 'conditioner', 'vae')},
+        'threads': [torch.get_num_threads(), torch.get_num_interop_threads()],
+        'faces': None if mesh is None else len(mesh.mesh_f),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', required=True, help="input image (background removed)")
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=list(MODES))
+    parser.add_argument('--steps', type=int, help="override num_inference_steps")
+    parser.add_argument('--octree-resolution', type=int, help="override octree_resolution")
+    parser.add_argument('--output', help="write all runs as JSON here")
+    parser.add_argument('--child', choices=list(MODES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    image = str(Path(args.image).resolve())
+
+    if args.child:
+        print(json.dumps(run_mode(args.child, image, args.steps, args.octree_resolution)))
+        return
+
+    runs = []
+    for mode in args.modes:
+        cmd = [sys.executable, __file__, '--child', mode, '--image', image]
+        if args.steps:
+            cmd += ['--steps', str(args.steps)]
+        if args.octree_resolution:
+            cmd += ['--octree-resolution', str(args.octree_resolution)]
+        out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+        run = json.loads(out.strip().splitlines()[-1])
+        runs.append(run)
+        print(f"{mode:>8}: {run['total']:.1f}s (warm-up {run['warmup']:.1f}s), dtypes {run['dtypes']}, "
+              f"threads {run['threads'][0]}/{run['threads'][1]}")
+
+    print()
+    print(f"{'stage (s)':>20} | " + " | ".join(f"{run['mode']:>8}" for run in runs))
+    for stage in STAGES:
+        print(f"{stage:>20} | " + " | ".join(f"{run['stages'].get(stage, float('nan')):8.2f}" for run in runs))
+    print(f"{'total':>20} | " + " | ".join(f"{run['total']:8.2f}" for run in runs))
+    baseline = runs[0]['total']
+    print(f"{'speed-up':>20} | " + " | ".join(f"{baseline / run['total']:7.2f}x" for run in runs))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'cpu_count': os.cpu_count(), 'runs': runs}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Mesh export benchmark: trimesh's two generic passes (what img_to_3d used to do) vs the
+single-pass vectorized exporter, on synthetic marching-cubes-sized meshes.
+
+Also checks the outputs: the STL triangles must match the flipped faces exactly and,
+when trimesh is installed, both files must load back with the same geometry.
+
+    python benchmarks/bench_export.py --faces 200000 500000 1000000 2000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from hy3dgen.shapegen.exporters import export_mesh, mesh_arrays, STL_DTYPE
+from hy3dgen.shapegen.models.autoencoders.surface_extractors import Latent2MeshOutput
+
+
+def torus_mesh(num_faces, radius=0.6, tube=0.25):
+    """Closed torus with about `num_faces` triangles, in the layout surface extraction returns."""
+    n = max(int(np.sqrt(num_faces / 2)), 3)
+    u, v = np.meshgrid(np.linspace(0, 2 * np.pi, n, endpoint=False),
+                       np.linspace(0, 2 * np.pi, n, endpoint=False), indexing='ij')
+    vertices = np.stack([
+        (radius + tube * np.cos(v)) * np.cos(u),
+        (radius + tube * np.cos(v)) * np.sin(u),
+        tube * np.sin(v),
+    ], axis=-1).reshape(-1, 3).astype(np.float32)
+    i, j = np.meshgrid(np.arange(n), np.arange(n), indexing='ij')
+    a = (i * n + j).ravel()
+    b = (((i + 1) % n) * n + j).ravel()
+    c = (((i + 1) % n) * n + (j + 1) % n).ravel()
+    d = (i * n + (j + 1) % n).ravel()
+    faces = np.concatenate([np.stack([a, b, c], 1), np.stack([a, c, d], 1)]).astype(np.int64)
+    return Latent2MeshOutput(mesh_v=vertices, mesh_f=faces)
+
+
+def export_with_trimesh(mesh_output, glb_path, stl_path):
+    import trimesh
+    mesh = trimesh.Trimesh(mesh_output.mesh_v, mesh_output.mesh_f[:, ::-1])
+    mesh.export(glb_path)
+    mesh.export(stl_path)
+
+
+def check_outputs(mesh_output, glb_path, stl_path, reference=None):
+    vertices, faces = mesh_arrays(mesh_output)
+    with open(stl_path, 'rb') as f:
+        f.seek(84)
+        records = np.frombuffer(f.read(), dtype=STL_DTYPE)
+    assert len(records) == len(faces), "STL face count"
+    assert np.array_equal(records['vertices'], vertices[faces]), "STL triangles"
+
+    try:
+        import trimesh
+    except ImportError:
+        return 'STL exact (trimesh not installed, GLB unchecked)'
+    glb = trimesh.load(glb_path, force='mesh')
+    stl = trimesh.load(stl_path, force='mesh')
+    assert len(glb.faces) == len(faces), "GLB face count"
+    assert np.allclose(glb.vertices[glb.faces], vertices[faces]), "GLB triangles"
+    if reference is not None:
+        ref = trimesh.load(reference, force='mesh')
+        for mesh in (glb, stl):
+            assert np.isclose(mesh.area, ref.area, rtol=1e-5), "area"
+            assert np.isclose(mesh.volume, ref.volume, rtol=1e-5), "volume"
+    return 'STL exact, GLB identical triangles, area/volume match trimesh'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--faces', type=int, nargs='+', default=[200_000, 500_000, 1_000_000, 2_000_000])
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    try:
+        import trimesh  # noqa: F401
+        has_trimesh = True
+    except ImportError:
+        has_trimesh = False
+        print("trimesh not installed: timing the new exporter only")
+
+    print(f"{'faces':>9} | {'trimesh (s)':>11} | {'export_mesh (s)':>15} | {'speed-up':>8} | check")
+    with tempfile.TemporaryDirectory() as tmp:
+        for num_faces in args.faces:
+            mesh_output = torus_mesh(num_faces)
+            new_glb, new_stl = os.path.join(tmp, 'new.glb'), os.path.join(tmp, 'new.stl')
+            old_glb, old_stl = os.path.join(tmp, 'old.glb'), os.path.join(tmp, 'old.stl')
+
+            new_times, old_times = [], []
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                export_mesh(mesh_output, [new_glb, new_stl])
+                new_times.append(time.perf_counter() - start)
+                if has_trimesh:
+                    start = time.perf_counter()
+                    export_with_trimesh(mesh_output, old_glb, old_stl)
+                    old_times.append(time.perf_counter() - start)
+
+            check = check_outputs(mesh_output, new_glb, new_stl, old_stl if has_trimesh else None)
+            old = min(old_times) if old_times else float('nan')
+            new = min(new_times)
+            print(f"{len(mesh_output.mesh_f):>9} | {old:>11.3f} | {new:>15.3f} | {old / new:>7.1f}x | {check}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Guidance interval benchmark: diffusion time of Hunyuan3DDiTFlowMatchingPipeline when
+classifier-free guidance only runs inside a timestep interval, and how far the shapes
+drift from full CFG with the same seed (chamfer distance of the meshes, IoU of dense
+occupancy grids).
+
+Intervals are start:end in normalized time (0 = noise, 1 = clean); 0:1 is full CFG.
+
+    python benchmarks/bench_guidance.py --image ../static/processed/gen2.png --intervals 0:1 0:0.8 0:0.6 0.2:0.8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import torch
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from run_me import PIPELINE_SETTINGS, get_pipeline
+from hy3dgen.shapegen.metrics import chamfer_distance, occupancy_iou
+from hy3dgen.shapegen.models.autoencoders import VanillaVolumeDecoder
+
+
+def parse_interval(text):
+    start, end = (float(x) for x in text.split(':'))
+    return start, end
+
+
+def sample(pipeline, image, seed, interval, call_kwargs):
+    """Diffusion only: returns the final latents and the seconds it took."""
+    start = time.perf_counter()
+    latents = pipeline(image=image, generator=torch.Generator().manual_seed(seed), output_type='latent',
+                       guidance_interval=interval, enable_pbar=False, **call_kwargs)
+    return latents, time.perf_counter() - start
+
+
+def decode(pipeline, latents, call_kwargs, iou_resolution):
+    """Mesh with the pipeline's decoder, plus a dense occupancy grid for the IoU."""
+    with torch.inference_mode():
+        mesh = pipeline._export(latents, output_type='mesh', box_v=1.01, mc_level=call_kwargs['mc_level'],
+                                num_chunks=call_kwargs['num_chunks'],
+                                octree_resolution=call_kwargs['octree_resolution'], enable_pbar=False)[0]
+        decoded = pipeline.vae(1. / pipeline.vae.scale_factor * latents)
+        grid = VanillaVolumeDecoder()(decoded, pipeline.vae.geo_decoder, bounds=1.01,
+                                      num_chunks=call_kwargs['num_chunks'], octree_resolution=iou_resolution,
+                                      enable_pbar=False)
+    return mesh, grid
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', required=True, help="input image (background removed)")
+    parser.add_argument('--intervals', nargs='+', default=['0:1', '0:0.8', '0:0.6', '0.2:0.8'])
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0, 1, 2])
+    parser.add_argument('--steps', type=int, help="override num_inference_steps")
+    parser.add_argument('--octree-resolution', type=int, help="override octree_resolution of the meshes")
+    parser.add_argument('--iou-resolution', type=int, default=128, help="dense grid resolution for the IoU")
+    parser.add_argument('--output', help="write all runs as JSON here")
+    args = parser.parse_args()
+
+    call_kwargs = {k: v for k, v in PIPELINE_SETTINGS.items() if k != 'model'}
+    if args.steps:
+        call_kwargs['num_inference_steps'] = args.steps
+    if args.octree_resolution:
+        call_kwargs['octree_resolution'] = args.octree_resolution
+
+    pipeline = get_pipeline()
+    image = str(Path(args.image).resolve())
+    sample(pipeline, image, 0, None, dict(call_kwargs, num_inference_steps=2))  # warm-up
+
+    runs = []
+    for seed in args.seeds:
+        ref_latents, ref_seconds = sample(pipeline, image, seed, None, call_kwargs)
+        ref_mesh, ref_grid = decode(pipeline, ref_latents, call_kwargs, args.iou_resolution)
+        for text in args.intervals:
+            interval = parse_interval(text)
+            latents, seconds = sample(pipeline, image, seed, interval, call_kwargs)
+            mesh, grid = decode(pipeline, latents, call_kwargs, args.iou_resolution)
+            runs.append({
+                'seed': seed, 'interval': text, 'seconds': seconds, 'reference_seconds': ref_seconds,
+                'chamfer': chamfer_distance(ref_mesh, mesh) if mesh is not None and ref_mesh is not None else None,
+                'iou': occupancy_iou(ref_grid, grid, level=call_kwargs['mc_level']),
+            })
+
+    print(f"{'interval':>9} | {'diffusion (s)':>13} | {'speed-up':>8} | {'chamfer':>8} | {'IoU':>6}")
+    for text in args.intervals:
+        rows = [r for r in runs if r['interval'] == text]
+        seconds = sum(r['seconds'] for r in rows) / len(rows)
+        reference = sum(r['reference_seconds'] for r in rows) / len(rows)
+        chamfers = [r['chamfer'] for r in rows if r['chamfer'] is not None]
+        chamfer = sum(chamfers) / len(chamfers) if chamfers else float('nan')
+        iou = sum(r['iou'] for r in rows) / len(rows)
+        print(f"{text:>9} | {seconds:13.1f} | {reference / seconds:7.2f}x | {chamfer:8.4f} | {iou:6.3f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'device': str(pipeline.device), 'cpu_count': os.cpu_count(), 'settings': call_kwargs,
+                       'runs': runs}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
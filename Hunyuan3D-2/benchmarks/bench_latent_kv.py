@@ -0,0 +1,126 @@
+"""
+Volume decoding speed with the latent keys / values projected once per mesh
+(CrossAttentionDecoder.precompute_kv) vs again for every query chunk, per decoder and octree
+resolution: decoding time, number of chunks (geometry decoder calls) and the largest logit
+difference between both grids.
+
+    python benchmarks/bench_latent_kv.py --image ../static/processed/gen2.png --resolutions 256 384
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import torch
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from run_me import PIPELINE_SETTINGS, get_pipeline
+from hy3dgen.shapegen.models.autoencoders import (FlashVDMVolumeDecoding, HierarchicalVolumeDecoding,
+                                                  VanillaVolumeDecoder)
+from bench_guidance import sample
+from bench_query_cache import max_difference, synchronize
+
+DECODERS = {
+    'vanilla': VanillaVolumeDecoder,
+    'hierarchical': lambda: HierarchicalVolumeDecoding(sparse=False),
+    'flashvdm': lambda: FlashVDMVolumeDecoding(sparse=False),
+}
+
+
+class PerChunkKV:
+    """
+    The geometry decoder as before the K/V cache: precompute_kv hands back the latents, and every
+    call projects them again (repeated to the query batch, as the FlashVDM coarse level did).
+    """
+
+    def __init__(self, geo_decoder):
+        self.geo_decoder = geo_decoder
+        self.calls = 0
+
+    def __getattr__(self, name):
+        return getattr(self.geo_decoder, name)
+
+    def precompute_kv(self, latents):
+        return latents, latents
+
+    def __call__(self, queries=None, query_embeddings=None, kv=None):
+        self.calls += 1
+        latents = kv[0]
+        batch = (queries if query_embeddings is None else query_embeddings).shape[0]
+        if latents.shape[0] != batch:
+            latents = latents.expand(batch, -1, -1).contiguous()
+        return self.geo_decoder(queries=queries, query_embeddings=query_embeddings, latents=latents)
+
+
+class CountingKV(PerChunkKV):
+    """The geometry decoder with the K/V cache, counting its calls."""
+
+    def precompute_kv(self, latents):
+        return self.geo_decoder.precompute_kv(latents)
+
+    def __call__(self, queries=None, query_embeddings=None, kv=None):
+        self.calls += 1
+        return self.geo_decoder(queries=queries, query_embeddings=query_embeddings, kv=kv)
+
+
+def run(decoder, decoded, geo_decoder, kwargs, repeats):
+    times = []
+    for _ in range(repeats):
+        geo_decoder.calls = 0
+        synchronize(decoded.device)
+        start = time.perf_counter()
+        with torch.inference_mode():
+            grid = decoder(decoded, geo_decoder, **kwargs)
+        synchronize(decoded.device)
+        times.append(time.perf_counter() - start)
+    return grid, min(times), geo_decoder.calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', required=True, help="input image (background removed)")
+    parser.add_argument('--resolutions', type=int, nargs='+', default=[256, 384])
+    parser.add_argument('--vanilla-resolution', type=int, default=128,
+                        help="resolution of the (dense) vanilla decoder")
+    parser.add_argument('--decoders', nargs='+', default=list(DECODERS), choices=list(DECODERS))
+    parser.add_argument('--repeats', type=int, default=3, help="best of this many decodings")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write all runs as JSON here")
+    args = parser.parse_args()
+
+    call_kwargs = {k: v for k, v in PIPELINE_SETTINGS.items() if k != 'model'}
+    pipeline = get_pipeline()
+    latents, _ = sample(pipeline, str(Path(args.image).resolve()), args.seed, None, call_kwargs)
+    with torch.inference_mode():
+        decoded = pipeline.vae(1. / pipeline.vae.scale_factor * latents)
+
+    runs = []
+    for name in args.decoders:
+        for resolution in [args.vanilla_resolution] if name == 'vanilla' else args.resolutions:
+            kwargs = dict(bounds=1.01, mc_level=call_kwargs['mc_level'], num_chunks=call_kwargs['num_chunks'],
+                          octree_resolution=resolution, enable_pbar=False)
+            reference, per_chunk, calls = run(DECODERS[name](), decoded, PerChunkKV(pipeline.vae.geo_decoder),
+                                              kwargs, args.repeats)
+            grid, cached, _ = run(DECODERS[name](), decoded, CountingKV(pipeline.vae.geo_decoder), kwargs,
+                                  args.repeats)
+            difference, same_nans = max_difference(reference, grid)
+            runs.append({'decoder': name, 'resolution': resolution, 'chunks': calls, 'per_chunk': per_chunk,
+                         'cached': cached, 'max_difference': difference, 'same_decoded_points': same_nans})
+
+    print(f"{'decoder':>12} | {'res':>4} | {'chunks':>6} | {'per chunk (s)':>13} | {'cached (s)':>10} | "
+          f"{'speedup':>7} | {'max |diff|':>10} | same points")
+    for r in runs:
+        print(f"{r['decoder']:>12} | {r['resolution']:>4} | {r['chunks']:>6} | {r['per_chunk']:13.2f} | "
+              f"{r['cached']:10.2f} | {r['per_chunk'] / r['cached']:6.2f}x | {r['max_difference']:10.2e} | "
+              f"{r['same_decoded_points']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'device': str(pipeline.device), 'runs': runs}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+Near-surface detection of the octree volume decoders: the strided int8 extract_near_surface_volume_fn
+vs the previous implementation (kept below as legacy_near_surface, six replicate-padded copies of the
+grid and stacked float32 sign tensors). Checks both give the same int32 mask, then reports the CPU
+time and peak memory of each at every resolution.
+
+The grids mimic an octree level: a sphere-like logit field with ties at exactly zero, points away
+from the surface left undecoded (-10000) and a few NaNs.
+
+    python benchmarks/bench_near_surface.py --resolutions 256 384 512
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import torch
+import torch.nn.functional as F
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from hy3dgen.shapegen.models.autoencoders.volume_decoders import extract_near_surface_volume_fn
+from bench_sparse_decoding import PeakMemory
+
+
+def legacy_near_surface(input_tensor: torch.Tensor, alpha: float):
+    val = input_tensor + alpha
+    valid_mask = val > -9000
+
+    def get_neighbor(t, shift, axis):
+        """t shifted by `shift` along `axis`, replicating the border."""
+        if shift == 0:
+            return t.clone()
+
+        pad_dims = [0, 0, 0, 0, 0, 0]
+
+        if axis == 0:
+            pad_idx = 0 if shift > 0 else 1
+            pad_dims[pad_idx] = abs(shift)
+        elif axis == 1:
+            pad_idx = 2 if shift > 0 else 3
+            pad_dims[pad_idx] = abs(shift)
+        elif axis == 2:
+            pad_idx = 4 if shift > 0 else 5
+            pad_dims[pad_idx] = abs(shift)
+
+        padded = F.pad(t.unsqueeze(0).unsqueeze(0), pad_dims[::-1], mode='replicate')
+
+        slice_dims = [slice(None)] * 3
+        if axis == 0:
+            if shift > 0:
+                slice_dims[0] = slice(shift, None)
+            else:
+                slice_dims[0] = slice(None, shift)
+        elif axis == 1:
+            if shift > 0:
+                slice_dims[1] = slice(shift, None)
+            else:
+                slice_dims[1] = slice(None, shift)
+        elif axis == 2:
+            if shift > 0:
+                slice_dims[2] = slice(shift, None)
+            else:
+                slice_dims[2] = slice(None, shift)
+
+        padded = padded.squeeze(0).squeeze(0)
+        sliced = padded[slice_dims]
+        return sliced
+
+    left = get_neighbor(val, 1, axis=0)
+    right = get_neighbor(val, -1, axis=0)
+    back = get_neighbor(val, 1, axis=1)
+    front = get_neighbor(val, -1, axis=1)
+    down = get_neighbor(val, 1, axis=2)
+    up = get_neighbor(val, -1, axis=2)
+
+    def safe_where(neighbor):
+        return torch.where(neighbor > -9000, neighbor, val)
+
+    left = safe_where(left)
+    right = safe_where(right)
+    back = safe_where(back)
+    front = safe_where(front)
+    down = safe_where(down)
+    up = safe_where(up)
+
+    sign = torch.sign(val.to(torch.float32))
+    neighbors_sign = torch.stack([
+        torch.sign(left.to(torch.float32)),
+        torch.sign(right.to(torch.float32)),
+        torch.sign(back.to(torch.float32)),
+        torch.sign(front.to(torch.float32)),
+        torch.sign(down.to(torch.float32)),
+        torch.sign(up.to(torch.float32))
+    ], dim=0)
+
+    same_sign = torch.all(neighbors_sign == sign, dim=0)
+
+    mask = (~same_sign).to(torch.int32)
+    return mask * valid_mask.to(torch.int32)
+
+
+def octree_level(resolution, dtype, seed=0):
+    """(resolution + 1)^3 logits with the value patterns the decoders produce."""
+    generator = torch.Generator().manual_seed(seed)
+    axis = torch.linspace(-1, 1, resolution + 1)
+    x, y, z = torch.meshgrid(axis, axis, axis, indexing='ij')
+    logits = (0.6 - (x ** 2 + y ** 2 + z ** 2).sqrt()) * 20
+    logits += torch.randn(logits.shape, generator=generator) * 0.5
+    # Quantized, so some points sit exactly on the level
+    logits = torch.round(logits * 4) / 4
+    logits[logits.abs() > 3] = -10000.
+    nan = torch.rand(logits.shape, generator=generator) < 1e-4
+    logits[nan] = float('nan')
+    return logits.to(dtype)
+
+
+def check(resolutions, dtype):
+    for resolution in resolutions:
+        for seed in range(3):
+            grid = octree_level(resolution, dtype, seed)
+            for alpha in (0.0, 0.25, -0.5):
+                new = extract_near_surface_volume_fn(grid, alpha)
+                old = legacy_near_surface(grid, alpha)
+                assert new.dtype == old.dtype == torch.int32, (new.dtype, old.dtype)
+                assert torch.equal(new, old), f"mask differs at r{resolution}, seed {seed}, alpha {alpha}"
+        # Random signs everywhere: every point is a neighbour of a change
+        noise = torch.randn((resolution + 1,) * 3, generator=torch.Generator().manual_seed(resolution)).to(dtype)
+        assert torch.equal(extract_near_surface_volume_fn(noise, 0.0), legacy_near_surface(noise, 0.0))
+    print(f"equivalent on {resolutions} ({dtype})")
+
+
+def measure(fn, grid, alpha):
+    with PeakMemory(grid.device) as memory:
+        start = time.perf_counter()
+        fn(grid, alpha)
+        seconds = time.perf_counter() - start
+    return seconds, memory.peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--resolutions', type=int, nargs='+', default=[256, 384, 512])
+    parser.add_argument('--check-resolutions', type=int, nargs='+', default=[15, 64, 128])
+    parser.add_argument('--dtype', choices=['float16', 'float32'], default='float16',
+                        help="grid dtype (the decoders use the latents' dtype)")
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+    dtype = getattr(torch, args.dtype)
+
+    check(args.check_resolutions, dtype)
+
+    mb = 1024 ** 2
+    print(f"{'res':>4} | {'grid (MB)':>9} | {'legacy (s)':>10} | {'fused (s)':>9} | {'speed-up':>8} | "
+          f"{'legacy peak (MB)':>16} | {'fused peak (MB)':>15}")
+    for resolution in args.resolutions:
+        grid = octree_level(resolution, dtype)
+        fused = min(measure(extract_near_surface_volume_fn, grid, 0.0) for _ in range(args.repeats))
+        legacy = min(measure(legacy_near_surface, grid, 0.0) for _ in range(args.repeats))
+        assert torch.equal(extract_near_surface_volume_fn(grid, 0.0), legacy_near_surface(grid, 0.0))
+        print(f"{resolution:>4} | {grid.numel() * grid.element_size() / mb:9.0f} | {legacy[0]:10.2f} | "
+              f"{fused[0]:9.2f} | {legacy[0] / fused[0]:7.1f}x | {legacy[1] / mb:16.0f} | {fused[1] / mb:15.0f}")
+
+
+if __name__ == '__main__':
+    main()
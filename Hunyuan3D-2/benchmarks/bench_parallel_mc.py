@@ -0,0 +1,134 @@
+"""
+Block-wise parallel marching cubes (ParallelMCSurfaceExtractor) vs the whole-grid skimage call
+(MCSurfaceExtractor) on one decoded grid: extraction time per pool size (best of --repeats, the
+pool already started), speedup over the whole-grid call, and whether both meshes are the same
+(same vertices up to float rounding and same faces, so the same watertightness), with the number
+of boundary edges of each.
+
+    python benchmarks/bench_parallel_mc.py --image ../static/processed/gen2.png --workers 1 2 4 8 16 32
+    python benchmarks/bench_parallel_mc.py --grid-file grid.pt --workers 1 2 4 8 16 32
+
+--save-grid writes the decoded grid, so other machines can time the extraction without the model.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from hy3dgen.shapegen.models.autoencoders import (HierarchicalVolumeDecoding, MCSurfaceExtractor,
+                                                  ParallelMCSurfaceExtractor, VanillaVolumeDecoder)
+
+
+def decode_grid(image, resolution, sparse, seed):
+    from run_me import PIPELINE_SETTINGS, get_pipeline
+    from bench_guidance import sample
+
+    call_kwargs = {k: v for k, v in PIPELINE_SETTINGS.items() if k != 'model'}
+    pipeline = get_pipeline()
+    latents, _ = sample(pipeline, image, seed, None, call_kwargs)
+    decoder = HierarchicalVolumeDecoding(sparse=True) if sparse else VanillaVolumeDecoder()
+    with torch.inference_mode():
+        decoded = pipeline.vae(1. / pipeline.vae.scale_factor * latents)
+        return decoder(decoded, pipeline.vae.geo_decoder, bounds=1.01, mc_level=call_kwargs['mc_level'],
+                       num_chunks=call_kwargs['num_chunks'], octree_resolution=resolution, enable_pbar=False)[0]
+
+
+def canonical(vertices, faces):
+    """Vertices sorted by position and faces renumbered, rotated (orientation kept) and sorted."""
+    order = np.lexsort(np.round(vertices, 4).T[::-1])
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    faces = rank[faces]
+    first = np.argmin(faces, axis=1)
+    rows = np.arange(len(faces))
+    faces = np.stack([faces[rows, (first + k) % 3] for k in range(3)], axis=1)
+    return vertices[order], faces[np.lexsort(faces.T[::-1])]
+
+
+def boundary_edges(faces):
+    """Edges used by a single face (0 for a watertight mesh)."""
+    edges = np.sort(np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]]), axis=1)
+    _, counts = np.unique(edges, axis=0, return_counts=True)
+    return int((counts == 1).sum())
+
+
+def same_mesh(reference, mesh):
+    ref_vertices, ref_faces = canonical(*reference)
+    vertices, faces = canonical(*mesh)
+    if ref_vertices.shape != vertices.shape or ref_faces.shape != faces.shape:
+        return False, float('nan')
+    return bool(np.array_equal(ref_faces, faces)), float(np.abs(ref_vertices - vertices).max())
+
+
+def timed(extractor, grid, mc_level, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        vertices, faces = extractor.marching_cubes(grid, mc_level)
+        times.append(time.perf_counter() - start)
+    return (np.asarray(vertices, dtype=np.float64), np.asarray(faces)), min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', help="input image (background removed)")
+    parser.add_argument('--grid-file', help="grid saved by --save-grid, instead of decoding one")
+    parser.add_argument('--save-grid', help="write the decoded grid here")
+    parser.add_argument('--resolution', type=int, default=384, help="octree resolution")
+    parser.add_argument('--sparse', action='store_true', help="hierarchical sparse grid instead of a dense one")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--block-size', type=int, default=32)
+    parser.add_argument('--executor', choices=['thread', 'process'], default='thread')
+    parser.add_argument('--mc-level', type=float, default=0.0)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write all runs as JSON here")
+    args = parser.parse_args()
+
+    if args.grid_file:
+        grid = torch.load(args.grid_file, weights_only=False)
+    elif args.image:
+        grid = decode_grid(str(Path(args.image).resolve()), args.resolution, args.sparse, args.seed)
+    else:
+        parser.error('pass --image or --grid-file')
+    if args.save_grid:
+        torch.save(grid, args.save_grid)
+
+    reference, serial = timed(MCSurfaceExtractor(), grid, args.mc_level, args.repeats)
+    runs = []
+    for workers in args.workers:
+        extractor = ParallelMCSurfaceExtractor(block_size=args.block_size, workers=workers, executor=args.executor)
+        extractor.marching_cubes(grid, args.mc_level)  # starts the pool
+        mesh, seconds = timed(extractor, grid, args.mc_level, args.repeats)
+        extractor.close()
+        same, vertex_difference = same_mesh(reference, mesh)
+        runs.append({'workers': workers, 'seconds': seconds, 'speedup': serial / seconds,
+                     'vertices': len(mesh[0]), 'faces': len(mesh[1]), 'boundary_edges': boundary_edges(mesh[1]),
+                     'same_mesh': same, 'max_vertex_difference': vertex_difference})
+
+    print(f"MCSurfaceExtractor: {serial:.2f}s, {len(reference[0])} vertices, {len(reference[1])} faces, "
+          f"{boundary_edges(reference[1])} boundary edges ({os.cpu_count()} CPUs)")
+    print(f"{'workers':>7} | {'time (s)':>8} | {'speedup':>7} | {'V':>9} | {'F':>9} | {'boundary':>8} | "
+          f"{'same':>5} | {'max |dv|':>8}")
+    for r in runs:
+        print(f"{r['workers']:>7} | {r['seconds']:8.2f} | {r['speedup']:6.2f}x | {r['vertices']:>9} | "
+              f"{r['faces']:>9} | {r['boundary_edges']:>8} | {str(r['same_mesh']):>5} | "
+              f"{r['max_vertex_difference']:8.1e}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'cpu_count': os.cpu_count(), 'resolution': args.resolution, 'sparse': args.sparse,
+                       'block_size': args.block_size, 'executor': args.executor, 'serial': serial,
+                       'runs': runs}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
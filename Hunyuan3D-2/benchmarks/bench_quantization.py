@@ -0,0 +1,162 @@
+"""
+int8 quantization report on the CPU: for the fp32 pipeline and each quantization mode
+(hy3dgen.shapegen.quantization), the setup time (quantizing, or loading the saved int8 weights),
+the resident memory, the diffusion and volume decoding times, and how far the shapes land from
+the fp32 ones with the same seed (chamfer distance of the meshes, IoU of dense occupancy grids).
+
+    fp32         apply_cpu_profile in fp32, no quantization (the reference)
+    bf16         apply_cpu_profile with its default dtype (bf16 where supported), no quantization
+    dynamic      fp32 profile + dynamic int8 linears
+    weight_only  default profile + int8 weight-only linears
+
+Every mode runs in a fresh process, so memory is measured per mode. Run it twice to see the
+setup time with the saved weights (the first run quantizes and saves them in --cache-dir).
+
+    python benchmarks/bench_quantization.py --image ../static/processed/gen2.png --output quantization.json
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+MODES = ('fp32', 'bf16', 'dynamic', 'weight_only')
+
+
+def rss_mb():
+    """Current resident set size of this process."""
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+
+
+def run_mode(mode, image, seeds, call_kwargs, iou_resolution, cache_dir, output):
+    import torch
+    from run_me import get_pipeline
+    from hy3dgen.shapegen import apply_cpu_profile
+    from hy3dgen.shapegen.utils import collect_timings
+    from bench_guidance import decode, sample
+
+    pipeline = get_pipeline()
+    pipeline.disable_cond_cache()
+    if pipeline.device.type != 'cpu':
+        raise SystemExit(f"{pipeline.device} pipeline: run with CUDA_VISIBLE_DEVICES= on a CPU node")
+    loaded_rss = rss_mb()
+    apply_cpu_profile(pipeline, dtype=torch.float32 if mode in ('fp32', 'dynamic') else None)
+    start = time.perf_counter()
+    if mode in ('dynamic', 'weight_only'):
+        pipeline.enable_quantization(mode, cache_dir=cache_dir)
+    setup = time.perf_counter() - start
+    ready_rss = rss_mb()
+    sample(pipeline, image, 0, None, dict(call_kwargs, num_inference_steps=2))  # warm-up
+
+    runs = []
+    for seed in seeds:
+        latents, seconds = sample(pipeline, image, seed, None, call_kwargs)
+        with collect_timings() as timings:
+            mesh, grid = decode(pipeline, latents, call_kwargs, iou_resolution)
+        runs.append({'seed': seed, 'diffusion': seconds, 'decoding': timings.get('Volume decoding', 0.) / 1000})
+        torch.save({'mesh': None if mesh is None else (mesh.mesh_v, mesh.mesh_f), 'grid': grid.cpu()},
+                   os.path.join(output, f'{mode}-{seed}.pt'))
+    return {
+        'mode': mode,
+        'setup': setup,
+        'loaded_rss_mb': loaded_rss,
+        'ready_rss_mb': ready_rss,
+        # ru_maxrss is in KiB on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'runs': runs,
+    }
+
+
+def compare(mode, seeds, output, level):
+    """Chamfer distance and IoU of every seed's shape against the fp32 one."""
+    import torch
+    from hy3dgen.shapegen.metrics import chamfer_distance, occupancy_iou
+
+    chamfers, ious = [], []
+    for seed in seeds:
+        ref = torch.load(os.path.join(output, f'fp32-{seed}.pt'), weights_only=False)
+        run = torch.load(os.path.join(output, f'{mode}-{seed}.pt'), weights_only=False)
+        if ref['mesh'] is not None and run['mesh'] is not None:
+            chamfers.append(chamfer_distance(ref['mesh'], run['mesh']))
+        ious.append(occupancy_iou(ref['grid'], run['grid'], level=level))
+    return {
+        'chamfer': sum(chamfers) / len(chamfers) if chamfers else None,
+        'iou': sum(ious) / len(ious),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', required=True, help="input image (background removed)")
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=list(MODES))
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0, 1])
+    parser.add_argument('--steps', type=int, help="override num_inference_steps")
+    parser.add_argument('--octree-resolution', type=int, help="override octree_resolution of the meshes")
+    parser.add_argument('--iou-resolution', type=int, default=128, help="dense grid resolution for the IoU")
+    parser.add_argument('--cache-dir', default=str(ROOT.parent / '.quant_cache'),
+                        help="saved int8 weights ('' to quantize every time)")
+    parser.add_argument('--output', help="write all runs as JSON here")
+    parser.add_argument('--child', choices=list(MODES), help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    image = str(Path(args.image).resolve())
+    if args.child:
+        # The pipeline is set up by run_mode, not by run_me
+        os.environ['HY3DGEN_CPU_PROFILE'] = '0'
+        os.environ['HY3DGEN_QUANTIZE'] = ''
+
+    from run_me import PIPELINE_SETTINGS
+    call_kwargs = {k: v for k, v in PIPELINE_SETTINGS.items() if k != 'model'}
+    if args.steps:
+        call_kwargs['num_inference_steps'] = args.steps
+    if args.octree_resolution:
+        call_kwargs['octree_resolution'] = args.octree_resolution
+
+    if args.child:
+        result = run_mode(args.child, image, args.seeds, call_kwargs, args.iou_resolution, args.cache_dir or None,
+                          args.workdir)
+        print(json.dumps(result))
+        return
+
+    modes = ['fp32'] + [mode for mode in args.modes if mode != 'fp32']
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for mode in modes:
+            cmd = [sys.executable, __file__, '--child', mode, '--image', image, '--workdir', workdir,
+                   '--iou-resolution', str(args.iou_resolution), '--cache-dir', args.cache_dir,
+                   '--seeds', *map(str, args.seeds)]
+            if args.steps:
+                cmd += ['--steps', str(args.steps)]
+            if args.octree_resolution:
+                cmd += ['--octree-resolution', str(args.octree_resolution)]
+            out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            result.update(compare(mode, args.seeds, workdir, call_kwargs['mc_level']))
+            results.append(result)
+
+    print(f"{'mode':>11} | {'setup (s)':>9} | {'RSS (MB)':>8} | {'peak (MB)':>9} | {'diffusion (s)':>13} | "
+          f"{'decoding (s)':>12} | {'chamfer':>8} | {'IoU':>6}")
+    for result in results:
+        runs = result['runs']
+        diffusion = sum(r['diffusion'] for r in runs) / len(runs)
+        decoding = sum(r['decoding'] for r in runs) / len(runs)
+        chamfer = float('nan') if result['chamfer'] is None else result['chamfer']
+        print(f"{result['mode']:>11} | {result['setup']:9.1f} | {result['ready_rss_mb']:8.0f} | "
+              f"{result['peak_rss_mb']:9.0f} | {diffusion:13.1f} | {decoding:12.1f} | {chamfer:8.4f} | "
+              f"{result['iou']:6.3f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'cpu_count': os.cpu_count(), 'settings': call_kwargs, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
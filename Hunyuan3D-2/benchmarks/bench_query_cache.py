@@ -0,0 +1,119 @@
+"""
+Volume decoding with and without the query grid cache (QueryGridCache), per decoder: the time of
+the first mesh (the cache is filled), of the next meshes (coarse grid embeddings reused) and
+without the cache, and the largest logit difference between the cached and uncached grids.
+
+Also checks that the grid coordinates made from integer indices are the ones of the numpy
+meshgrid (generate_dense_grid_points) bit for bit.
+
+    python benchmarks/bench_query_cache.py --image ../static/processed/gen2.png --resolution 384
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from run_me import PIPELINE_SETTINGS, get_pipeline
+from hy3dgen.shapegen.models.autoencoders import (FlashVDMVolumeDecoding, HierarchicalVolumeDecoding,
+                                                  QueryGridCache, VanillaVolumeDecoder)
+from hy3dgen.shapegen.models.autoencoders.query_grid import normalize_bounds
+from hy3dgen.shapegen.models.autoencoders.volume_decoders import generate_dense_grid_points
+from bench_guidance import sample
+
+DECODERS = {
+    'vanilla': VanillaVolumeDecoder,
+    'hierarchical': lambda query_cache: HierarchicalVolumeDecoding(sparse=False, query_cache=query_cache),
+    'flashvdm': lambda query_cache: FlashVDMVolumeDecoding(sparse=False, query_cache=query_cache),
+}
+
+
+def check_coordinates(resolution, bounds=1.01):
+    bounds = normalize_bounds(bounds)
+    xyz, _, _ = generate_dense_grid_points(np.array(bounds[0:3]), np.array(bounds[3:6]), resolution)
+    points = QueryGridCache().dense_points(bounds, resolution, 'cpu')
+    return bool(torch.equal(torch.from_numpy(xyz).reshape(-1, 3), points))
+
+
+def synchronize(device):
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+
+
+def timed(decoder, decoded, geo_decoder, kwargs):
+    synchronize(decoded.device)
+    start = time.perf_counter()
+    with torch.inference_mode():
+        grid = decoder(decoded, geo_decoder, **kwargs)
+    synchronize(decoded.device)
+    return grid, time.perf_counter() - start
+
+
+def max_difference(a, b):
+    both = ~(torch.isnan(a) | torch.isnan(b))
+    same_nans = bool(torch.equal(torch.isnan(a), torch.isnan(b)))
+    diff = (a[both].float() - b[both].float()).abs()
+    return (diff.max().item() if diff.numel() else 0.), same_nans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', required=True, help="input image (background removed)")
+    parser.add_argument('--resolution', type=int, default=384, help="octree resolution")
+    parser.add_argument('--vanilla-resolution', type=int, default=128,
+                        help="resolution of the (dense) vanilla decoder")
+    parser.add_argument('--decoders', nargs='+', default=list(DECODERS), choices=list(DECODERS))
+    parser.add_argument('--meshes', type=int, default=3, help="meshes decoded with the warm cache")
+    parser.add_argument('--max-mb', type=int, default=2048, help="budget of the cache")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write all runs as JSON here")
+    args = parser.parse_args()
+
+    coordinates = check_coordinates(args.resolution)
+    print(f"grid coordinates equal to generate_dense_grid_points: {coordinates}")
+
+    call_kwargs = {k: v for k, v in PIPELINE_SETTINGS.items() if k != 'model'}
+    pipeline = get_pipeline()
+    latents, _ = sample(pipeline, str(Path(args.image).resolve()), args.seed, None, call_kwargs)
+    with torch.inference_mode():
+        decoded = pipeline.vae(1. / pipeline.vae.scale_factor * latents)
+    geo_decoder = pipeline.vae.geo_decoder
+
+    runs = []
+    for name in args.decoders:
+        resolution = args.vanilla_resolution if name == 'vanilla' else args.resolution
+        kwargs = dict(bounds=1.01, mc_level=call_kwargs['mc_level'], num_chunks=call_kwargs['num_chunks'],
+                      octree_resolution=resolution, enable_pbar=False)
+        cache = QueryGridCache(max_bytes=args.max_mb * 1024 ** 2)
+        uncached_decoder = DECODERS[name](query_cache=QueryGridCache(max_bytes=0))
+        cached_decoder = DECODERS[name](query_cache=cache)
+
+        reference, uncached = timed(uncached_decoder, decoded, geo_decoder, kwargs)
+        grid, first = timed(cached_decoder, decoded, geo_decoder, kwargs)
+        warm = [timed(cached_decoder, decoded, geo_decoder, kwargs)[1] for _ in range(args.meshes)]
+        difference, same_nans = max_difference(reference, grid)
+        runs.append({'decoder': name, 'resolution': resolution, 'uncached': uncached, 'first': first,
+                     'warm': sum(warm) / len(warm), 'cache_bytes': cache.nbytes, 'max_difference': difference,
+                     'same_decoded_points': same_nans})
+
+    print(f"{'decoder':>12} | {'res':>4} | {'uncached (s)':>12} | {'first (s)':>9} | {'warm (s)':>8} | "
+          f"{'cache (MB)':>10} | {'max |diff|':>10} | same points")
+    for r in runs:
+        print(f"{r['decoder']:>12} | {r['resolution']:>4} | {r['uncached']:12.2f} | {r['first']:9.2f} | "
+              f"{r['warm']:8.2f} | {r['cache_bytes'] / 1024 ** 2:10.0f} | {r['max_difference']:10.2e} | "
+              f"{r['same_decoded_points']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'device': str(pipeline.device), 'coordinates_equal': coordinates, 'runs': runs}, f,
+                      indent=2)
+
+
+if __name__ == '__main__':
+    main()
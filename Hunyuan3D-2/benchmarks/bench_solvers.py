@@ -0,0 +1,102 @@
+"""
+Quality vs NFE benchmark for the flow-matching solvers (hy3dgen.shapegen.schedulers.SCHEDULERS):
+for each solver and step count, the number of DiT evaluations, the diffusion time and how far
+the shape lands from a reference run (Euler, 50 steps by default) with the same seed:
+chamfer distance of the meshes and IoU of dense occupancy grids.
+
+Use it to pick the 10-20 step default: the cheapest row whose chamfer and IoU stay close to
+the reference.
+
+    python benchmarks/bench_solvers.py --image ../static/processed/gen2.png --steps 8 10 15 20
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import torch
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from run_me import PIPELINE_SETTINGS, get_pipeline
+from hy3dgen.shapegen.metrics import chamfer_distance, occupancy_iou
+from hy3dgen.shapegen.schedulers import SCHEDULERS
+from bench_guidance import decode
+
+
+def sample(pipeline, image, seed, solver, steps, call_kwargs):
+    """Diffusion only: returns the final latents, the seconds it took and the number of DiT calls."""
+    pipeline.set_scheduler(solver)
+    calls = []
+    hook = pipeline.model.register_forward_hook(lambda *args: calls.append(1))
+    try:
+        start = time.perf_counter()
+        latents = pipeline(image=image, generator=torch.Generator().manual_seed(seed), output_type='latent',
+                           enable_pbar=False, **dict(call_kwargs, num_inference_steps=steps))
+        seconds = time.perf_counter() - start
+    finally:
+        hook.remove()
+    return latents, seconds, len(calls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', required=True, help="input image (background removed)")
+    parser.add_argument('--solvers', nargs='+', default=list(SCHEDULERS), choices=list(SCHEDULERS))
+    parser.add_argument('--steps', type=int, nargs='+', default=[5, 8, 10, 15, 20, 30])
+    parser.add_argument('--reference', default='euler:50', help="solver:steps of the reference run")
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0, 1])
+    parser.add_argument('--iou-resolution', type=int, default=128, help="dense grid resolution for the IoU")
+    parser.add_argument('--output', help="write all runs as JSON here")
+    args = parser.parse_args()
+
+    call_kwargs = {k: v for k, v in PIPELINE_SETTINGS.items() if k not in ('model', 'num_inference_steps')}
+    ref_solver, ref_steps = args.reference.split(':')
+
+    pipeline = get_pipeline()
+    original_scheduler = pipeline.scheduler
+    image = str(Path(args.image).resolve())
+    sample(pipeline, image, 0, 'euler', 2, call_kwargs)  # warm-up
+
+    runs = []
+    for seed in args.seeds:
+        ref_latents, ref_seconds, ref_nfe = sample(pipeline, image, seed, ref_solver, int(ref_steps), call_kwargs)
+        ref_mesh, ref_grid = decode(pipeline, ref_latents, call_kwargs, args.iou_resolution)
+        for solver in args.solvers:
+            for steps in args.steps:
+                latents, seconds, nfe = sample(pipeline, image, seed, solver, steps, call_kwargs)
+                mesh, grid = decode(pipeline, latents, call_kwargs, args.iou_resolution)
+                runs.append({
+                    'seed': seed, 'solver': solver, 'steps': steps, 'nfe': nfe, 'seconds': seconds,
+                    'reference_seconds': ref_seconds, 'reference_nfe': ref_nfe,
+                    'chamfer': chamfer_distance(ref_mesh, mesh) if mesh is not None and ref_mesh is not None
+                    else None,
+                    'iou': occupancy_iou(ref_grid, grid, level=call_kwargs['mc_level']),
+                })
+    pipeline.scheduler = original_scheduler
+
+    print(f"reference: {args.reference}")
+    print(f"{'solver':>6} | {'steps':>5} | {'NFE':>4} | {'diffusion (s)':>13} | {'speed-up':>8} | "
+          f"{'chamfer':>8} | {'IoU':>6}")
+    for solver in args.solvers:
+        for steps in args.steps:
+            rows = [r for r in runs if r['solver'] == solver and r['steps'] == steps]
+            seconds = sum(r['seconds'] for r in rows) / len(rows)
+            reference = sum(r['reference_seconds'] for r in rows) / len(rows)
+            chamfers = [r['chamfer'] for r in rows if r['chamfer'] is not None]
+            chamfer = sum(chamfers) / len(chamfers) if chamfers else float('nan')
+            iou = sum(r['iou'] for r in rows) / len(rows)
+            print(f"{solver:>6} | {steps:>5} | {rows[0]['nfe']:>4} | {seconds:13.1f} | {reference / seconds:7.2f}x | "
+                  f"{chamfer:8.4f} | {iou:6.3f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'device': str(pipeline.device), 'cpu_count': os.cpu_count(), 'settings': call_kwargs,
+                       'reference': args.reference, 'runs': runs}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
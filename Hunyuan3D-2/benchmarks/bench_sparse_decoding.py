@@ -0,0 +1,146 @@
+"""
+Octree volume decoding with dense (R + 1)^3 level grids vs sparse bricks (SparseBrickGrid), per
+octree resolution: decoding and surface extraction time, peak memory while decoding, the memory
+of the final level, and whether both give the same mesh (vertex / face counts, chamfer distance).
+
+Peak memory is torch.cuda.max_memory_allocated on a GPU, else the growth of the resident set
+sampled while decoding.
+
+    python benchmarks/bench_sparse_decoding.py --image ../static/processed/gen2.png --resolutions 256 384 512
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import torch
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from run_me import PIPELINE_SETTINGS, get_pipeline
+from hy3dgen.shapegen.metrics import chamfer_distance
+from hy3dgen.shapegen.models.autoencoders import (FlashVDMVolumeDecoding, HierarchicalVolumeDecoding,
+                                                  MCSurfaceExtractor)
+from bench_guidance import sample
+
+
+def rss_bytes():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+class PeakMemory:
+    """Peak memory growth inside the block: CUDA allocator stats, or the sampled RSS on the CPU."""
+
+    def __init__(self, device, interval=0.005):
+        self.device = device
+        self.interval = interval
+        self.peak = 0
+
+    def __enter__(self):
+        if self.device.type == 'cuda':
+            torch.cuda.synchronize()
+            torch.cuda.reset_peak_memory_stats()
+            self.start = torch.cuda.memory_allocated()
+            return self
+        self.start = rss_bytes()
+        self._top = self.start
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self._top = max(self._top, rss_bytes())
+
+    def __exit__(self, *exc):
+        if self.device.type == 'cuda':
+            torch.cuda.synchronize()
+            self.peak = torch.cuda.max_memory_allocated() - self.start
+        else:
+            self._stop.set()
+            self._thread.join()
+            self.peak = max(self._top, rss_bytes()) - self.start
+
+
+def grid_bytes(grid_logits):
+    if isinstance(grid_logits, list):
+        return sum(grid.nbytes for grid in grid_logits)
+    return grid_logits.numel() * grid_logits.element_size()
+
+
+def run(pipeline, decoded, decoder, resolution, call_kwargs):
+    kwargs = dict(bounds=1.01, mc_level=call_kwargs['mc_level'], num_chunks=call_kwargs['num_chunks'],
+                  octree_resolution=resolution, enable_pbar=False)
+    with torch.inference_mode(), PeakMemory(decoded.device) as memory:
+        start = time.perf_counter()
+        grid_logits = decoder(decoded, pipeline.vae.geo_decoder, **kwargs)
+        decoding = time.perf_counter() - start
+    start = time.perf_counter()
+    mesh = MCSurfaceExtractor()(grid_logits, **kwargs)[0]
+    extraction = time.perf_counter() - start
+    return mesh, {'decoding': decoding, 'extraction': extraction, 'peak_bytes': memory.peak,
+                  'grid_bytes': grid_bytes(grid_logits)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', required=True, help="input image (background removed)")
+    parser.add_argument('--resolutions', type=int, nargs='+', default=[256, 384, 512])
+    parser.add_argument('--decoder', choices=['hierarchical', 'flashvdm'], default='hierarchical')
+    parser.add_argument('--steps', type=int, help="override num_inference_steps")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write all runs as JSON here")
+    args = parser.parse_args()
+
+    call_kwargs = {k: v for k, v in PIPELINE_SETTINGS.items() if k != 'model'}
+    if args.steps:
+        call_kwargs['num_inference_steps'] = args.steps
+    pipeline = get_pipeline()
+    latents, _ = sample(pipeline, str(Path(args.image).resolve()), args.seed, None, call_kwargs)
+    with torch.inference_mode():
+        decoded = pipeline.vae(1. / pipeline.vae.scale_factor * latents)
+
+    def make_decoder(sparse):
+        if args.decoder == 'flashvdm':
+            return FlashVDMVolumeDecoding(sparse=sparse)
+        return HierarchicalVolumeDecoding(sparse=sparse)
+
+    runs = []
+    for resolution in args.resolutions:
+        dense_mesh, dense = run(pipeline, decoded, make_decoder(False), resolution, call_kwargs)
+        sparse_mesh, sparse = run(pipeline, decoded, make_decoder(True), resolution, call_kwargs)
+        same = dense_mesh is not None and sparse_mesh is not None
+        runs.append({
+            'resolution': resolution, 'dense': dense, 'sparse': sparse,
+            'dense_counts': None if dense_mesh is None else [len(dense_mesh.mesh_v), len(dense_mesh.mesh_f)],
+            'sparse_counts': None if sparse_mesh is None else [len(sparse_mesh.mesh_v), len(sparse_mesh.mesh_f)],
+            'chamfer': chamfer_distance(dense_mesh, sparse_mesh) if same else None,
+        })
+
+    mb = 1024 ** 2
+    print(f"{'res':>4} | {'decode dense/sparse (s)':>23} | {'extract dense/sparse (s)':>24} | "
+          f"{'peak dense/sparse (MB)':>22} | {'grid dense/sparse (MB)':>22} | {'V/F dense':>15} | "
+          f"{'V/F sparse':>15} | {'chamfer':>8}")
+    for r in runs:
+        d, s = r['dense'], r['sparse']
+        counts = [f"{c[0]}/{c[1]}" if c else '-' for c in (r['dense_counts'], r['sparse_counts'])]
+        chamfer = float('nan') if r['chamfer'] is None else r['chamfer']
+        print(f"{r['resolution']:>4} | {d['decoding']:11.2f}/{s['decoding']:<11.2f} | "
+              f"{d['extraction']:12.2f}/{s['extraction']:<11.2f} | "
+              f"{d['peak_bytes'] / mb:11.0f}/{s['peak_bytes'] / mb:<10.0f} | "
+              f"{d['grid_bytes'] / mb:11.0f}/{s['grid_bytes'] / mb:<10.0f} | {counts[0]:>15} | {counts[1]:>15} | "
+              f"{chamfer:8.5f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'device': str(pipeline.device), 'decoder': args.decoder, 'runs': runs}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
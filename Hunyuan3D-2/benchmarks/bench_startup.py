@@ -0,0 +1,88 @@
+"""
+Pipeline startup benchmark: load time and peak RSS of Hunyuan3DDiTFlowMatchingPipeline,
+with meta-device construction + memory-mapped weights (default) vs the legacy
+random-init-then-copy path.
+
+Every load runs in a fresh process so peak RSS is not polluted by earlier runs.
+
+    python benchmarks/bench_startup.py --repeats 3 --output startup.json
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+MODES = {'meta': True, 'legacy': False}  # mode -> low_cpu_mem_usage
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 ** 2 if sys.platform == 'darwin' else rss / 1024
+
+
+def load_once(mode, model_path, subfolder, device):
+    start = time.perf_counter()
+    from hy3dgen.shapegen import Hunyuan3DDiTFlowMatchingPipeline
+    imports = time.perf_counter() - start
+    pipeline = Hunyuan3DDiTFlowMatchingPipeline.from_pretrained(
+        model_path, subfolder=subfolder, device=device, low_cpu_mem_usage=MODES[mode])
+    return {
+        'mode': mode,
+        'seconds': time.perf_counter() - start,
+        'timings': {'imports': imports, **getattr(pipeline, 'load_timings', {})},
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def run_child(mode, args):
+    cmd = [sys.executable, __file__, '--child', mode, '--model-path', args.model_path,
+           '--subfolder', args.subfolder, '--device', args.device]
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model-path', default=str(ROOT))
+    parser.add_argument('--subfolder', default='hunyuan3d-dit-v2-0')
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=list(MODES))
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--output', help="write all runs as JSON here")
+    parser.add_argument('--child', choices=list(MODES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(load_once(args.child, args.model_path, args.subfolder, args.device)))
+        return
+
+    runs = []
+    for mode in args.modes:
+        for i in range(args.repeats):
+            run = run_child(mode, args)
+            runs.append(run)
+            phases = ', '.join(f"{k} {v:.2f}s" for k, v in run['timings'].items())
+            print(f"{mode:>6} #{i + 1}: {run['seconds']:.2f}s, peak RSS {run['peak_rss_mb']:.0f} MB ({phases})")
+
+    print()
+    print(f"{'mode':>6} | {'best load (s)':>13} | {'peak RSS (MB)':>13}")
+    for mode in args.modes:
+        mode_runs = [r for r in runs if r['mode'] == mode]
+        print(f"{mode:>6} | {min(r['seconds'] for r in mode_runs):13.2f} | "
+              f"{max(r['peak_rss_mb'] for r in mode_runs):13.0f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'device': args.device, 'cpu_count': os.cpu_count(), 'runs': runs}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -12,14 +12,120 @@
 # fine-tuning enabling code and other elements of the foregoing made publicly available
 # by Tencent in accordance with TENCENT HUNYUAN COMMUNITY LICENSE AGREEMENT.
 
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
 from PIL import Image
 from rembg import remove, new_session
 
+DEFAULT_MODEL = 'u2net'  # what rembg.new_session() loads when no name is given
+# Sessions per model. Each holds its own copy of the model and they split the cores between them,
+# so a few sessions with several threads each beat one single-threaded session per core.
+DEFAULT_POOL_SIZE = int(os.environ.get('HY3DGEN_REMBG_SESSIONS', 0)) or min(4, os.cpu_count() or 1)
+
+
+def new_pooled_session(model_name, threads):
+    """
+    rembg.new_session(model_name) with `threads` intra-op threads (new_session gives every session
+    one per core, or OMP_NUM_THREADS for all of them).
+    """
+    try:
+        import onnxruntime as ort
+        from rembg.sessions import sessions_class
+    except ImportError:
+        # rembg without a session registry: its own defaults
+        return new_session(model_name)
+    for session_class in sessions_class:
+        if session_class.name() == model_name:
+            sess_opts = ort.SessionOptions()
+            sess_opts.intra_op_num_threads = threads
+            return session_class(model_name, sess_opts)
+    return new_session(model_name)  # rembg's error for an unknown model
+
+
+class SessionPool:
+    """ A bounded pool of rembg sessions for one model.
+
+        Sessions are created lazily (at most `size` of them) and handed out one
+        caller at a time, so concurrent requests never rebuild the ONNX session
+        and never share one mid-inference. Each runs on cpu_count // size threads,
+        so a busy pool uses every core without oversubscribing them.
+    """
+
+    def __init__(self, model_name, size=None):
+        self.model_name = model_name
+        self.size = size or DEFAULT_POOL_SIZE
+        self.threads = max(1, (os.cpu_count() or 1) // self.size)
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _try_create(self):
+        with self._lock:
+            if self._created >= self.size:
+                return None
+            self._created += 1
+        try:
+            return new_pooled_session(self.model_name, self.threads)
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def warmup(self, count=1):
+        """Pre-loads `count` sessions so the first requests skip the model load."""
+        for _ in range(max(0, min(count, self.size) - self._created)):
+            session = self._try_create()
+            if session is None:
+                break
+            self._idle.put(session)
+
+    @contextmanager
+    def session(self):
+        try:
+            session = self._idle.get_nowait()
+        except queue.Empty:
+            session = self._try_create()
+            if session is None:
+                # Pool exhausted: wait for another caller to hand one back
+                session = self._idle.get()
+        try:
+            yield session
+        finally:
+            self._idle.put(session)
+
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_session_pool(model_name=DEFAULT_MODEL, size=None):
+    """Returns the process-wide pool for `model_name`, creating it on first use."""
+    with _POOLS_LOCK:
+        pool = _POOLS.get(model_name)
+        if pool is None:
+            pool = _POOLS[model_name] = SessionPool(model_name, size=size)
+        return pool
+
+
+def warmup_sessions(model_names, count=1):
+    for model_name in model_names:
+        get_session_pool(model_name).warmup(count)
+
+
+def remove_background(image: Image.Image, model_name=DEFAULT_MODEL, **kwargs):
+    with get_session_pool(model_name).session() as session:
+        return remove(image, session=session, **kwargs)
+
 
 class BackgroundRemover():
-    def __init__(self):
-        self.session = new_session()
+    def __init__(self, model_name=DEFAULT_MODEL):
+        self.pool = get_session_pool(model_name)
+        self.pool.warmup()
 
     def __call__(self, image: Image.Image):
-        output = remove(image, session=self.session, bgcolor=[255, 255, 255, 0])
+        with self.pool.session() as session:
+            output = remove(image, session=session, bgcolor=[255, 255, 255, 0])
         return output
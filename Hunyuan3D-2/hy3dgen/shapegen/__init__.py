@@ -13,5 +13,11 @@
 # by Tencent in accordance with TENCENT HUNYUAN COMMUNITY LICENSE AGREEMENT.
 
 from .pipelines import Hunyuan3DDiTPipeline, Hunyuan3DDiTFlowMatchingPipeline
+from .cond_cache import ConditioningCache
+from .cpu_profile import apply_cpu_profile
+from .quantization import QUANTIZATION_MODES
+from .exporters import export_mesh
+from .shared_weights import export_shared_weights, load_shared_weights
 from .postprocessors import FaceReducer, FloaterRemover, DegenerateFaceRemover, MeshSimplifier
 from .preprocessors import ImageProcessorV2, IMAGE_PROCESSORS, DEFAULT_IMAGEPROCESSOR
+from .schedulers import SCHEDULERS
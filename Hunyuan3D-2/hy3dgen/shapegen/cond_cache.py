@@ -0,0 +1,192 @@
+# Hunyuan 3D is licensed under the TENCENT HUNYUAN NON-COMMERCIAL LICENSE AGREEMENT
+# except for the third-party components listed below.
+# Hunyuan 3D does not impose any additional limitations beyond what is outlined
+# in the repsective licenses of these third-party components.
+# Users must comply with all terms and conditions of original licenses of these third-party
+# components and must ensure that the usage of the third party components adheres to
+# all relevant laws and regulations.
+
+# For avoidance of doubts, Hunyuan 3D means the large language models and
+# their software and algorithms, including trained model weights, parameters (including
+# optimizer states), machine-learning model code, inference-enabling code, training-enabling code,
+# fine-tuning enabling code and other elements of the foregoing made publicly available
+# by Tencent in accordance with TENCENT HUNYUAN COMMUNITY LICENSE AGREEMENT.
+
+"""
+Cache of conditioner outputs, so a re-submitted image never goes through the image encoder again.
+
+An entry is the conditioning of ONE image, keyed by the hash of its preprocessed tensors
+(image, mask, ...) and a fingerprint of the conditioner (config, checkpoint, dtype, device).
+Seeds, step counts and octree resolutions do not change the conditioning, so they are not
+part of the key. Entries live in a small in-memory LRU and, optionally, in a size-bounded
+directory shared by every process pointing at it.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import torch
+
+from .utils import logger
+
+
+def conditioner_fingerprint(config, weights_path):
+    """
+    Identifies a conditioner: its config plus the identity (name, size, mtime) of the weights it was loaded from.
+    :param config: the 'conditioner' section of the pipeline config
+    :param weights_path: checkpoint or shared weights file
+    """
+    st = os.stat(weights_path)
+    payload = json.dumps([config, os.path.basename(weights_path), st.st_size, st.st_mtime_ns], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def map_cond(fn, cond):
+    """Applies `fn` to every tensor of a (nested) conditioner output."""
+    if isinstance(cond, torch.Tensor):
+        return fn(cond)
+    return {k: map_cond(fn, v) for k, v in cond.items()}
+
+
+def cat_conds(conds):
+    """Concatenates per-item conditioner outputs along the batch dimension."""
+    if isinstance(conds[0], torch.Tensor):
+        return torch.cat(conds, dim=0)
+    return {k: cat_conds([c[k] for c in conds]) for k in conds[0]}
+
+
+class ConditioningCache:
+    """
+    Two-tier LRU of per-image conditioner outputs: `memory_items` entries in RAM (on the CPU)
+    and, with `cache_dir`, up to `max_bytes` of .pt files on disk. Thread-safe.
+    """
+
+    def __init__(self, fingerprint, cache_dir=None, memory_items=16, max_bytes=2 * 1024 ** 3):
+        self.fingerprint = fingerprint
+        self.cache_dir = cache_dir
+        self.memory_items = memory_items
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, inputs, dtype, device):
+        """
+        Key of one image's conditioning.
+        :param inputs: the image's conditioner inputs ({'image': tensor, 'mask': tensor, ...}, batch of one)
+        """
+        h = hashlib.sha256(f'{self.fingerprint}|{dtype}|{torch.device(device).type}'.encode())
+        for name in sorted(inputs):
+            value = inputs[name]
+            h.update(name.encode())
+            if isinstance(value, torch.Tensor):
+                value = value.detach().to('cpu').contiguous()
+                h.update(f'{value.dtype}{tuple(value.shape)}'.encode())
+                h.update(value.reshape(-1).view(torch.uint8).numpy().tobytes())
+            else:
+                h.update(repr(value).encode())
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.pt')
+
+    def get(self, key):
+        """Returns the cached conditioning (CPU tensors) or None."""
+        with self._lock:
+            cond = self._memory.get(key)
+            if cond is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return cond
+        if self.cache_dir:
+            path = self._path(key)
+            try:
+                cond = torch.load(path, map_location='cpu', weights_only=True)
+                now = time.time()
+                os.utime(path, (now, now))
+            except (OSError, RuntimeError, EOFError):
+                cond = None  # missing, evicted under our feet or torn: recompute
+            if cond is not None:
+                self._remember(key, cond)
+                with self._lock:
+                    self.hits += 1
+                return cond
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, cond):
+        cond = map_cond(lambda t: t.detach().to('cpu').clone(), cond)
+        self._remember(key, cond)
+        if self.cache_dir:
+            path = self._path(key)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            torch.save(cond, tmp_path)
+            os.replace(tmp_path, path)
+            self.evict()
+
+    def _remember(self, key, cond):
+        with self._lock:
+            self._memory[key] = cond
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def evict(self):
+        """Deletes the least recently used files until the directory fits in `max_bytes`."""
+        with self._lock:
+            entries = []
+            total = 0
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.endswith('.pt'):
+                        st = entry.stat()
+                        entries.append((st.st_mtime, st.st_size, entry.path))
+                        total += st.st_size
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+        return total
+
+    def encode(self, conditioner, image, additional_cond_inputs, dtype, device):
+        """
+        Conditioner output for a batch, running the conditioner only on the images that are not cached.
+        :return: same structure as `conditioner(image=image, **additional_cond_inputs)`
+        """
+        batch_size = image.shape[0]
+        items = []
+        for i in range(batch_size):
+            # Tensors and the per-image lists prepare_image builds for other values slice the same way
+            inputs = {'image': image[i:i + 1]}
+            inputs.update({name: value[i:i + 1] for name, value in additional_cond_inputs.items()})
+            items.append(inputs)
+
+        keys = [self.key(inputs, dtype, device) for inputs in items]
+        conds = [self.get(key) for key in keys]
+        missing = [i for i, cond in enumerate(conds) if cond is None]
+        if missing:
+            miss_inputs = cat_conds([{k: v for k, v in items[i].items() if isinstance(v, torch.Tensor)}
+                                     for i in missing])
+            for name, value in additional_cond_inputs.items():
+                if not isinstance(value, torch.Tensor):
+                    miss_inputs[name] = [item for i in missing for item in items[i][name]]
+            miss_image = miss_inputs.pop('image')
+            encoded = conditioner(image=miss_image, **miss_inputs)
+            for j, i in enumerate(missing):
+                conds[i] = map_cond(lambda t: t[j:j + 1], encoded)
+                self.put(keys[i], conds[i])
+        logger.info(f'Conditioning cache: {batch_size - len(missing)}/{batch_size} hits')
+        return map_cond(lambda t: t.to(device), cat_conds(conds))
@@ -0,0 +1,149 @@
+# Hunyuan 3D is licensed under the TENCENT HUNYUAN NON-COMMERCIAL LICENSE AGREEMENT
+# except for the third-party components listed below.
+# Hunyuan 3D does not impose any additional limitations beyond what is outlined
+# in the repsective licenses of these third-party components.
+# Users must comply with all terms and conditions of original licenses of these third-party
+# components and must ensure that the usage of the third party components adheres to
+# all relevant laws and regulations.
+
+# For avoidance of doubts, Hunyuan 3D means the large language models and
+# their software and algorithms, including trained model weights, parameters (including
+# optimizer states), machine-learning model code, inference-enabling code, training-enabling code,
+# fine-tuning enabling code and other elements of the foregoing made publicly available
+# by Tencent in accordance with TENCENT HUNYUAN COMMUNITY LICENSE AGREEMENT.
+
+"""
+CPU execution profile for the shape pipeline.
+
+fp16 matmuls have no fast path on most CPUs, so the pipeline's fp16 default is the slowest choice
+there. `apply_cpu_profile` runs the DiT and the image encoder in bf16 where the CPU has native bf16
+support (AVX512-BF16 / AMX) and in fp32 otherwise, keeps the VAE (whose logits decide the surface)
+in fp32, casts activations at the module boundaries, sizes the thread pools and restricts
+scaled-dot-product attention to the backends that have CPU kernels. `torch.compile` with the
+inductor backend is optional.
+"""
+
+import contextlib
+import functools
+import os
+
+import torch
+
+from .utils import logger
+
+# Modules that run in bf16 when the CPU supports it; the rest of the pipeline stays in fp32
+BF16_MODULES = ('model', 'conditioner')
+PROFILE_MODULES = ('model', 'conditioner', 'vae')
+
+
+def _cpu_flags():
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('flags'):
+                    return set(line.split(':', 1)[1].split())
+    except OSError:
+        pass
+    return set()
+
+
+def cpu_supports_bf16():
+    """True if bf16 matmuls have a native kernel on this CPU (oneDNN check, else the cpuinfo flags)."""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return bool(_cpu_flags() & {'avx512_bf16', 'amx_bf16'})
+
+
+def cpu_inference_dtype():
+    return torch.bfloat16 if cpu_supports_bf16() else torch.float32
+
+
+def available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def configure_cpu_threads(num_threads=None, num_interop_threads=None):
+    """
+    Sizes torch's intra-op pool (default: the CPUs this process may run on, which respects
+    OMP_NUM_THREADS set by a multi-worker launcher) and its inter-op pool (default: 1; the
+    pipeline runs one op at a time, so extra inter-op threads only compete for cores).
+    """
+    if num_threads is None:
+        num_threads = int(os.environ.get('OMP_NUM_THREADS', 0)) or available_cpus()
+    torch.set_num_threads(num_threads)
+    if num_interop_threads is None:
+        num_interop_threads = 1
+    try:
+        torch.set_num_interop_threads(num_interop_threads)
+    except RuntimeError:
+        # Only settable before the first inter-op parallel work in this process
+        logger.info(f'Inter-op threads already fixed at {torch.get_num_interop_threads()}')
+    return num_threads, torch.get_num_interop_threads()
+
+
+def sdpa_context():
+    """Limits scaled_dot_product_attention to the backends with CPU kernels (flash, then math)."""
+    try:
+        from torch.nn.attention import sdpa_kernel, SDPBackend
+    except ImportError:
+        return contextlib.nullcontext()
+    return sdpa_kernel([SDPBackend.FLASH_ATTENTION, SDPBackend.MATH])
+
+
+def _cast_floats(value, dtype):
+    if isinstance(value, torch.Tensor):
+        return value.to(dtype) if value.is_floating_point() and value.dtype != dtype else value
+    if isinstance(value, dict):
+        return {k: _cast_floats(v, dtype) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_cast_floats(v, dtype) for v in value)
+    return value
+
+
+def _wrap_forward(module, dtype):
+    """Casts floating inputs to `dtype` and runs forward under the CPU SDPA backends."""
+    forward = getattr(module, '_cpu_profile_forward', None) or module.forward
+
+    @functools.wraps(forward)
+    def profiled_forward(*args, **kwargs):
+        with sdpa_context():
+            return forward(*_cast_floats(args, dtype), **_cast_floats(kwargs, dtype))
+
+    module._cpu_profile_forward = forward
+    module.forward = profiled_forward
+
+
+def apply_cpu_profile(pipeline, dtype=None, cast=True, compile=False, num_threads=None, num_interop_threads=None):
+    """
+    Tunes a pipeline that runs on the CPU. Apply it once per pipeline.
+    :param dtype: dtype of BF16_MODULES; default bf16 if the CPU supports it, else fp32
+    :param cast: cast the module weights; False keeps them as loaded (e.g. shared, memory-mapped weights)
+    :param compile: torch.compile the DiT with the inductor backend (slow first call, faster steps)
+    :return: {module name: dtype}
+    """
+    if pipeline.device.type != 'cpu':
+        raise ValueError(f'apply_cpu_profile needs a pipeline on the CPU, got {pipeline.device}')
+    threads = configure_cpu_threads(num_threads, num_interop_threads)
+    dtype = dtype or cpu_inference_dtype()
+
+    dtypes = {}
+    for name in PROFILE_MODULES:
+        module = getattr(pipeline, name)
+        if cast:
+            module.to(dtype=dtype if name in BF16_MODULES else torch.float32)
+        dtypes[name] = next(module.parameters()).dtype
+        _wrap_forward(module, dtypes[name])
+    # The volume decoders call the geometry decoder directly, not through vae.forward
+    _wrap_forward(pipeline.vae.geo_decoder, dtypes['vae'])
+    # Latents and the conditioning follow the DiT
+    pipeline.dtype = dtypes['model']
+
+    if compile:
+        pipeline.model = torch.compile(pipeline.model, backend='inductor')
+    logger.info(f'CPU profile: {", ".join(f"{k} {v}" for k, v in dtypes.items())}, '
+                f'{threads[0]} intra-op / {threads[1]} inter-op threads' + (', compiled DiT' if compile else ''))
+    return dtypes
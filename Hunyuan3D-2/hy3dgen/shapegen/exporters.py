@@ -0,0 +1,160 @@
+# Hunyuan 3D is licensed under the TENCENT HUNYUAN NON-COMMERCIAL LICENSE AGREEMENT
+# except for the third-party components listed below.
+# Hunyuan 3D does not impose any additional limitations beyond what is outlined
+# in the repsective licenses of these third-party components.
+# Users must comply with all terms and conditions of original licenses of these third-party
+# components and must ensure that the usage of the third party components adheres to
+# all relevant laws and regulations.
+
+# For avoidance of doubts, Hunyuan 3D means the large language models and
+# their software and algorithms, including trained model weights, parameters (including
+# optimizer states), machine-learning model code, inference-enabling code, training-enabling code,
+# fine-tuning enabling code and other elements of the foregoing made publicly available
+# by Tencent in accordance with TENCENT HUNYUAN COMMUNITY LICENSE AGREEMENT.
+
+import json
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .utils import synchronize_timer
+
+# One binary STL record: facet normal, three vertices, attribute byte count
+STL_DTYPE = np.dtype([('normal', '<f4', (3,)), ('vertices', '<f4', (3, 3)), ('attributes', '<u2')])
+
+GLB_MAGIC = 0x46546C67  # b'glTF'
+GLB_CHUNK_JSON = 0x4E4F534A  # b'JSON'
+GLB_CHUNK_BIN = 0x004E4942  # b'BIN\0'
+GL_FLOAT = 5126
+GL_UNSIGNED_INT = 5125
+GL_ARRAY_BUFFER = 34962
+GL_ELEMENT_ARRAY_BUFFER = 34963
+
+
+# Vertices closer than this many decimals are one: trimesh's tol.merge, which Trimesh(vertices, faces) welds with
+MERGE_DIGITS = 8
+
+
+def merge_vertices(vertices, faces):
+    """
+    Welds vertices at the same position (rounded to MERGE_DIGITS decimals) and drops the ones no face
+    uses, as trimesh.Trimesh(vertices, faces) does, keeping the first occurrences in their order.
+    :return: (vertices, faces) with the faces renumbered
+    """
+    referenced = np.zeros(len(vertices), dtype=bool)
+    referenced[faces.ravel()] = True
+    index = np.flatnonzero(referenced)
+    keys = np.round(vertices[index].astype(np.float64) * 10.0 ** MERGE_DIGITS).astype(np.int64)
+    _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    remap = np.zeros(len(vertices), dtype=np.uint32)
+    remap[index] = rank[inverse.reshape(-1)]
+    return np.ascontiguousarray(vertices[index[first[order]]]), remap[faces]
+
+
+def mesh_arrays(mesh_output):
+    """
+    Vertex (float32) and face (uint32) arrays of a `Latent2MeshOutput`, with the faces
+    flipped the way `export_to_trimesh` does and the vertices welded as trimesh welded
+    them (merge_vertices). Computed once and shared by every format.
+    """
+    vertices = np.ascontiguousarray(mesh_output.mesh_v, dtype=np.float32)
+    faces = np.ascontiguousarray(mesh_output.mesh_f[:, ::-1], dtype=np.uint32)
+    if len(faces) == 0:
+        return vertices[:0], faces
+    return merge_vertices(vertices, faces)
+
+
+def stl_bytes(vertices, faces):
+    """Binary STL of the triangles, packed in one structured array."""
+    triangles = vertices[faces]
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    # Degenerate faces keep their zero normal instead of becoming NaN
+    np.divide(normals, lengths, out=normals, where=lengths > 0)
+
+    records = np.zeros(len(faces), dtype=STL_DTYPE)
+    records['normal'] = normals
+    records['vertices'] = triangles
+    header = b'binary STL exported by hy3dgen'.ljust(80, b'\0')
+    return header + struct.pack('<I', len(faces)) + records.tobytes()
+
+
+def glb_bytes(vertices, faces):
+    """Minimal glTF 2.0 binary: one mesh with POSITION and uint32 indices."""
+    position_bytes = vertices.tobytes()
+    index_bytes = faces.tobytes()
+    has_vertices = len(vertices) > 0
+    gltf = {
+        'asset': {'version': '2.0', 'generator': 'hy3dgen'},
+        'scene': 0,
+        'scenes': [{'nodes': [0]}],
+        'nodes': [{'mesh': 0}],
+        'meshes': [{'primitives': [{'attributes': {'POSITION': 0}, 'indices': 1, 'mode': 4}]}],
+        'accessors': [
+            {
+                'bufferView': 0, 'componentType': GL_FLOAT, 'count': len(vertices), 'type': 'VEC3',
+                # min/max are required for POSITION
+                'min': vertices.min(axis=0).tolist() if has_vertices else [0, 0, 0],
+                'max': vertices.max(axis=0).tolist() if has_vertices else [0, 0, 0],
+            },
+            {'bufferView': 1, 'componentType': GL_UNSIGNED_INT, 'count': faces.size, 'type': 'SCALAR'},
+        ],
+        'bufferViews': [
+            {'buffer': 0, 'byteOffset': 0, 'byteLength': len(position_bytes), 'target': GL_ARRAY_BUFFER},
+            {'buffer': 0, 'byteOffset': len(position_bytes), 'byteLength': len(index_bytes),
+             'target': GL_ELEMENT_ARRAY_BUFFER},
+        ],
+        'buffers': [{'byteLength': len(position_bytes) + len(index_bytes)}],
+    }
+    json_chunk = json.dumps(gltf, separators=(',', ':')).encode()
+    json_chunk += b' ' * (-len(json_chunk) % 4)
+    bin_chunk = position_bytes + index_bytes
+    bin_chunk += b'\0' * (-len(bin_chunk) % 4)
+
+    total = 12 + 8 + len(json_chunk) + 8 + len(bin_chunk)
+    return b''.join([
+        struct.pack('<III', GLB_MAGIC, 2, total),
+        struct.pack('<II', len(json_chunk), GLB_CHUNK_JSON), json_chunk,
+        struct.pack('<II', len(bin_chunk), GLB_CHUNK_BIN), bin_chunk,
+    ])
+
+
+MESH_WRITERS = {
+    '.stl': stl_bytes,
+    '.glb': glb_bytes,
+}
+
+
+def _write_atomic(path, data):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+@synchronize_timer('Export mesh')
+def export_mesh(mesh_output, paths):
+    """
+    Writes a `Latent2MeshOutput` to every path in `paths` (format picked by extension, see
+    MESH_WRITERS) in one pass: the arrays are prepared once and the files are packed and
+    written concurrently. Each file goes to a temp name first, so readers never see a partial mesh.
+    :param mesh_output: `Latent2MeshOutput` (pipeline called with output_type='mesh')
+    :param paths: output file paths
+    """
+    vertices, faces = mesh_arrays(mesh_output)
+    for path in paths:
+        if os.path.splitext(str(path))[1].lower() not in MESH_WRITERS:
+            raise ValueError(f"Unsupported mesh format {path}, available: {list(MESH_WRITERS)}")
+
+    def write(path):
+        writer = MESH_WRITERS[os.path.splitext(str(path))[1].lower()]
+        _write_atomic(str(path), writer(vertices, faces))
+
+    # numpy packing and file I/O release the GIL, so threads overlap the formats
+    with ThreadPoolExecutor(max_workers=max(len(paths), 1)) as pool:
+        list(pool.map(write, paths))
@@ -0,0 +1,82 @@
+# Hunyuan 3D is licensed under the TENCENT HUNYUAN NON-COMMERCIAL LICENSE AGREEMENT
+# except for the third-party components listed below.
+# Hunyuan 3D does not impose any additional limitations beyond what is outlined
+# in the repsective licenses of these third-party components.
+# Users must comply with all terms and conditions of original licenses of these third-party
+# components and must ensure that the usage of the third party components adheres to
+# all relevant laws and regulations.
+
+# For avoidance of doubts, Hunyuan 3D means the large language models and
+# their software and algorithms, including trained model weights, parameters (including
+# optimizer states), machine-learning model code, inference-enabling code, training-enabling code,
+# fine-tuning enabling code and other elements of the foregoing made publicly available
+# by Tencent in accordance with TENCENT HUNYUAN COMMUNITY LICENSE AGREEMENT.
+
+"""
+Geometric similarity of two generated shapes, for comparing a faster sampling or decoding
+mode against the reference one: chamfer distance between the meshes and IoU of the
+occupancy grids.
+"""
+
+import numpy as np
+import torch
+
+
+def _mesh_arrays(mesh):
+    """(vertices, faces) of a `Latent2MeshOutput`, a trimesh.Trimesh or a (vertices, faces) pair."""
+    if isinstance(mesh, (tuple, list)):
+        vertices, faces = mesh
+    elif hasattr(mesh, 'mesh_v'):
+        vertices, faces = mesh.mesh_v, mesh.mesh_f
+    else:
+        vertices, faces = mesh.vertices, mesh.faces
+    return np.asarray(vertices, dtype=np.float64), np.asarray(faces, dtype=np.int64)
+
+
+def sample_surface(mesh, num_points, seed=0):
+    """`num_points` points spread uniformly (by area) over the surface of `mesh`."""
+    vertices, faces = _mesh_arrays(mesh)
+    triangles = vertices[faces]
+    areas = 0.5 * np.linalg.norm(
+        np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0]), axis=1)
+    rng = np.random.default_rng(seed)
+    picked = rng.choice(len(faces), size=num_points, p=areas / areas.sum())
+    # Uniform barycentric coordinates: reflect the samples that fall outside the triangle
+    u, v = rng.random((2, num_points))
+    outside = u + v > 1
+    u[outside], v[outside] = 1 - u[outside], 1 - v[outside]
+    tri = triangles[picked]
+    return tri[:, 0] + u[:, None] * (tri[:, 1] - tri[:, 0]) + v[:, None] * (tri[:, 2] - tri[:, 0])
+
+
+def _nearest_distances(points, targets, chunk_size):
+    distances = []
+    for start in range(0, len(points), chunk_size):
+        distances.append(torch.cdist(points[start:start + chunk_size], targets).min(dim=1).values)
+    return torch.cat(distances)
+
+
+def chamfer_distance(mesh_a, mesh_b, num_points=30000, seed=0, chunk_size=4096):
+    """
+    Symmetric chamfer distance: mean distance from surface samples of each mesh to the nearest
+    sample of the other, summed over both directions. In the meshes' units (the shapes live in [-1, 1]^3).
+    """
+    a = torch.from_numpy(sample_surface(mesh_a, num_points, seed))
+    b = torch.from_numpy(sample_surface(mesh_b, num_points, seed + 1))
+    return float(_nearest_distances(a, b, chunk_size).mean() + _nearest_distances(b, a, chunk_size).mean())
+
+
+def occupancy_iou(grid_a, grid_b, level=0.0):
+    """
+    IoU of the occupied voxels of two logit grids of the same resolution (as returned by the volume
+    decoders; inside is logit > level). NaN voxels count as empty: the octree decoders leave everything
+    away from the surface (inside or out) as NaN, so for a volume IoU decode with VanillaVolumeDecoder.
+    """
+    if grid_a.shape != grid_b.shape:
+        raise ValueError(f"Grid shapes differ: {tuple(grid_a.shape)} vs {tuple(grid_b.shape)}")
+    inside_a = torch.nan_to_num(grid_a.float(), nan=level - 1) > level
+    inside_b = torch.nan_to_num(grid_b.float(), nan=level - 1) > level
+    union = (inside_a | inside_b).sum().item()
+    if union == 0:
+        return 1.0
+    return (inside_a & inside_b).sum().item() / union
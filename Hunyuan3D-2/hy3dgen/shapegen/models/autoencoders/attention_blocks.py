@@ -200,17 +200,29 @@ class QKVMultiheadCrossAttention(nn.Module):
 
         self.attn_processor = CrossAttentionProcessor()
 
-    def forward(self, q, kv):
-        _, n_ctx, _ = q.shape
+    def split_kv(self, kv):
+        """Normalized keys and values (b, heads, n_data, d) of the projected data `kv` (b, n_data, 2 * width)."""
         bs, n_data, width = kv.shape
         attn_ch = width // self.heads // 2
-        q = q.view(bs, n_ctx, self.heads, -1)
         kv = kv.view(bs, n_data, self.heads, -1)
         k, v = torch.split(kv, attn_ch, dim=-1)
+        k = self.k_norm(k)
+        k, v = map(lambda t: rearrange(t, 'b n h d -> b h n d', h=self.heads), (k, v))
+        return k, v
+
+    def forward(self, q, kv):
+        """
+        :param kv: the projected data (b, n_data, 2 * width), or its split_kv (k, v); keys and values of
+            a single item are shared by every query batch element
+        """
+        bs, n_ctx, _ = q.shape
+        k, v = self.split_kv(kv) if isinstance(kv, torch.Tensor) else kv
+        if k.shape[0] != bs:
+            k, v = k.expand(bs, -1, -1, -1), v.expand(bs, -1, -1, -1)
+        q = q.view(bs, n_ctx, self.heads, -1)
 
         q = self.q_norm(q)
-        k = self.k_norm(k)
-        q, k, v = map(lambda t: rearrange(t, 'b n h d -> b h n d', h=self.heads), (q, k, v))
+        q = rearrange(q, 'b n h d -> b h n d', h=self.heads)
         out = self.attn_processor(self, q, k, v)
         out = out.transpose(1, 2).reshape(bs, n_ctx, -1)
         return out
@@ -247,9 +259,15 @@ class MultiheadCrossAttention(nn.Module):
         self.kv_cache = kv_cache
         self.data = None
 
-    def forward(self, x, data):
+    def project_kv(self, data):
+        """Keys and values (k, v) of `data`, to pass as `kv` to every forward on the same data."""
+        return self.attention.split_kv(self.c_kv(data))
+
+    def forward(self, x, data=None, kv=None):
         x = self.c_q(x)
-        if self.kv_cache:
+        if kv is not None:
+            data = kv
+        elif self.kv_cache:
             if self.data is None:
                 self.data = self.c_kv(data)
                 logger.info('Save kv cache,this should be called only once for one mesh')
@@ -293,8 +311,15 @@ class ResidualCrossAttentionBlock(nn.Module):
         self.ln_3 = norm_layer(width, elementwise_affine=True, eps=1e-6)
         self.mlp = MLP(width=width, expand_ratio=mlp_expand_ratio)
 
-    def forward(self, x: torch.Tensor, data: torch.Tensor):
-        x = x + self.attn(self.ln_1(x), self.ln_2(data))
+    def precompute_kv(self, data: torch.Tensor):
+        """Keys and values of `data` for the cross attention: pass them as `kv` instead of `data`."""
+        return self.attn.project_kv(self.ln_2(data))
+
+    def forward(self, x: torch.Tensor, data: torch.Tensor = None, kv=None):
+        if kv is None:
+            x = x + self.attn(self.ln_1(x), self.ln_2(data))
+        else:
+            x = x + self.attn(self.ln_1(x), kv=kv)
         x = x + self.mlp(self.ln_3(x))
         return x
 
@@ -481,13 +506,34 @@ class CrossAttentionDecoder(nn.Module):
     def set_default_cross_attention_processor(self):
         self.cross_attn_decoder.attn.attention.attn_processor = CrossAttentionProcessor
 
-    def forward(self, queries=None, query_embeddings=None, latents=None):
-        if query_embeddings is None:
-            query_embeddings = self.query_proj(self.fourier_embedder(queries).to(latents.dtype))
-        self.count += query_embeddings.shape[1]
+    def embed_queries(self, queries, dtype):
+        """Query embeddings of the points `queries` (..., 3), as forward computes them for latents of `dtype`."""
+        return self.query_proj(self.fourier_embedder(queries).to(dtype))
+
+    def precompute_kv(self, latents):
+        """
+        Keys and values (k, v) of `latents` (B, n, width) for the cross attention, each (B, heads, n, d).
+        The volume decoders compute them once per mesh and pass them as `kv` to every query chunk, instead
+        of projecting the same latents again (latents_proj, ln, c_kv, k_norm) for every chunk.
+        """
         if self.downsample_ratio != 1:
             latents = self.latents_proj(latents)
-        x = self.cross_attn_decoder(query_embeddings, latents)
+        return self.cross_attn_decoder.precompute_kv(latents)
+
+    def forward(self, queries=None, query_embeddings=None, latents=None, kv=None):
+        """
+        :param kv: precompute_kv of the latents, used instead of `latents`; keys and values of one item
+            serve every query batch element
+        """
+        if query_embeddings is None:
+            query_embeddings = self.embed_queries(queries, latents.dtype if kv is None else kv[0].dtype)
+        self.count += query_embeddings.shape[1]
+        if kv is not None:
+            x = self.cross_attn_decoder(query_embeddings, kv=kv)
+        else:
+            if self.downsample_ratio != 1:
+                latents = self.latents_proj(latents)
+            x = self.cross_attn_decoder(query_embeddings, latents)
         if self.enable_ln_post:
             x = self.ln_post(x)
         occ = self.output_proj(x)
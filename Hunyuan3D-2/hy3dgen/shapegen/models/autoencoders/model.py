@@ -24,7 +24,8 @@ import yaml
 from .attention_blocks import FourierEmbedder, Transformer, CrossAttentionDecoder, PointCrossAttentionEncoder
 from .surface_extractors import MCSurfaceExtractor, SurfaceExtractors
 from .volume_decoders import VanillaVolumeDecoder, FlashVDMVolumeDecoding, HierarchicalVolumeDecoding
-from ...utils import logger, synchronize_timer, smart_load_model
+from ...utils import logger, synchronize_timer, smart_load_model, empty_weights, load_safetensors, \
+    assign_state_dict
 
 
 class DiagonalGaussianDistribution(object):
@@ -86,6 +87,7 @@ class VectsetVAE(nn.Module):
         device='cuda',
         dtype=torch.float16,
         use_safetensors=None,
+        low_cpu_mem_usage=True,
         **kwargs,
     ):
         # load config
@@ -99,17 +101,26 @@ class VectsetVAE(nn.Module):
             raise FileNotFoundError(f"Model file {ckpt_path} not found")
 
         logger.info(f"Loading model from {ckpt_path}")
-        if use_safetensors:
-            import safetensors.torch
-            ckpt = safetensors.torch.load_file(ckpt_path, device='cpu')
-        else:
-            ckpt = torch.load(ckpt_path, map_location='cpu', weights_only=True)
-
         model_kwargs = config['params']
         model_kwargs.update(kwargs)
 
-        model = cls(**model_kwargs)
-        model.load_state_dict(ckpt, strict=False)
+        if low_cpu_mem_usage:
+            # Meta-device construction + direct assignment from the memory-mapped checkpoint
+            if use_safetensors:
+                ckpt = load_safetensors(ckpt_path)
+            else:
+                ckpt = torch.load(ckpt_path, map_location='cpu', weights_only=True, mmap=True)
+            with empty_weights():
+                model = cls(**model_kwargs)
+            assign_state_dict(model, ckpt, strict=False)
+        else:
+            if use_safetensors:
+                import safetensors.torch
+                ckpt = safetensors.torch.load_file(ckpt_path, device='cpu')
+            else:
+                ckpt = torch.load(ckpt_path, map_location='cpu', weights_only=True)
+            model = cls(**model_kwargs)
+            model.load_state_dict(ckpt, strict=False)
         model.to(device=device, dtype=dtype)
         return model
 
@@ -169,8 +180,15 @@ class VectsetVAE(nn.Module):
         self.surface_extractor = surface_extractor
 
     def latents2mesh(self, latents: torch.FloatTensor, **kwargs):
+        """
+        :param kwargs: volume decoder / surface extractor options; an optional
+            `progress_callback(stage, **info)` is told about each decoding level and the extraction
+        """
+        progress_callback = kwargs.get('progress_callback')
         with synchronize_timer('Volume decoding'):
             grid_logits = self.volume_decoder(latents, self.geo_decoder, **kwargs)
+        if progress_callback is not None:
+            progress_callback('surface_extraction')
         with synchronize_timer('Surface extraction'):
             outputs = self.surface_extractor(grid_logits, **kwargs)
         return outputs
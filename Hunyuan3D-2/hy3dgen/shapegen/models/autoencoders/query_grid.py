@@ -0,0 +1,182 @@
+# Hunyuan 3D is licensed under the TENCENT HUNYUAN NON-COMMERCIAL LICENSE AGREEMENT
+# except for the third-party components listed below.
+# Hunyuan 3D does not impose any additional limitations beyond what is outlined
+# in the repsective licenses of these third-party components.
+# Users must comply with all terms and conditions of original licenses of these third-party
+# components and must ensure that the usage of the third party components adheres to
+# all relevant laws and regulations.
+
+# For avoidance of doubts, Hunyuan 3D means the large language models and
+# their software and algorithms, including trained model weights, parameters (including
+# optimizer states), machine-learning model code, inference-enabling code, training-enabling code,
+# fine-tuning enabling code and other elements of the foregoing made publicly available
+# by Tencent in accordance with TENCENT HUNYUAN COMMUNITY LICENSE AGREEMENT.
+
+"""
+Query points of the volume decoders, kept on the device from one mesh to the next.
+
+For a given `bounds` and octree resolution every mesh decodes the same coarse grid: its coordinates
+and their query embeddings (the geometry decoder's FourierEmbedder + query_proj) never change, so the
+embeddings are computed once and kept in a byte-bounded LRU. Coordinates are never built as a
+meshgrid: a point is looked up from its integer grid index in three per-axis tables, on the device,
+which is also how the finer octree levels get theirs.
+
+The embeddings are large (at octree resolution 384 the coarse grid's take about 1.9 GB) and stay
+resident for as long as the process lives, so the shared cache only keeps small entries by default
+(QUERY_CACHE_BYTES): the coordinate tables, and no whole-grid embeddings at the usual resolutions.
+Pipeline.enable_query_cache raises its budget where the memory is there to spare.
+"""
+
+import threading
+import weakref
+from collections import OrderedDict
+
+import torch
+
+from .sparse_volume import decode_points
+
+# Budget of the shared cache until enable_query_cache: the axis tables take 12 bytes per grid point of an axis
+QUERY_CACHE_BYTES = 16 * 1024 ** 2
+
+
+def normalize_bounds(bounds):
+    """(xmin, ymin, zmin, xmax, ymax, zmax) floats; a number b stands for [-b, b]^3."""
+    if isinstance(bounds, (int, float)):
+        bounds = [-bounds, -bounds, -bounds, bounds, bounds, bounds]
+    return tuple(float(b) for b in bounds)
+
+
+def grid_axes(bounds, resolution, device):
+    """
+    (3, resolution + 1) float32 coordinates of the grid along x, y and z: the values of
+    np.linspace(bbox_min[i], bbox_max[i], resolution + 1, dtype=np.float32), as generate_dense_grid_points.
+    """
+    axes = []
+    for low, high in zip(bounds[0:3], bounds[3:6]):
+        # Same arithmetic as np.linspace: float64 arange * step + start, exact end point, then float32
+        axis = torch.arange(resolution + 1, dtype=torch.float64) * ((high - low) / resolution) + low
+        axis[-1] = high
+        axes.append(axis.to(torch.float32))
+    return torch.stack(axes).to(device)
+
+
+def grid_points(axes, points):
+    """float32 coordinates (M, 3) of the integer grid points `points` (M, 3)."""
+    return torch.stack([axes[0][points[:, 0]], axes[1][points[:, 1]], axes[2][points[:, 2]]], dim=1)
+
+
+def decoder_dtype(geo_decoder, default):
+    """dtype the geometry decoder computes in: its weights' (the CPU profile casts its inputs to it)."""
+    return next((p.dtype for p in geo_decoder.parameters() if p.is_floating_point()), default)
+
+
+class QueryGridCache:
+    """
+    LRU of the grid axes and of the query embeddings of whole grids, per (bounds, resolution, dtype,
+    device) and, for embeddings, per geometry decoder; at most `max_bytes` in total. Embeddings that
+    would not fit are not computed: the decoders embed their query chunks as they go. Thread-safe.
+
+    Embeddings are keyed on the identity and dtype of the decoder's query_proj, so quantizing or casting
+    the VAE starts over; call clear() after loading other weights into the same modules in place.
+    """
+
+    def __init__(self, max_bytes=QUERY_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def resize(self, max_bytes):
+        """Sets the budget, evicting the least recently used entries that no longer fit."""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted.numel() * evicted.element_size()
+
+    def _get(self, key, owner=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            # The owner's id is part of the key; the weak reference tells a reused id from the same module
+            if entry is not None and (entry[1] is None or entry[1]() is owner):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def _put(self, key, value, owner=None):
+        nbytes = value.numel() * value.element_size()
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[0].numel() * old[0].element_size()
+            if nbytes <= self.max_bytes:
+                self._entries[key] = (value, None if owner is None else weakref.ref(owner))
+                self._bytes += nbytes
+                self._evict()
+        return value
+
+    def axes(self, bounds, resolution, device):
+        """grid_axes of the (resolution + 1)^3 grid in `bounds` (normalized), on `device`."""
+        key = ('axes', bounds, resolution, torch.device(device))
+        axes = self._get(key)
+        if axes is None:
+            axes = self._put(key, grid_axes(bounds, resolution, device))
+        return axes
+
+    def points(self, bounds, resolution, points):
+        """float32 coordinates of the integer points `points` (M, 3) of the (resolution + 1)^3 grid."""
+        return grid_points(self.axes(bounds, resolution, points.device), points)
+
+    def dense_points(self, bounds, resolution, device, start=0, end=None):
+        """float32 coordinates of the grid points [start, end), in meshgrid ('ij') order: the whole grid by default."""
+        size = resolution + 1
+        end = size ** 3 if end is None else min(end, size ** 3)
+        index = torch.arange(start, end, device=device)
+        return self.points(bounds, resolution, decode_points(index, size))
+
+    def embeddings(self, geo_decoder, key, num_points, make_queries, num_chunks=10000):
+        """
+        Query embeddings (..., width) of the queries `make_queries()` (..., 3), cached under `key`.
+        :param key: identifies the queries: their layout, bounds, resolution, dtype and device
+        :param num_points: number of queries, to check the budget before building them
+        :return: the embeddings, or None when they do not fit in max_bytes
+        """
+        query_proj = geo_decoder.query_proj
+        dtype = decoder_dtype(geo_decoder, torch.float32)
+        width = query_proj.out_features
+        if num_points * width * torch.empty((), dtype=dtype).element_size() > self.max_bytes:
+            return None
+        full_key = ('embeddings', key, dtype, id(query_proj))
+        embeddings = self._get(full_key, owner=query_proj)
+        if embeddings is not None:
+            return embeddings
+
+        queries = make_queries().to(dtype)
+        flat = queries.reshape(-1, 3)
+        embeddings = None
+        for start in range(0, len(flat), num_chunks):
+            chunk = geo_decoder.embed_queries(flat[start: start + num_chunks], dtype)
+            if embeddings is None:
+                embeddings = chunk.new_empty((len(flat), chunk.shape[-1]))
+            embeddings[start: start + len(chunk)] = chunk
+        return self._put(full_key, embeddings.view(*queries.shape[:-1], -1), owner=query_proj)
+
+
+# Shared by every volume decoder, so switching decoders (enable_flashvdm_decoder) keeps the cache
+QUERY_GRID_CACHE = QueryGridCache()
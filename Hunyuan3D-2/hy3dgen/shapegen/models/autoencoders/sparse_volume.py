@@ -0,0 +1,199 @@
+# Hunyuan 3D is licensed under the TENCENT HUNYUAN NON-COMMERCIAL LICENSE AGREEMENT
+# except for the third-party components listed below.
+# Hunyuan 3D does not impose any additional limitations beyond what is outlined
+# in the repsective licenses of these third-party components.
+# Users must comply with all terms and conditions of original licenses of these third-party
+# components and must ensure that the usage of the third party components adheres to
+# all relevant laws and regulations.
+
+# For avoidance of doubts, Hunyuan 3D means the large language models and
+# their software and algorithms, including trained model weights, parameters (including
+# optimizer states), machine-learning model code, inference-enabling code, training-enabling code,
+# fine-tuning enabling code and other elements of the foregoing made publicly available
+# by Tencent in accordance with TENCENT HUNYUAN COMMUNITY LICENSE AGREEMENT.
+
+"""
+Sparse storage of an octree level for the hierarchical volume decoders.
+
+The (resolution + 1)^3 grid is cut into bricks of BRICK_SIZE^3 points and only the bricks holding
+decoded points are kept; points that were not decoded are NaN, as in the dense grids. The levels
+are built from integer point sets (near-surface points, dilated by sorting unique keys), so the
+memory of every level follows the surface area of the shape instead of the grid volume.
+"""
+
+import itertools
+
+import torch
+
+BRICK_SIZE = 8
+
+
+def encode_points(points, size):
+    """Keys of integer points (M, 3) in [0, size)^3, in the order of torch.where on a dense grid."""
+    return (points[:, 0] * size + points[:, 1]) * size + points[:, 2]
+
+
+def decode_points(keys, size):
+    return torch.stack([keys // (size * size), (keys // size) % size, keys % size], dim=1)
+
+
+def dilate_points(points, size, radius=1):
+    """
+    Points within `radius` (box distance) of `points` (M, 3), clipped to [0, size)^3: the same set as
+    `radius` 3x3x3 dilations of the dense grid. Sorted like torch.where, without duplicates.
+    """
+    for axis in range(3 if radius > 0 else 0):
+        # A box dilation is three 1D dilations, which keeps the intermediate sets small
+        offsets = torch.arange(-radius, radius + 1, device=points.device)
+        shifted = points.unsqueeze(0).repeat(len(offsets), 1, 1)
+        shifted[..., axis] += offsets[:, None]
+        shifted = shifted.reshape(-1, 3)
+        points = shifted[(shifted[:, axis] >= 0) & (shifted[:, axis] < size)]
+        points = decode_points(torch.unique(encode_points(points, size)), size)
+    if radius <= 0:
+        points = decode_points(torch.unique(encode_points(points, size)), size)
+    return points
+
+
+class SparseBrickGrid:
+    """
+    Logits of one (resolution + 1)^3 grid, stored for the active bricks only.
+    :ivar coords: (N, 3) long brick coordinates (grid point // brick_size), sorted by key
+    :ivar values: (N, B, B, B) logits of the bricks' points, NaN where nothing was decoded
+    """
+
+    def __init__(self, resolution, coords, values):
+        self.resolution = resolution
+        self.coords = coords
+        self.values = values
+        self.brick_size = values.shape[-1]
+        self.bricks_per_axis = -(-(resolution + 1) // self.brick_size)
+        self._keys = encode_points(coords, self.bricks_per_axis)
+
+    def __len__(self):
+        return len(self.coords)
+
+    @property
+    def dtype(self):
+        return self.values.dtype
+
+    @property
+    def device(self):
+        return self.values.device
+
+    @property
+    def nbytes(self):
+        return self.values.numel() * self.values.element_size() + self.coords.numel() * self.coords.element_size()
+
+    @classmethod
+    def from_points(cls, resolution, points, logits, brick_size=BRICK_SIZE):
+        """Bricks holding the decoded `points` (M, 3) with their `logits` (M,)."""
+        size = -(-(resolution + 1) // brick_size)
+        keys, inverse = torch.unique(encode_points(points // brick_size, size), return_inverse=True)
+        values = torch.full((len(keys), brick_size, brick_size, brick_size), float('nan'),
+                            dtype=logits.dtype, device=logits.device)
+        local = points % brick_size
+        values[inverse, local[:, 0], local[:, 1], local[:, 2]] = logits
+        return cls(resolution, decode_points(keys, size), values)
+
+    @classmethod
+    def from_dense(cls, grid, brick_size=BRICK_SIZE):
+        """Bricks of a dense (R + 1)^3 grid that hold at least one decoded (non-NaN) point."""
+        resolution = grid.shape[0] - 1
+        size = -(-(resolution + 1) // brick_size)
+        padded = torch.full((size * brick_size,) * 3, float('nan'), dtype=grid.dtype, device=grid.device)
+        padded[:resolution + 1, :resolution + 1, :resolution + 1] = grid
+        values = padded.view(size, brick_size, size, brick_size, size, brick_size).permute(
+            0, 2, 4, 1, 3, 5).reshape(-1, brick_size, brick_size, brick_size)
+        keep = ~torch.isnan(values).flatten(1).all(dim=1)
+        coords = decode_points(torch.arange(size ** 3, device=grid.device)[keep], size)
+        return cls(resolution, coords, values[keep])
+
+    def to_dense(self):
+        """The (R + 1)^3 grid, NaN outside the bricks."""
+        size, brick_size = self.bricks_per_axis, self.brick_size
+        dense = torch.full((size * brick_size,) * 3, float('nan'), dtype=self.dtype, device=self.device)
+        bricks = dense.view(size, brick_size, size, brick_size, size, brick_size).permute(0, 2, 4, 1, 3, 5)
+        bricks[self.coords[:, 0], self.coords[:, 1], self.coords[:, 2]] = self.values
+        end = self.resolution + 1
+        return dense[:end, :end, :end]
+
+    def lookup(self, coords):
+        """Index of the bricks at brick coordinates `coords` (M, 3); -1 where there is none."""
+        missing = torch.full((len(coords),), -1, dtype=torch.long, device=coords.device)
+        if len(self._keys) == 0:
+            return missing
+        size = self.bricks_per_axis
+        keys = encode_points(coords.clamp(0, size - 1), size)
+        index = torch.searchsorted(self._keys, keys).clamp(max=len(self._keys) - 1)
+        found = ((coords >= 0) & (coords < size)).all(dim=1) & (self._keys[index] == keys)
+        return torch.where(found, index, missing)
+
+    def padded(self, index, low=0, high=1):
+        """
+        Bricks `index` with `low` / `high` extra points taken from the neighbouring bricks on each side
+        of every axis (at most one brick away), NaN where there is no neighbour.
+        :return: (len(index), low + B + high, ...) tensor
+        """
+        brick_size = self.brick_size
+        width = low + brick_size + high
+        out = torch.full((len(index), width, width, width), float('nan'), dtype=self.dtype, device=self.device)
+        coords = self.coords[index]
+        steps = range(-1 if low else 0, 2 if high else 1)
+        for offset in itertools.product(steps, repeat=3):
+            if offset == (0, 0, 0):
+                source = index
+                rows = torch.arange(len(index), device=self.device)
+            else:
+                neighbour = self.lookup(coords + torch.tensor(offset, device=self.device))
+                rows = torch.nonzero(neighbour >= 0).squeeze(1)
+                if len(rows) == 0:
+                    continue
+                source = neighbour[rows]
+            src = tuple(slice(brick_size - low, brick_size) if o < 0 else slice(0, high) if o > 0
+                        else slice(0, brick_size) for o in offset)
+            dst = tuple(slice(0, low) if o < 0 else slice(low + brick_size, width) if o > 0
+                        else slice(low, low + brick_size) for o in offset)
+            out[(rows,) + dst] = self.values[source][(slice(None),) + src]
+        return out
+
+    def near_surface_points(self, mc_level, chunk_bricks=4096):
+        """
+        Points the next octree level refines around, as (M, 3) grid coordinates: where
+        extract_near_surface_volume_fn flags a sign change with a 6-neighbour, or |logit| < 0.95.
+        Missing neighbours (not decoded, or outside the grid) count as the point itself.
+        """
+        brick_size = self.brick_size
+        inner = slice(1, brick_size + 1)
+        points = []
+        for start in range(0, len(self), chunk_bricks):
+            index = torch.arange(start, min(start + chunk_bricks, len(self)), device=self.device)
+            logits = self.padded(index, low=1, high=1)
+            # Same offset as extract_near_surface_volume_fn
+            val = logits + mc_level
+            center = val[:, inner, inner, inner]
+            center_sign = torch.sign(center.float())
+            changed = torch.zeros(center.shape, dtype=torch.bool, device=self.device)
+            for axis in range(3):
+                for shift in (0, 2):
+                    window = [inner, inner, inner]
+                    window[axis] = slice(shift, shift + brick_size)
+                    neighbour = val[(slice(None),) + tuple(window)]
+                    neighbour = torch.where(torch.isnan(neighbour), center, neighbour)
+                    changed |= torch.sign(neighbour.float()) != center_sign
+            near = (changed & ~torch.isnan(center)) | (logits[:, inner, inner, inner].abs() < 0.95)
+            hits = torch.nonzero(near)
+            points.append(self.coords[index[hits[:, 0]]] * brick_size + hits[:, 1:])
+        if not points:
+            return torch.zeros((0, 3), dtype=torch.long, device=self.device)
+        return torch.cat(points)
+
+    def next_level_points(self, mc_level, resolution, expand_num):
+        """
+        Grid points of the next level (`resolution`) to decode, sorted like torch.where: the near-surface
+        points dilated `expand_num` times here, mapped to 2x and dilated 2 - expand_num times there.
+        """
+        points = self.near_surface_points(mc_level)
+        if expand_num:
+            points = dilate_points(points, self.resolution + 1, expand_num)
+        return dilate_points(points * 2, resolution + 1, 2 - expand_num)
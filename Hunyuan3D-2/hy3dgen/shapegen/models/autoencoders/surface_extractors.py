@@ -12,12 +12,22 @@
 # fine-tuning enabling code and other elements of the foregoing made publicly available
 # by Tencent in accordance with TENCENT HUNYUAN COMMUNITY LICENSE AGREEMENT.
 
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
 from typing import Union, Tuple, List
 
 import numpy as np
 import torch
 from skimage import measure
 
+from .sparse_volume import SparseBrickGrid
+from ...cpu_profile import available_cpus
+from ...utils import logger
+
 
 class Latent2MeshOutput:
 
@@ -34,6 +44,120 @@ def center_vertices(vertices):
     return vertices - vert_center
 
 
+def weld_keys(vertices, size, block_size):
+    """
+    Weld key of each marching-cubes vertex (in grid units) of blocks that start every `block_size` points.
+    A vertex on a grid edge (or point) in a seam plane comes out of every block around it and keys on the
+    edge: its lower grid point and axis. Any other vertex, such as the ones Lewiner's method puts inside a
+    cell (several fractional coordinates), belongs to a single block and gets a key of its own.
+    """
+    rounded = np.round(vertices)
+    fractional = np.abs(vertices - rounded) >= 1e-6
+    axis = np.where(fractional.any(axis=1), np.argmax(fractional, axis=1), 3)
+    lower = np.where(fractional, np.floor(vertices), rounded).astype(np.int64)
+    on_seam = (~fractional & (lower % block_size == 0)).any(axis=1)
+    shared = on_seam & (fractional.sum(axis=1) <= 1)
+    keys = ((lower[:, 0] * size + lower[:, 1]) * size + lower[:, 2]) * 4 + axis
+    # Edge keys are non-negative, so negative ones never collide with them
+    return np.where(shared, keys, -1 - np.arange(len(vertices)))
+
+
+def marching_cubes_block(block, origin, mc_level):
+    """Marching cubes of one block of a grid; vertices in the grid's units (offset by the block's `origin`)."""
+    vertices, faces, _, _ = measure.marching_cubes(block, mc_level, method="lewiner")
+    return vertices.astype(np.float64) + origin, faces
+
+
+def weld_blocks(pieces, size, block_size):
+    """
+    One mesh from the (vertices, faces) of blocks that start every `block_size` points and share their
+    boundary points: a vertex on a seam comes out of both blocks and is merged with its twin by the grid
+    edge it lies on (weld_keys).
+    :param size: number of grid points along the longest axis
+    :return: vertices in grid units, faces
+    """
+    vertices, faces = [], []
+    count = 0
+    for block_vertices, block_faces in pieces:
+        if len(block_faces) == 0:
+            continue
+        vertices.append(block_vertices)
+        faces.append(block_faces + count)
+        count += len(block_vertices)
+    if not vertices:
+        raise ValueError("Surface level must be within volume data range.")
+    vertices = np.concatenate(vertices)
+    faces = np.concatenate(faces)
+    _, first, inverse = np.unique(weld_keys(vertices, size + 1, block_size), return_index=True, return_inverse=True)
+    return vertices[first], inverse.reshape(-1)[faces]
+
+
+def block_any(mask, block_size):
+    """
+    any() of every block of a boolean grid: blocks start every `block_size` points along each axis and
+    hold `block_size` + 1 points (the first point of the next block too), the last one up to the border.
+    """
+    for axis in range(mask.ndim):
+        starts = np.arange(0, max(mask.shape[axis] - 1, 1), block_size)
+        blocks = np.logical_or.reduceat(mask, starts, axis=axis)
+        if len(starts) > 1:
+            head = [slice(None)] * mask.ndim
+            head[axis] = slice(0, len(starts) - 1)
+            blocks[tuple(head)] |= np.take(mask, starts[1:], axis=axis)
+        mask = blocks
+    return mask
+
+
+def marching_cubes_blocks(grid: np.ndarray, mc_level: float, block_size: int = 32, map_fn=map):
+    """
+    Marching cubes of a dense grid in blocks of `block_size`^3 cells, each holding the first points of
+    its upper neighbours so every cell is extracted once. Blocks with all their points NaN or on one side
+    of the level are skipped. `map_fn(fn, *iterables)` runs the blocks (a pool's map, or the builtin).
+    :return: vertices in grid units, faces
+    """
+    active = block_any(grid >= mc_level, block_size) & block_any(grid <= mc_level, block_size)
+    origins = np.argwhere(active) * block_size
+    blocks = [grid[x:x + block_size + 1, y:y + block_size + 1, z:z + block_size + 1] for x, y, z in origins]
+    pieces = map_fn(marching_cubes_block, blocks, origins, repeat(mc_level))
+    return weld_blocks(pieces, max(grid.shape), block_size)
+
+
+def marching_cubes_bricks(grid: SparseBrickGrid, mc_level: float, chunk_bricks: int = 1024, map_fn=map):
+    """
+    Marching cubes over the bricks of a sparse grid: every brick plus the first points of its upper
+    neighbours, so each cell is extracted once. Bricks whose points are all NaN or on one side of the
+    level are skipped; vertices on the seams between bricks are welded by their grid edge.
+    `map_fn(fn, *iterables)` runs the bricks (a pool's map, or the builtin).
+    :return: vertices in grid units, faces
+    """
+    brick_size = grid.brick_size
+    end = grid.resolution + 1
+    local = torch.arange(brick_size + 1, device=grid.device)
+    brick_blocks, brick_origins = [], []
+    for start in range(0, len(grid), chunk_bricks):
+        index = torch.arange(start, min(start + chunk_bricks, len(grid)), device=grid.device)
+        blocks = grid.padded(index, low=0, high=1).float()
+        origins = grid.coords[index] * brick_size
+        # The last bricks of each axis run past the grid: those points are not part of the volume
+        extent = (end - origins).clamp(max=brick_size + 1)
+        in_grid = ((local[None, :, None, None] < extent[:, 0, None, None, None]) &
+                   (local[None, None, :, None] < extent[:, 1, None, None, None]) &
+                   (local[None, None, None, :] < extent[:, 2, None, None, None]))
+        # A surface needs decoded points on both sides of the level (skimage rejects the block otherwise)
+        above = ((blocks >= mc_level) & in_grid).flatten(1).any(dim=1)
+        below = ((blocks <= mc_level) & in_grid).flatten(1).any(dim=1)
+        active = torch.nonzero(above & below & (extent >= 2).all(dim=1)).squeeze(1).tolist()
+        if not active:
+            continue
+        blocks_np, origins, extent = blocks.cpu().numpy(), origins.cpu().numpy(), extent.cpu().numpy()
+        for i in active:
+            size_x, size_y, size_z = extent[i]
+            brick_blocks.append(blocks_np[i, :size_x, :size_y, :size_z])
+            brick_origins.append(origins[i])
+    pieces = map_fn(marching_cubes_block, brick_blocks, brick_origins, repeat(mc_level))
+    return weld_blocks(pieces, end, brick_size)
+
+
 class SurfaceExtractor:
     def _compute_box_stat(self, bounds: Union[Tuple[float], List[float], float], octree_resolution: int):
         if isinstance(bounds, float):
@@ -49,7 +173,7 @@ class SurfaceExtractor:
 
     def __call__(self, grid_logits, **kwargs):
         outputs = []
-        for i in range(grid_logits.shape[0]):
+        for i in range(len(grid_logits)):
             try:
                 vertices, faces = self.run(grid_logits[i], **kwargs)
                 vertices = vertices.astype(np.float32)
@@ -65,19 +189,91 @@ class SurfaceExtractor:
 
 
 class MCSurfaceExtractor(SurfaceExtractor):
-    def run(self, grid_logit, *, mc_level, bounds, octree_resolution, **kwargs):
+    def marching_cubes(self, grid_logit, mc_level):
+        """Vertices (in grid units) and faces of the level set of one grid."""
+        if isinstance(grid_logit, SparseBrickGrid):
+            return marching_cubes_bricks(grid_logit, mc_level)
         vertices, faces, normals, _ = measure.marching_cubes(
             grid_logit.cpu().numpy(),
             mc_level,
             method="lewiner"
         )
+        return vertices, faces
+
+    def run(self, grid_logit, *, mc_level, bounds, octree_resolution, **kwargs):
+        vertices, faces = self.marching_cubes(grid_logit, mc_level)
         grid_size, bbox_min, bbox_size = self._compute_box_stat(bounds, octree_resolution)
         vertices = vertices / grid_size * bbox_size + bbox_min
         return vertices, faces
 
 
+class ParallelMCSurfaceExtractor(MCSurfaceExtractor):
+    """
+    Marching cubes in blocks of `block_size`^3 cells on a pool of `workers` threads (or processes).
+    Blocks overlap by one point, so every cell is extracted once and gets the triangles it gets from the
+    whole-grid call; blocks that are all NaN or all on one side of the level are skipped, and the
+    vertices on block seams are welded by their grid edge. The mesh is MCSurfaceExtractor's up to the
+    order of its vertices and faces. Sparse grids run their bricks on the same pool.
+    """
+
+    def __init__(self, block_size=32, workers=None, executor='thread'):
+        """
+        :param workers: pool size; default OMP_NUM_THREADS, else the CPUs this process may run on.
+            1 extracts in this process, block by block
+        :param executor: 'thread' (skimage releases the GIL while it extracts a block), or 'process' for
+            worker processes started by a forkserver (spawned where there is none), never forked from
+            this process and its threads. They import hy3dgen once, when the pool starts
+        """
+        if executor not in ('process', 'thread'):
+            raise ValueError(f"Unsupported executor {executor!r}, available: ['process', 'thread']")
+        self.block_size = block_size
+        self.workers = workers or int(os.environ.get('OMP_NUM_THREADS', 0)) or available_cpus()
+        self.executor = executor
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None and self.workers > 1:
+                if self.executor == 'thread':
+                    self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='marching-cubes')
+                else:
+                    methods = multiprocessing.get_all_start_methods()
+                    context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                    self._pool = ProcessPoolExecutor(self.workers, mp_context=context)
+            return self._pool
+
+    def close(self):
+        """Shuts the pool down; the next extraction starts a new one."""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def _map(self, fn, blocks, *iterables):
+        pool = self._get_pool()
+        if pool is None or len(blocks) <= 1:
+            return map(fn, blocks, *iterables)
+        # A few tasks per worker: small bricks travel in batches, big blocks still balance
+        chunksize = max(len(blocks) // (self.workers * 4), 1)
+        try:
+            return list(pool.map(fn, blocks, *iterables, chunksize=chunksize))
+        except BrokenProcessPool:
+            logger.warning('Marching cubes worker died, extracting this mesh in-process')
+            self.close()
+            return map(fn, blocks, *iterables)
+
+    def marching_cubes(self, grid_logit, mc_level):
+        if isinstance(grid_logit, SparseBrickGrid):
+            return marching_cubes_bricks(grid_logit, mc_level, map_fn=self._map)
+        return marching_cubes_blocks(grid_logit.float().cpu().numpy(), mc_level, self.block_size, map_fn=self._map)
+
+
 class DMCSurfaceExtractor(SurfaceExtractor):
     def run(self, grid_logit, *, octree_resolution, **kwargs):
+        if isinstance(grid_logit, SparseBrickGrid):
+            # DiffDMC works on the whole grid
+            grid_logit = grid_logit.to_dense()
         device = grid_logit.device
         if not hasattr(self, 'dmc'):
             try:
@@ -96,5 +292,6 @@ class DMCSurfaceExtractor(SurfaceExtractor):
 
 SurfaceExtractors = {
     'mc': MCSurfaceExtractor,
+    'mc_parallel': ParallelMCSurfaceExtractor,
     'dmc': DMCSurfaceExtractor,
 }
@@ -17,106 +17,66 @@ from typing import Union, Tuple, List, Callable
 import numpy as np
 import torch
 import torch.nn as nn
-import torch.nn.functional as F
 from einops import repeat
 from tqdm import tqdm
 
 from .attention_blocks import CrossAttentionDecoder
 from .attention_processors import FlashVDMCrossAttentionProcessor, FlashVDMTopMCrossAttentionProcessor
+from .query_grid import QUERY_GRID_CACHE, decoder_dtype, normalize_bounds
+from .sparse_volume import BRICK_SIZE, SparseBrickGrid
 from ...utils import logger
 
 
+# Sign of a point that was not decoded (logit <= -9000, or NaN): never compared with its neighbours
+_INVALID_SIGN = 2
+
+
 def extract_near_surface_volume_fn(input_tensor: torch.Tensor, alpha: float):
-    device = input_tensor.device
-    D = input_tensor.shape[0]
-    signed_val = 0.0
-
-    # 添加偏移并处理无效值
-    val = input_tensor + alpha
-    valid_mask = val > -9000  # 假设-9000是无效值
-
-    # 改进的邻居获取函数（保持维度一致）
-    def get_neighbor(t, shift, axis):
-        """根据指定轴进行位移并保持维度一致"""
-        if shift == 0:
-            return t.clone()
-
-        # 确定填充轴（输入为[D, D, D]对应z,y,x轴）
-        pad_dims = [0, 0, 0, 0, 0, 0]  # 格式：[x前，x后，y前，y后，z前，z后]
-
-        # 根据轴类型设置填充
-        if axis == 0:  # x轴（最后一个维度）
-            pad_idx = 0 if shift > 0 else 1
-            pad_dims[pad_idx] = abs(shift)
-        elif axis == 1:  # y轴（中间维度）
-            pad_idx = 2 if shift > 0 else 3
-            pad_dims[pad_idx] = abs(shift)
-        elif axis == 2:  # z轴（第一个维度）
-            pad_idx = 4 if shift > 0 else 5
-            pad_dims[pad_idx] = abs(shift)
-
-        # 执行填充（添加batch和channel维度适配F.pad）
-        padded = F.pad(t.unsqueeze(0).unsqueeze(0), pad_dims[::-1], mode='replicate')  # 反转顺序适配F.pad
-
-        # 构建动态切片索引
-        slice_dims = [slice(None)] * 3  # 初始化为全切片
-        if axis == 0:  # x轴（dim=2）
-            if shift > 0:
-                slice_dims[0] = slice(shift, None)
-            else:
-                slice_dims[0] = slice(None, shift)
-        elif axis == 1:  # y轴（dim=1）
-            if shift > 0:
-                slice_dims[1] = slice(shift, None)
-            else:
-                slice_dims[1] = slice(None, shift)
-        elif axis == 2:  # z轴（dim=0）
-            if shift > 0:
-                slice_dims[2] = slice(shift, None)
-            else:
-                slice_dims[2] = slice(None, shift)
-
-        # 应用切片并恢复维度
-        padded = padded.squeeze(0).squeeze(0)
-        sliced = padded[slice_dims]
-        return sliced
-
-    # 获取各方向邻居（确保维度一致）
-    left = get_neighbor(val, 1, axis=0)  # x方向
-    right = get_neighbor(val, -1, axis=0)
-    back = get_neighbor(val, 1, axis=1)  # y方向
-    front = get_neighbor(val, -1, axis=1)
-    down = get_neighbor(val, 1, axis=2)  # z方向
-    up = get_neighbor(val, -1, axis=2)
-
-    # 处理边界无效值（使用where保持维度一致）
-    def safe_where(neighbor):
-        return torch.where(neighbor > -9000, neighbor, val)
-
-    left = safe_where(left)
-    right = safe_where(right)
-    back = safe_where(back)
-    front = safe_where(front)
-    down = safe_where(down)
-    up = safe_where(up)
-
-    # 计算符号一致性（转换为float32确保精度）
-    sign = torch.sign(val.to(torch.float32))
-    neighbors_sign = torch.stack([
-        torch.sign(left.to(torch.float32)),
-        torch.sign(right.to(torch.float32)),
-        torch.sign(back.to(torch.float32)),
-        torch.sign(front.to(torch.float32)),
-        torch.sign(down.to(torch.float32)),
-        torch.sign(up.to(torch.float32))
-    ], dim=0)
-
-    # 检查所有符号是否一致
-    same_sign = torch.all(neighbors_sign == sign, dim=0)
-
-    # 生成最终掩码
-    mask = (~same_sign).to(torch.int32)
-    return mask * valid_mask.to(torch.int32)
+    """
+    int32 mask of the grid points where the sign of (logit + alpha) differs from one of the 6 neighbours.
+    Points that were not decoded (<= -9000 or NaN) are never flagged and, as neighbours, count as the
+    point itself, as does everything past the grid border.
+
+    Adjacent points are compared through shifted views of one int8 sign grid, one axis at a time, so the
+    temporaries are a few bytes per point instead of padded float copies of the grid.
+    """
+    sign = (input_tensor > -alpha).to(torch.int8)
+    sign -= (input_tensor < -alpha).to(torch.int8)
+    sign.masked_fill_(~(input_tensor > -9000 - alpha), _INVALID_SIGN)
+
+    mask = torch.zeros(sign.shape, dtype=torch.bool, device=sign.device)
+    for axis in range(sign.dim()):
+        length = sign.shape[axis] - 1
+        lower, upper = sign.narrow(axis, 0, length), sign.narrow(axis, 1, length)
+        # A pair of valid neighbours with different signs flags both points
+        changed = lower != upper
+        changed &= lower != _INVALID_SIGN
+        changed &= upper != _INVALID_SIGN
+        lower_mask, upper_mask = mask.narrow(axis, 0, length), mask.narrow(axis, 1, length)
+        lower_mask |= changed
+        upper_mask |= changed
+    return mask.to(torch.int32)
+
+
+def dense_next_level(grid_logits, mc_level, octree_resolution, expand_num, dilate):
+    """
+    One dense octree refinement step: the near-surface points of `grid_logits` (1, r + 1, r + 1, r + 1),
+    dilated and mapped to the next level's grid.
+    :return: the next level's logits grid (-10000 where not decoded) and the torch.where indices to decode
+    """
+    dtype, device = grid_logits.dtype, grid_logits.device
+    next_index = torch.zeros((octree_resolution + 1,) * 3, dtype=dtype, device=device)
+    next_logits = torch.full(next_index.shape, -10000., dtype=dtype, device=device)
+    curr_points = extract_near_surface_volume_fn(grid_logits.squeeze(0), mc_level)
+    curr_points += grid_logits.squeeze(0).abs() < 0.95
+
+    for i in range(expand_num):
+        curr_points = dilate(curr_points.unsqueeze(0).to(dtype)).squeeze(0)
+    (cidx_x, cidx_y, cidx_z) = torch.where(curr_points > 0)
+    next_index[cidx_x * 2, cidx_y * 2, cidx_z * 2] = 1
+    for i in range(2 - expand_num):
+        next_index = dilate(next_index.unsqueeze(0)).squeeze(0)
+    return next_logits, torch.where(next_index > 0)
 
 
 def generate_dense_grid_points(
@@ -138,7 +98,52 @@ def generate_dense_grid_points(
     return xyz, grid_size, length
 
 
+def latent_kv(geo_decoder, latents):
+    """The geometry decoder's keys and values of `latents` (precompute_kv), computed once per mesh."""
+    return geo_decoder.precompute_kv(latents.to(decoder_dtype(geo_decoder, latents.dtype)))
+
+
+def item_kv(kv, item):
+    k, v = kv
+    return k[item:item + 1], v[item:item + 1]
+
+
+def decode_dense_grid(latents, geo_decoder, query_cache, bounds, resolution, num_chunks, desc, enable_pbar=True,
+                      kv=None):
+    """
+    Logits (B, (R + 1)^3, 1) of the whole grid in meshgrid ('ij') order, `num_chunks` points at a time:
+    from the cached query embeddings when they fit in `query_cache`, else from coordinates made per chunk.
+    :param kv: latent_kv of `latents`, computed here if not given
+    """
+    device, dtype = latents.device, latents.dtype
+    batch_size = latents.shape[0]
+    if kv is None:
+        kv = latent_kv(geo_decoder, latents)
+    num_points = (resolution + 1) ** 3
+    embeddings = query_cache.embeddings(
+        geo_decoder, ('dense', bounds, resolution, dtype, device), num_points,
+        lambda: query_cache.dense_points(bounds, resolution, device).to(dtype))
+
+    batch_logits = []
+    for start in tqdm(range(0, num_points, num_chunks), desc=desc, disable=not enable_pbar):
+        if embeddings is not None:
+            chunk_embeddings = repeat(embeddings[start: start + num_chunks], "p c -> b p c", b=batch_size)
+            logits = geo_decoder(query_embeddings=chunk_embeddings, kv=kv)
+        else:
+            chunk_queries = query_cache.dense_points(bounds, resolution, device, start, start + num_chunks)
+            chunk_queries = repeat(chunk_queries.to(dtype), "p c -> b p c", b=batch_size)
+            logits = geo_decoder(queries=chunk_queries, kv=kv)
+        batch_logits.append(logits)
+    return torch.cat(batch_logits, dim=1)
+
+
 class VanillaVolumeDecoder:
+    def __init__(self, query_cache=None):
+        """
+        :param query_cache: QueryGridCache of the query grids and their embeddings; the shared one by default
+        """
+        self.query_cache = QUERY_GRID_CACHE if query_cache is None else query_cache
+
     @torch.no_grad()
     def __call__(
         self,
@@ -148,41 +153,36 @@ class VanillaVolumeDecoder:
         num_chunks: int = 10000,
         octree_resolution: int = None,
         enable_pbar: bool = True,
+        progress_callback: Callable = None,
         **kwargs,
     ):
-        device = latents.device
-        dtype = latents.dtype
         batch_size = latents.shape[0]
+        if progress_callback is not None:
+            progress_callback('volume_decoding', level=0, levels=1, resolution=octree_resolution)
 
-        # 1. generate query points
-        if isinstance(bounds, float):
-            bounds = [-bounds, -bounds, -bounds, bounds, bounds, bounds]
-
-        bbox_min, bbox_max = np.array(bounds[0:3]), np.array(bounds[3:6])
-        xyz_samples, grid_size, length = generate_dense_grid_points(
-            bbox_min=bbox_min,
-            bbox_max=bbox_max,
-            octree_resolution=octree_resolution,
-            indexing="ij"
-        )
-        xyz_samples = torch.from_numpy(xyz_samples).to(device, dtype=dtype).contiguous().reshape(-1, 3)
+        # 1. query points: made per chunk from their grid indices, or their cached embeddings
+        bounds = normalize_bounds(bounds)
+        grid_size = [octree_resolution + 1] * 3
 
         # 2. latents to 3d volume
-        batch_logits = []
-        for start in tqdm(range(0, xyz_samples.shape[0], num_chunks), desc=f"Volume Decoding",
-                          disable=not enable_pbar):
-            chunk_queries = xyz_samples[start: start + num_chunks, :]
-            chunk_queries = repeat(chunk_queries, "p c -> b p c", b=batch_size)
-            logits = geo_decoder(queries=chunk_queries, latents=latents)
-            batch_logits.append(logits)
-
-        grid_logits = torch.cat(batch_logits, dim=1)
+        grid_logits = decode_dense_grid(latents, geo_decoder, self.query_cache, bounds, octree_resolution,
+                                        num_chunks, desc="Volume Decoding", enable_pbar=enable_pbar)
         grid_logits = grid_logits.view((batch_size, *grid_size)).float()
 
         return grid_logits
 
 
 class HierarchicalVolumeDecoding:
+    def __init__(self, sparse=True, brick_size=BRICK_SIZE, query_cache=None):
+        """
+        :param sparse: keep the finer levels as SparseBrickGrid (memory follows the surface) and return
+            one per batch element; False builds dense (R + 1)^3 grids and returns them stacked
+        :param query_cache: QueryGridCache of the query grids and their embeddings; the shared one by default
+        """
+        self.sparse = sparse
+        self.brick_size = brick_size
+        self.query_cache = QUERY_GRID_CACHE if query_cache is None else query_cache
+
     @torch.no_grad()
     def __call__(
         self,
@@ -194,6 +194,7 @@ class HierarchicalVolumeDecoding:
         octree_resolution: int = None,
         min_resolution: int = 63,
         enable_pbar: bool = True,
+        progress_callback: Callable = None,
         **kwargs,
     ):
         device = latents.device
@@ -207,80 +208,84 @@ class HierarchicalVolumeDecoding:
             octree_resolution = octree_resolution // 2
         resolutions.reverse()
 
-        # 1. generate query points
-        if isinstance(bounds, float):
-            bounds = [-bounds, -bounds, -bounds, bounds, bounds, bounds]
-        bbox_min = np.array(bounds[0:3])
-        bbox_max = np.array(bounds[3:6])
-        bbox_size = bbox_max - bbox_min
-
-        xyz_samples, grid_size, length = generate_dense_grid_points(
-            bbox_min=bbox_min,
-            bbox_max=bbox_max,
-            octree_resolution=resolutions[0],
-            indexing="ij"
-        )
+        # 1. query points: the coarse grid's from the cache, the finer levels' from their grid indices
+        bounds = normalize_bounds(bounds)
+        query_cache = self.query_cache
+        grid_size = [resolutions[0] + 1] * 3
 
         dilate = nn.Conv3d(1, 1, 3, padding=1, bias=False, device=device, dtype=dtype)
         dilate.weight = torch.nn.Parameter(torch.ones(dilate.weight.shape, dtype=dtype, device=device))
 
-        grid_size = np.array(grid_size)
-        xyz_samples = torch.from_numpy(xyz_samples).to(device, dtype=dtype).contiguous().reshape(-1, 3)
-
         # 2. latents to 3d volume
-        batch_logits = []
+        if progress_callback is not None:
+            progress_callback('volume_decoding', level=0, levels=len(resolutions), resolution=resolutions[0])
         batch_size = latents.shape[0]
-        for start in tqdm(range(0, xyz_samples.shape[0], num_chunks),
-                          desc=f"Hierarchical Volume Decoding [r{resolutions[0] + 1}]"):
-            queries = xyz_samples[start: start + num_chunks, :]
-            batch_queries = repeat(queries, "p c -> b p c", b=batch_size)
-            logits = geo_decoder(queries=batch_queries, latents=latents)
-            batch_logits.append(logits)
-
-        grid_logits = torch.cat(batch_logits, dim=1).view((batch_size, grid_size[0], grid_size[1], grid_size[2]))
-
-        for octree_depth_now in resolutions[1:]:
-            grid_size = np.array([octree_depth_now + 1] * 3)
-            resolution = bbox_size / octree_depth_now
-            next_index = torch.zeros(tuple(grid_size), dtype=dtype, device=device)
-            next_logits = torch.full(next_index.shape, -10000., dtype=dtype, device=device)
-            curr_points = extract_near_surface_volume_fn(grid_logits.squeeze(0), mc_level)
-            curr_points += grid_logits.squeeze(0).abs() < 0.95
-
-            if octree_depth_now == resolutions[-1]:
-                expand_num = 0
-            else:
-                expand_num = 1
-            for i in range(expand_num):
-                curr_points = dilate(curr_points.unsqueeze(0).to(dtype)).squeeze(0)
-            (cidx_x, cidx_y, cidx_z) = torch.where(curr_points > 0)
-            next_index[cidx_x * 2, cidx_y * 2, cidx_z * 2] = 1
-            for i in range(2 - expand_num):
-                next_index = dilate(next_index.unsqueeze(0)).squeeze(0)
-            nidx = torch.where(next_index > 0)
-
-            next_points = torch.stack(nidx, dim=1)
-            next_points = (next_points * torch.tensor(resolution, dtype=next_points.dtype, device=device) +
-                           torch.tensor(bbox_min, dtype=next_points.dtype, device=device))
-            batch_logits = []
-            for start in tqdm(range(0, next_points.shape[0], num_chunks),
-                              desc=f"Hierarchical Volume Decoding [r{octree_depth_now + 1}]"):
-                queries = next_points[start: start + num_chunks, :]
-                batch_queries = repeat(queries, "p c -> b p c", b=batch_size)
-                logits = geo_decoder(queries=batch_queries.to(latents.dtype), latents=latents)
-                batch_logits.append(logits)
-            grid_logits = torch.cat(batch_logits, dim=1)
-            next_logits[nidx] = grid_logits[0, ..., 0]
-            grid_logits = next_logits.unsqueeze(0)
-        grid_logits[grid_logits == -10000.] = float('nan')
+        # Keys and values of the latents, projected once for every chunk of every level
+        kv = latent_kv(geo_decoder, latents)
+        coarse_logits = decode_dense_grid(latents, geo_decoder, query_cache, bounds, resolutions[0], num_chunks,
+                                          desc=f"Hierarchical Volume Decoding [r{resolutions[0] + 1}]", kv=kv)
+        coarse_logits = coarse_logits.view((batch_size, grid_size[0], grid_size[1], grid_size[2]))
+
+        # The finer levels only query points near each item's own surface, so every batch element is refined
+        # separately against its own latents; the coarse level above is decoded for the whole batch at once.
+        batch_grid_logits = []
+        for item in range(batch_size):
+            kv_item = item_kv(kv, item)
+            grid_logits = coarse_logits[item:item + 1]
+            if self.sparse:
+                grid_logits = SparseBrickGrid.from_dense(grid_logits[0], self.brick_size)
+            for level, octree_depth_now in enumerate(resolutions[1:], start=1):
+                if progress_callback is not None:
+                    progress_callback('volume_decoding', level=level, levels=len(resolutions),
+                                      resolution=octree_depth_now, item=item, items=batch_size)
+                if octree_depth_now == resolutions[-1]:
+                    expand_num = 0
+                else:
+                    expand_num = 1
+                if self.sparse:
+                    next_coords = grid_logits.next_level_points(mc_level, octree_depth_now, expand_num)
+                else:
+                    next_logits, nidx = dense_next_level(grid_logits, mc_level, octree_depth_now, expand_num,
+                                                         dilate)
+                    next_coords = torch.stack(nidx, dim=1)
+
+                next_points = query_cache.points(bounds, octree_depth_now, next_coords)
+                batch_logits = []
+                for start in tqdm(range(0, next_points.shape[0], num_chunks),
+                                  desc=f"Hierarchical Volume Decoding [r{octree_depth_now + 1}]"):
+                    queries = next_points[start: start + num_chunks, :]
+                    logits = geo_decoder(queries=queries.unsqueeze(0).to(latents.dtype), kv=kv_item)
+                    batch_logits.append(logits)
+                grid_logits = torch.cat(batch_logits, dim=1)[0, ..., 0]
+                if self.sparse:
+                    grid_logits = SparseBrickGrid.from_points(octree_depth_now, next_coords, grid_logits,
+                                                              self.brick_size)
+                else:
+                    next_logits[nidx] = grid_logits
+                    grid_logits = next_logits.unsqueeze(0)
+
+            if not self.sparse:
+                grid_logits[grid_logits == -10000.] = float('nan')
+            batch_grid_logits.append(grid_logits)
+        if self.sparse:
+            return batch_grid_logits
+        grid_logits = torch.cat(batch_grid_logits, dim=0)
 
         return grid_logits
 
 
 class FlashVDMVolumeDecoding:
-    def __init__(self, topk_mode='mean'):
+    def __init__(self, topk_mode='mean', sparse=True, brick_size=BRICK_SIZE, query_cache=None):
+        """
+        :param sparse: keep the finer levels as SparseBrickGrid (memory follows the surface) and return
+            one per batch element; False builds dense (R + 1)^3 grids and returns them stacked
+        :param query_cache: QueryGridCache of the query grids and their embeddings; the shared one by default
+        """
         if topk_mode not in ['mean', 'merge']:
             raise ValueError(f'Unsupported topk_mode {topk_mode}, available: {["mean", "merge"]}')
+        self.sparse = sparse
+        self.brick_size = brick_size
+        self.query_cache = QUERY_GRID_CACHE if query_cache is None else query_cache
 
         if topk_mode == 'mean':
             self.processor = FlashVDMCrossAttentionProcessor()
@@ -299,6 +304,7 @@ class FlashVDMVolumeDecoding:
         min_resolution: int = 63,
         mini_grid_num: int = 4,
         enable_pbar: bool = True,
+        progress_callback: Callable = None,
         **kwargs,
     ):
         processor = self.processor
@@ -320,116 +326,129 @@ class FlashVDMVolumeDecoding:
 
         logger.info(f"FlashVDMVolumeDecoding Resolution: {resolutions}")
 
-        # 1. generate query points
-        if isinstance(bounds, float):
-            bounds = [-bounds, -bounds, -bounds, bounds, bounds, bounds]
-        bbox_min = np.array(bounds[0:3])
-        bbox_max = np.array(bounds[3:6])
-        bbox_size = bbox_max - bbox_min
-
-        xyz_samples, grid_size, length = generate_dense_grid_points(
-            bbox_min=bbox_min,
-            bbox_max=bbox_max,
-            octree_resolution=resolutions[0],
-            indexing="ij"
-        )
+        # 1. query points: the coarse grid's from the cache, the finer levels' from their grid indices
+        bounds = normalize_bounds(bounds)
+        query_cache = self.query_cache
+        grid_size = [resolutions[0] + 1] * 3
 
         dilate = nn.Conv3d(1, 1, 3, padding=1, bias=False, device=device, dtype=dtype)
         dilate.weight = torch.nn.Parameter(torch.ones(dilate.weight.shape, dtype=dtype, device=device))
 
-        grid_size = np.array(grid_size)
-
         # 2. latents to 3d volume
-        xyz_samples = torch.from_numpy(xyz_samples).to(device, dtype=dtype)
+        if progress_callback is not None:
+            progress_callback('volume_decoding', level=0, levels=len(resolutions), resolution=resolutions[0])
         batch_size = latents.shape[0]
-        mini_grid_size = xyz_samples.shape[0] // mini_grid_num
-        xyz_samples = xyz_samples.view(
-            mini_grid_num, mini_grid_size,
-            mini_grid_num, mini_grid_size,
-            mini_grid_num, mini_grid_size, 3
-        ).permute(
-            0, 2, 4, 1, 3, 5, 6
-        ).reshape(
-            -1, mini_grid_size * mini_grid_size * mini_grid_size, 3
-        )
-        batch_logits = []
-        num_batchs = max(num_chunks // xyz_samples.shape[1], 1)
-        for start in tqdm(range(0, xyz_samples.shape[0], num_batchs),
-                          desc=f"FlashVDM Volume Decoding", disable=not enable_pbar):
-            queries = xyz_samples[start: start + num_batchs, :]
-            batch = queries.shape[0]
-            batch_latents = repeat(latents.squeeze(0), "p c -> b p c", b=batch)
-            processor.topk = True
-            logits = geo_decoder(queries=queries, latents=batch_latents)
-            batch_logits.append(logits)
-        grid_logits = torch.cat(batch_logits, dim=0).reshape(
-            mini_grid_num, mini_grid_num, mini_grid_num,
-            mini_grid_size, mini_grid_size,
-            mini_grid_size
-        ).permute(0, 3, 1, 4, 2, 5).contiguous().view(
-            (batch_size, grid_size[0], grid_size[1], grid_size[2])
-        )
-
-        for octree_depth_now in resolutions[1:]:
-            grid_size = np.array([octree_depth_now + 1] * 3)
-            resolution = bbox_size / octree_depth_now
-            next_index = torch.zeros(tuple(grid_size), dtype=dtype, device=device)
-            next_logits = torch.full(next_index.shape, -10000., dtype=dtype, device=device)
-            curr_points = extract_near_surface_volume_fn(grid_logits.squeeze(0), mc_level)
-            curr_points += grid_logits.squeeze(0).abs() < 0.95
-
-            if octree_depth_now == resolutions[-1]:
-                expand_num = 0
-            else:
-                expand_num = 1
-            for i in range(expand_num):
-                curr_points = dilate(curr_points.unsqueeze(0).to(dtype)).squeeze(0)
-            (cidx_x, cidx_y, cidx_z) = torch.where(curr_points > 0)
-
-            next_index[cidx_x * 2, cidx_y * 2, cidx_z * 2] = 1
-            for i in range(2 - expand_num):
-                next_index = dilate(next_index.unsqueeze(0)).squeeze(0)
-            nidx = torch.where(next_index > 0)
-
-            next_points = torch.stack(nidx, dim=1)
-            next_points = (next_points * torch.tensor(resolution, dtype=torch.float32, device=device) +
-                           torch.tensor(bbox_min, dtype=torch.float32, device=device))
-
-            query_grid_num = 6
-            min_val = next_points.min(axis=0).values
-            max_val = next_points.max(axis=0).values
-            vol_queries_index = (next_points - min_val) / (max_val - min_val) * (query_grid_num - 0.001)
-            index = torch.floor(vol_queries_index).long()
-            index = index[..., 0] * (query_grid_num ** 2) + index[..., 1] * query_grid_num + index[..., 2]
-            index = index.sort()
-            next_points = next_points[index.indices].unsqueeze(0).contiguous()
-            unique_values = torch.unique(index.values, return_counts=True)
-            grid_logits = torch.zeros((next_points.shape[1]), dtype=latents.dtype, device=latents.device)
-            input_grid = [[], []]
-            logits_grid_list = []
-            start_num = 0
-            sum_num = 0
-            for grid_index, count in zip(unique_values[0].cpu().tolist(), unique_values[1].cpu().tolist()):
-                if sum_num + count < num_chunks or sum_num == 0:
-                    sum_num += count
-                    input_grid[0].append(grid_index)
-                    input_grid[1].append(count)
+        mini_grid_size = grid_size[0] // mini_grid_num
+
+        def mini_grid_queries():
+            xyz_samples = query_cache.dense_points(bounds, resolutions[0], device).to(dtype)
+            return xyz_samples.view(
+                mini_grid_num, mini_grid_size,
+                mini_grid_num, mini_grid_size,
+                mini_grid_num, mini_grid_size, 3
+            ).permute(
+                0, 2, 4, 1, 3, 5, 6
+            ).reshape(
+                -1, mini_grid_size * mini_grid_size * mini_grid_size, 3
+            )
+
+        # The mini grids' embeddings when they fit in the cache, else their coordinates
+        query_embeddings = query_cache.embeddings(
+            geo_decoder, ('mini_grids', bounds, resolutions[0], mini_grid_num, dtype, device),
+            grid_size[0] ** 3, mini_grid_queries)
+        xyz_samples = mini_grid_queries() if query_embeddings is None else None
+        num_mini_grids = mini_grid_num ** 3
+        # Every batch element is decoded against its own latents: the near-surface set (and so the
+        # fine query points and the top-k key selection) differs per mesh. The query grid is shared.
+        # The keys and values are projected once per mesh; the top-k selection picks from them.
+        kv = latent_kv(geo_decoder, latents)
+        batch_grid_logits = []
+        for item in range(batch_size):
+            kv_item = item_kv(kv, item)
+            batch_logits = []
+            num_batchs = max(num_chunks // mini_grid_size ** 3, 1)
+            for start in tqdm(range(0, num_mini_grids, num_batchs),
+                              desc=f"FlashVDM Volume Decoding", disable=not enable_pbar):
+                batch = min(num_batchs, num_mini_grids - start)
+                processor.topk = True
+                # The item's keys and values serve every mini grid of the batch
+                if query_embeddings is not None:
+                    logits = geo_decoder(query_embeddings=query_embeddings[start: start + batch], kv=kv_item)
                 else:
+                    logits = geo_decoder(queries=xyz_samples[start: start + batch], kv=kv_item)
+                batch_logits.append(logits)
+            grid_logits = torch.cat(batch_logits, dim=0).reshape(
+                mini_grid_num, mini_grid_num, mini_grid_num,
+                mini_grid_size, mini_grid_size,
+                mini_grid_size
+            ).permute(0, 3, 1, 4, 2, 5).contiguous().view(
+                (1, grid_size[0], grid_size[1], grid_size[2])
+            )
+
+            if self.sparse:
+                grid_logits = SparseBrickGrid.from_dense(grid_logits[0], self.brick_size)
+            for level, octree_depth_now in enumerate(resolutions[1:], start=1):
+                if progress_callback is not None:
+                    progress_callback('volume_decoding', level=level, levels=len(resolutions),
+                                      resolution=octree_depth_now, item=item, items=batch_size)
+                if octree_depth_now == resolutions[-1]:
+                    expand_num = 0
+                else:
+                    expand_num = 1
+                if self.sparse:
+                    next_coords = grid_logits.next_level_points(mc_level, octree_depth_now, expand_num)
+                else:
+                    next_logits, nidx = dense_next_level(grid_logits, mc_level, octree_depth_now, expand_num,
+                                                         dilate)
+                    next_coords = torch.stack(nidx, dim=1)
+
+                next_points = query_cache.points(bounds, octree_depth_now, next_coords)
+
+                query_grid_num = 6
+                min_val = next_points.min(axis=0).values
+                max_val = next_points.max(axis=0).values
+                vol_queries_index = (next_points - min_val) / (max_val - min_val) * (query_grid_num - 0.001)
+                index = torch.floor(vol_queries_index).long()
+                index = index[..., 0] * (query_grid_num ** 2) + index[..., 1] * query_grid_num + index[..., 2]
+                index = index.sort()
+                next_points = next_points[index.indices].unsqueeze(0).contiguous()
+                unique_values = torch.unique(index.values, return_counts=True)
+                grid_logits = torch.zeros((next_points.shape[1]), dtype=latents.dtype, device=latents.device)
+                input_grid = [[], []]
+                logits_grid_list = []
+                start_num = 0
+                sum_num = 0
+                for grid_index, count in zip(unique_values[0].cpu().tolist(), unique_values[1].cpu().tolist()):
+                    if sum_num + count < num_chunks or sum_num == 0:
+                        sum_num += count
+                        input_grid[0].append(grid_index)
+                        input_grid[1].append(count)
+                    else:
+                        processor.topk = input_grid
+                        logits_grid = geo_decoder(queries=next_points[:, start_num:start_num + sum_num],
+                                                  kv=kv_item)
+                        start_num = start_num + sum_num
+                        logits_grid_list.append(logits_grid)
+                        input_grid = [[grid_index], [count]]
+                        sum_num = count
+                if sum_num > 0:
                     processor.topk = input_grid
-                    logits_grid = geo_decoder(queries=next_points[:, start_num:start_num + sum_num], latents=latents)
-                    start_num = start_num + sum_num
+                    logits_grid = geo_decoder(queries=next_points[:, start_num:start_num + sum_num],
+                                              kv=kv_item)
                     logits_grid_list.append(logits_grid)
-                    input_grid = [[grid_index], [count]]
-                    sum_num = count
-            if sum_num > 0:
-                processor.topk = input_grid
-                logits_grid = geo_decoder(queries=next_points[:, start_num:start_num + sum_num], latents=latents)
-                logits_grid_list.append(logits_grid)
-            logits_grid = torch.cat(logits_grid_list, dim=1)
-            grid_logits[index.indices] = logits_grid.squeeze(0).squeeze(-1)
-            next_logits[nidx] = grid_logits
-            grid_logits = next_logits.unsqueeze(0)
-
-        grid_logits[grid_logits == -10000.] = float('nan')
+                logits_grid = torch.cat(logits_grid_list, dim=1)
+                grid_logits[index.indices] = logits_grid.squeeze(0).squeeze(-1)
+                if self.sparse:
+                    grid_logits = SparseBrickGrid.from_points(octree_depth_now, next_coords, grid_logits,
+                                                              self.brick_size)
+                else:
+                    next_logits[nidx] = grid_logits
+                    grid_logits = next_logits.unsqueeze(0)
 
-        return grid_logits
+            if not self.sparse:
+                grid_logits[grid_logits == -10000.] = float('nan')
+            batch_grid_logits.append(grid_logits)
+
+        if self.sparse:
+            return batch_grid_logits
+        return torch.cat(batch_grid_logits, dim=0)
@@ -16,6 +16,7 @@ import copy
 import importlib
 import inspect
 import os
+import time
 from typing import List, Optional, Union
 
 import numpy as np
@@ -27,9 +28,13 @@ from diffusers.utils.torch_utils import randn_tensor
 from diffusers.utils.import_utils import is_accelerate_version, is_accelerate_available
 from tqdm import tqdm
 
+from .cond_cache import ConditioningCache, conditioner_fingerprint, map_cond
 from .models.autoencoders import ShapeVAE
-from .models.autoencoders import SurfaceExtractors
-from .utils import logger, synchronize_timer, smart_load_model
+from .models.autoencoders import SurfaceExtractors, QUERY_CACHE_BYTES
+from .quantization import quantize_pipeline
+from .schedulers import SCHEDULERS
+from .utils import logger, synchronize_timer, smart_load_model, empty_weights, load_safetensors, assign_state_dict, \
+    materialize_meta_tensors
 
 
 def retrieve_timesteps(
@@ -91,6 +96,15 @@ def retrieve_timesteps(
     return timesteps, num_inference_steps
 
 
+def guidance_active(t, scheduler, guidance_interval):
+    """Whether classifier-free guidance runs at timestep `t` (see Hunyuan3DDiTFlowMatchingPipeline.__call__)."""
+    if guidance_interval is None:
+        return True
+    start, end = guidance_interval
+    t = float(t) / scheduler.config.num_train_timesteps
+    return start <= t <= end
+
+
 @synchronize_timer('Export to trimesh')
 def export_to_trimesh(mesh_output):
     if isinstance(mesh_output, list):
@@ -145,11 +159,18 @@ class Hunyuan3DDiTPipeline:
         device='cpu',
         dtype=torch.float16,
         use_safetensors=None,
+        low_cpu_mem_usage=True,
         **kwargs,
     ):
+        # Wall-clock seconds per loading phase, kept on the pipeline as `load_timings`
+        timings = {}
+        phase_start = time.perf_counter()
+
         # load config
         with open(config_path, 'r') as f:
             config = yaml.safe_load(f)
+        timings['config'] = time.perf_counter() - phase_start
+        phase_start = time.perf_counter()
 
         # load ckpt
         if use_safetensors:
@@ -158,29 +179,56 @@ class Hunyuan3DDiTPipeline:
             raise FileNotFoundError(f"Model file {ckpt_path} not found")
         logger.info(f"Loading model from {ckpt_path}")
 
-        if use_safetensors:
-            # parse safetensors
-            import safetensors.torch
-            safetensors_ckpt = safetensors.torch.load_file(ckpt_path, device='cpu')
-            ckpt = {}
-            for key, value in safetensors_ckpt.items():
-                model_name = key.split('.')[0]
-                new_key = key[len(model_name) + 1:]
-                if model_name not in ckpt:
-                    ckpt[model_name] = {}
-                ckpt[model_name][new_key] = value
+        if low_cpu_mem_usage:
+            # Build on the meta device and assign the checkpoint tensors directly: no random init and
+            # no second copy of the weights. Safetensors are memory-mapped and read one module at a time.
+            if use_safetensors:
+                def module_state_dict(name):
+                    return load_safetensors(ckpt_path, prefix=f'{name}.')
+            else:
+                ckpt = torch.load(ckpt_path, map_location='cpu', weights_only=True, mmap=True)
+
+                def module_state_dict(name):
+                    return ckpt.get(name, {})
+
+            with empty_weights():
+                model = instantiate_from_config(config['model'])
+                vae = instantiate_from_config(config['vae'])
+                conditioner = instantiate_from_config(config['conditioner'])
+            assign_state_dict(model, module_state_dict('model'))
+            assign_state_dict(vae, module_state_dict('vae'), strict=False)
+            conditioner_state_dict = module_state_dict('conditioner')
+            if conditioner_state_dict:
+                assign_state_dict(conditioner, conditioner_state_dict)
+            else:
+                # No conditioner weights in the checkpoint: it stays freshly initialized, as before
+                materialize_meta_tensors(conditioner)
         else:
-            ckpt = torch.load(ckpt_path, map_location='cpu', weights_only=True)
-        # load model
-        model = instantiate_from_config(config['model'])
-        model.load_state_dict(ckpt['model'])
-        vae = instantiate_from_config(config['vae'])
-        vae.load_state_dict(ckpt['vae'], strict=False)
-        conditioner = instantiate_from_config(config['conditioner'])
-        if 'conditioner' in ckpt:
-            conditioner.load_state_dict(ckpt['conditioner'])
+            if use_safetensors:
+                # parse safetensors
+                import safetensors.torch
+                safetensors_ckpt = safetensors.torch.load_file(ckpt_path, device='cpu')
+                ckpt = {}
+                for key, value in safetensors_ckpt.items():
+                    model_name = key.split('.')[0]
+                    new_key = key[len(model_name) + 1:]
+                    if model_name not in ckpt:
+                        ckpt[model_name] = {}
+                    ckpt[model_name][new_key] = value
+            else:
+                ckpt = torch.load(ckpt_path, map_location='cpu', weights_only=True)
+            # load model
+            model = instantiate_from_config(config['model'])
+            model.load_state_dict(ckpt['model'])
+            vae = instantiate_from_config(config['vae'])
+            vae.load_state_dict(ckpt['vae'], strict=False)
+            conditioner = instantiate_from_config(config['conditioner'])
+            if 'conditioner' in ckpt:
+                conditioner.load_state_dict(ckpt['conditioner'])
         image_processor = instantiate_from_config(config['image_processor'])
         scheduler = instantiate_from_config(config['scheduler'])
+        timings['weight_load'] = time.perf_counter() - phase_start
+        phase_start = time.perf_counter()
 
         model_kwargs = dict(
             vae=vae,
@@ -193,9 +241,16 @@ class Hunyuan3DDiTPipeline:
         )
         model_kwargs.update(kwargs)
 
-        return cls(
+        # __init__ casts and moves every module to `device`
+        pipeline = cls(
             **model_kwargs
         )
+        timings['device_move'] = time.perf_counter() - phase_start
+        pipeline.load_timings = timings
+        pipeline.conditioner_fingerprint = conditioner_fingerprint(config['conditioner'], ckpt_path)
+        pipeline.weights_fingerprint = conditioner_fingerprint(config, ckpt_path)
+        logger.info('Pipeline loading: ' + ', '.join(f'{k} {v:.2f}s' for k, v in timings.items()))
+        return pipeline
 
     @classmethod
     def from_pretrained(
@@ -233,6 +288,55 @@ class Hunyuan3DDiTPipeline:
             **kwargs
         )
 
+    @classmethod
+    def from_shared_weights(
+        cls,
+        weights_path,
+        model_path,
+        subfolder='hunyuan3d-dit-v2-0',
+        device='cpu',
+        **kwargs,
+    ):
+        """
+        Builds the pipeline around weights exported with `export_shared_weights`, without copying them.
+        Every process attaching the same file shares one copy of the weights in the page cache.
+        Only useful on CPU: moving to another device copies the weights into that process.
+        """
+        from .shared_weights import load_shared_weights, read_index
+
+        config_path, _ = smart_load_model(model_path, subfolder=subfolder, use_safetensors=True, variant='fp16')
+        with open(config_path, 'r') as f:
+            config = yaml.safe_load(f)
+
+        with empty_weights():
+            model = instantiate_from_config(config['model'])
+            vae = instantiate_from_config(config['vae'])
+            conditioner = instantiate_from_config(config['conditioner'])
+        state_dicts = load_shared_weights(weights_path)
+        assign_state_dict(model, state_dicts['model'])
+        assign_state_dict(vae, state_dicts['vae'], strict=False)
+        assign_state_dict(conditioner, state_dicts['conditioner'])
+        logger.info(f"Attached shared weights from {weights_path}")
+
+        kwargs.setdefault('from_pretrained_kwargs', dict(
+            model_path=model_path, subfolder=subfolder, use_safetensors=True, variant='fp16', device=device))
+        pipeline = cls(
+            vae=vae,
+            model=model,
+            scheduler=instantiate_from_config(config['scheduler']),
+            conditioner=conditioner,
+            image_processor=instantiate_from_config(config['image_processor']),
+            device=device,
+            # No cast: every tensor keeps the dtype it was exported with (a CPU profile may mix them),
+            # so the weights stay mapped
+            dtype=None,
+            **kwargs
+        )
+        pipeline.dtype = getattr(torch, read_index(weights_path)['dtype'])
+        pipeline.conditioner_fingerprint = conditioner_fingerprint(config['conditioner'], weights_path)
+        pipeline.weights_fingerprint = conditioner_fingerprint(config, weights_path)
+        return pipeline
+
     def __init__(
         self,
         vae,
@@ -250,6 +354,11 @@ class Hunyuan3DDiTPipeline:
         self.conditioner = conditioner
         self.image_processor = image_processor
         self.kwargs = kwargs
+        # Set by enable_cond_cache; from_single_file / from_shared_weights set the fingerprint it keys on
+        self.cond_cache = None
+        self.conditioner_fingerprint = None
+        # Whole checkpoint, the key of the saved int8 weights (enable_quantization)
+        self.weights_fingerprint = None
         self.to(device, dtype)
 
     def compile(self):
@@ -299,6 +408,50 @@ class Hunyuan3DDiTPipeline:
                 self.vae = ShapeVAE.from_pretrained(model_path, subfolder=subfolder)
             self.vae.enable_flashvdm_decoder(enabled=False)
 
+    def enable_cond_cache(self, cache_dir=None, memory_items=16, max_bytes=2 * 1024 ** 3, fingerprint=None):
+        """
+        Caches the conditioner output per image, so an image seen before (by this process, or by any
+        process sharing `cache_dir`) skips the image encoder. Generation settings are not part of the key.
+        :param cache_dir: directory for the on-disk tier; None keeps the cache in memory only
+        :param memory_items: images kept in RAM
+        :param max_bytes: size limit of `cache_dir`
+        :param fingerprint: identifies the conditioner weights; required for pipelines not built by
+            from_pretrained / from_single_file / from_shared_weights
+        """
+        fingerprint = fingerprint or self.conditioner_fingerprint
+        if fingerprint is None:
+            raise ValueError("Unknown conditioner weights: pass a fingerprint to enable_cond_cache")
+        self.cond_cache = ConditioningCache(fingerprint, cache_dir=cache_dir, memory_items=memory_items,
+                                            max_bytes=max_bytes)
+
+    def disable_cond_cache(self):
+        self.cond_cache = None
+
+    def enable_query_cache(self, max_bytes=2 * 1024 ** 3):
+        """
+        Keeps the query embeddings of the volume decoder's coarse grid on the device from one mesh to the
+        next (QueryGridCache), so only the first mesh embeds them. They stay resident for as long as the
+        process lives: about 1.9 GB at octree resolution 384, and the cache is shared by every decoder.
+        :param max_bytes: budget of the cache; grids whose embeddings do not fit are embedded per chunk
+        """
+        self.vae.volume_decoder.query_cache.resize(max_bytes)
+
+    def disable_query_cache(self):
+        self.vae.volume_decoder.query_cache.resize(QUERY_CACHE_BYTES)
+
+    def enable_quantization(self, mode='dynamic', cache_dir=None, fingerprint=None):
+        """
+        Replaces the linears of the DiT, the VAE transformer and the geometry decoder with int8 ones
+        (see hy3dgen.shapegen.quantization). CPU only; after apply_cpu_profile if both are used.
+        :param mode: 'dynamic' (int8 activations too, everything else fp32) or 'weight_only'
+        :param cache_dir: where the quantized weights are saved and looked up; None quantizes every time
+        :param fingerprint: identifies the weights; required with cache_dir for pipelines not built by
+            from_pretrained / from_single_file / from_shared_weights
+        :return: number of quantized linears
+        """
+        return quantize_pipeline(self, mode=mode, cache_dir=cache_dir,
+                                 fingerprint=fingerprint or self.weights_fingerprint)
+
     def to(self, device=None, dtype=None):
         if dtype is not None:
             self.dtype = dtype
@@ -425,7 +578,10 @@ class Hunyuan3DDiTPipeline:
     @synchronize_timer('Encode cond')
     def encode_cond(self, image, additional_cond_inputs, do_classifier_free_guidance, dual_guidance):
         bsz = image.shape[0]
-        cond = self.conditioner(image=image, **additional_cond_inputs)
+        if self.cond_cache is not None:
+            cond = self.cond_cache.encode(self.conditioner, image, additional_cond_inputs, self.dtype, self.device)
+        else:
+            cond = self.conditioner(image=image, **additional_cond_inputs)
 
         if do_classifier_free_guidance:
             un_cond = self.conditioner.unconditional_embedding(bsz, **additional_cond_inputs)
@@ -490,12 +646,14 @@ class Hunyuan3DDiTPipeline:
         return latents
 
     def prepare_image(self, image) -> dict:
-        if isinstance(image, str) and not os.path.exists(image):
-            raise FileNotFoundError(f"Couldn't find image at path {image}")
-
         if not isinstance(image, list):
             image = [image]
 
+        # A batch is one call: fail before any encoding if one of its files is missing
+        for img in image:
+            if isinstance(img, str) and not os.path.exists(img):
+                raise FileNotFoundError(f"Couldn't find image at path {img}")
+
         outputs = []
         for img in image:
             output = self.image_processor(img)
@@ -539,6 +697,15 @@ class Hunyuan3DDiTPipeline:
         assert emb.shape == (w.shape[0], embedding_dim)
         return emb
 
+    def set_scheduler(self, name, **kwargs):
+        """
+        Swaps the ODE solver (see schedulers.SCHEDULERS), keeping the current scheduler's config (shift, ...).
+        :param kwargs: config overrides for the new scheduler
+        """
+        if name not in SCHEDULERS:
+            raise ValueError(f'Unknown scheduler {name}, available: {list(SCHEDULERS)}')
+        self.scheduler = SCHEDULERS[name].from_config(self.scheduler.config, **kwargs)
+
     def set_surface_extractor(self, mc_algo):
         if mc_algo is None:
             return
@@ -573,6 +740,7 @@ class Hunyuan3DDiTPipeline:
     ) -> List[List[trimesh.Trimesh]]:
         callback = kwargs.pop("callback", None)
         callback_steps = kwargs.pop("callback_steps", None)
+        progress_callback = kwargs.pop("progress_callback", None)
 
         self.set_surface_extractor(mc_algo)
 
@@ -640,11 +808,14 @@ class Hunyuan3DDiTPipeline:
                 if callback is not None and i % callback_steps == 0:
                     step_idx = i // getattr(self.scheduler, "order", 1)
                     callback(step_idx, t, outputs)
+                if progress_callback is not None:
+                    progress_callback('diffusion', step=i + 1, steps=len(timesteps))
 
         return self._export(
             latents,
             output_type,
             box_v, mc_level, num_chunks, octree_resolution, mc_algo,
+            progress_callback=progress_callback,
         )
 
     def _export(
@@ -656,7 +827,8 @@ class Hunyuan3DDiTPipeline:
         num_chunks=20000,
         octree_resolution=256,
         mc_algo='mc',
-        enable_pbar=True
+        enable_pbar=True,
+        progress_callback=None,
     ):
         if not output_type == "latent":
             latents = 1. / self.vae.scale_factor * latents
@@ -669,6 +841,7 @@ class Hunyuan3DDiTPipeline:
                 octree_resolution=octree_resolution,
                 mc_algo=mc_algo,
                 enable_pbar=enable_pbar,
+                progress_callback=progress_callback,
             )
         else:
             outputs = latents
@@ -698,10 +871,18 @@ class Hunyuan3DDiTFlowMatchingPipeline(Hunyuan3DDiTPipeline):
         num_chunks=8000,
         output_type: Optional[str] = "trimesh",
         enable_pbar=True,
+        guidance_interval=None,
         **kwargs,
     ) -> List[List[trimesh.Trimesh]]:
+        """
+        :param guidance_interval: (start, end) in normalized time, 0 = pure noise and 1 = clean sample.
+            Classifier-free guidance (a doubled DiT batch) only runs for steps with start <= t <= end;
+            the other steps run the conditional branch alone. None guides every step. E.g. (0, 0.6)
+            truncates guidance for the last 40% of the trajectory.
+        """
         callback = kwargs.pop("callback", None)
         callback_steps = kwargs.pop("callback_steps", None)
+        progress_callback = kwargs.pop("progress_callback", None)
 
         self.set_surface_extractor(mc_algo)
 
@@ -733,6 +914,15 @@ class Hunyuan3DDiTFlowMatchingPipeline(Hunyuan3DDiTPipeline):
         )
         latents = self.prepare_latents(batch_size, dtype, device, generator)
 
+        guided_steps = [do_classifier_free_guidance and guidance_active(t, self.scheduler, guidance_interval)
+                        for t in timesteps]
+        if do_classifier_free_guidance:
+            # Conditional half of the embeddings, sliced once for every unguided step
+            cond_only = map_cond(lambda x: x[:batch_size], cond)
+            if guidance_interval is not None:
+                logger.info(f'Guidance interval {guidance_interval}: {sum(guided_steps)}/{len(timesteps)} '
+                            f'steps use classifier-free guidance')
+
         guidance = None
         if hasattr(self.model, 'guidance_embed') and \
             self.model.guidance_embed is True:
@@ -742,17 +932,19 @@ class Hunyuan3DDiTFlowMatchingPipeline(Hunyuan3DDiTPipeline):
         with synchronize_timer('Diffusion Sampling'):
             for i, t in enumerate(tqdm(timesteps, disable=not enable_pbar, desc="Diffusion Sampling:")):
                 # expand the latents if we are doing classifier free guidance
-                if do_classifier_free_guidance:
+                if guided_steps[i]:
                     latent_model_input = torch.cat([latents] * 2)
+                    step_cond = cond
                 else:
                     latent_model_input = latents
+                    step_cond = cond_only if do_classifier_free_guidance else cond
 
                 # NOTE: we assume model get timesteps ranged from 0 to 1
                 timestep = t.expand(latent_model_input.shape[0]).to(
                     latents.dtype) / self.scheduler.config.num_train_timesteps
-                noise_pred = self.model(latent_model_input, timestep, cond, guidance=guidance)
+                noise_pred = self.model(latent_model_input, timestep, step_cond, guidance=guidance)
 
-                if do_classifier_free_guidance:
+                if guided_steps[i]:
                     noise_pred_cond, noise_pred_uncond = noise_pred.chunk(2)
                     noise_pred = noise_pred_uncond + guidance_scale * (noise_pred_cond - noise_pred_uncond)
 
@@ -763,10 +955,13 @@ class Hunyuan3DDiTFlowMatchingPipeline(Hunyuan3DDiTPipeline):
                 if callback is not None and i % callback_steps == 0:
                     step_idx = i // getattr(self.scheduler, "order", 1)
                     callback(step_idx, t, outputs)
+                if progress_callback is not None:
+                    progress_callback('diffusion', step=i + 1, steps=len(timesteps))
 
         return self._export(
             latents,
             output_type,
             box_v, mc_level, num_chunks, octree_resolution, mc_algo,
             enable_pbar=enable_pbar,
+            progress_callback=progress_callback,
         )
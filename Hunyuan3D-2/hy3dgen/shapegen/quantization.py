@@ -0,0 +1,208 @@
+# Hunyuan 3D is licensed under the TENCENT HUNYUAN NON-COMMERCIAL LICENSE AGREEMENT
+# except for the third-party components listed below.
+# Hunyuan 3D does not impose any additional limitations beyond what is outlined
+# in the repsective licenses of these third-party components.
+# Users must comply with all terms and conditions of original licenses of these third-party
+# components and must ensure that the usage of the third party components adheres to
+# all relevant laws and regulations.
+
+# For avoidance of doubts, Hunyuan 3D means the large language models and
+# their software and algorithms, including trained model weights, parameters (including
+# optimizer states), machine-learning model code, inference-enabling code, training-enabling code,
+# fine-tuning enabling code and other elements of the foregoing made publicly available
+# by Tencent in accordance with TENCENT HUNYUAN COMMUNITY LICENSE AGREEMENT.
+
+"""
+int8 quantization of the linear layers that dominate CPU inference: the DiT, the VAE transformer
+and the geometry decoder (the image encoder is left alone).
+
+    dynamic      torch's dynamic int8 Linear: int8 weights (per output channel) and activations
+                 quantized on the fly, fp32 everywhere else. Fastest where the CPU has VNNI / AMX.
+    weight_only  int8 weights with a per-channel scale, activations stay in the module's dtype
+                 (bf16 / fp32): a quarter (fp32) or half (bf16) of the weight memory and bandwidth.
+
+The quantized layers are saved per checkpoint and mode, so the next process loads them instead of
+quantizing again.
+"""
+
+import hashlib
+import os
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from .cpu_profile import _wrap_forward
+from .utils import logger, synchronize_timer
+
+QUANTIZATION_MODES = ('dynamic', 'weight_only')
+# Pipeline attribute paths of the quantized modules
+QUANTIZED_MODULES = ('model', 'vae.transformer', 'vae.geo_decoder')
+# Their linears are read as weights (.weight.dtype, multi_head_attention_forward), not called
+SKIPPED_PARENTS = ('TimestepEmbedder', 'AttentionPool')
+
+
+class Int8WeightOnlyLinear(nn.Module):
+    """nn.Linear with int8 weights and a per-output-channel scale; computes in the input's dtype."""
+
+    def __init__(self, in_features, out_features, bias=True, dtype=torch.float32):
+        super().__init__()
+        self.in_features = in_features
+        self.out_features = out_features
+        self.register_buffer('weight_int8', torch.zeros(out_features, in_features, dtype=torch.int8))
+        self.register_buffer('scale', torch.ones(out_features, dtype=torch.float32))
+        self.register_buffer('bias', torch.zeros(out_features, dtype=dtype) if bias else None)
+        # aten's CPU int8 weight kernel; switched off for good if it rejects the shapes
+        self.use_int8_mm = hasattr(torch.ops.aten, '_weight_int8pack_mm')
+
+    @classmethod
+    def from_float(cls, linear):
+        weight = linear.weight.detach().float()
+        scale = weight.abs().amax(dim=1).clamp(min=1e-8) / 127
+        module = cls(linear.in_features, linear.out_features, linear.bias is not None, dtype=linear.weight.dtype)
+        module.weight_int8.copy_(torch.round(weight / scale[:, None]).clamp(-127, 127).to(torch.int8))
+        module.scale.copy_(scale)
+        if linear.bias is not None:
+            module.bias.copy_(linear.bias.detach())
+        return module
+
+    def forward(self, x):
+        shape = x.shape
+        x = x.reshape(-1, self.in_features)
+        scale = self.scale.to(x.dtype)
+        out = None
+        if self.use_int8_mm and x.device.type == 'cpu':
+            try:
+                out = torch.ops.aten._weight_int8pack_mm(x.contiguous(), self.weight_int8, scale)
+            except RuntimeError:
+                self.use_int8_mm = False
+        if out is None:
+            out = F.linear(x, self.weight_int8.to(x.dtype)) * scale
+        if self.bias is not None:
+            out = out + self.bias.to(x.dtype)
+        return out.reshape(*shape[:-1], self.out_features)
+
+    def extra_repr(self):
+        return f'in_features={self.in_features}, out_features={self.out_features}, bias={self.bias is not None}'
+
+
+def _quantized_linear(linear, mode):
+    if mode == 'weight_only':
+        return Int8WeightOnlyLinear.from_float(linear)
+    from torch.ao.nn.quantized.dynamic import Linear as DynamicLinear
+    linear = linear.float()
+    linear.qconfig = torch.ao.quantization.per_channel_dynamic_qconfig
+    return DynamicLinear.from_float(linear)
+
+
+def _empty_quantized_linear(linear, mode):
+    """Same layout as `_quantized_linear(linear, mode)`, to load saved weights into."""
+    bias = linear.bias is not None
+    if mode == 'weight_only':
+        return Int8WeightOnlyLinear(linear.in_features, linear.out_features, bias, dtype=linear.weight.dtype)
+    from torch.ao.nn.quantized.dynamic import Linear as DynamicLinear
+    return DynamicLinear(linear.in_features, linear.out_features, bias_=bias, dtype=torch.qint8)
+
+
+def _unwrap(module):
+    # torch.compile wraps the module; quantize the original one (the graph is built on the first call)
+    return getattr(module, '_orig_mod', module)
+
+
+def _collect_linears(module, prefix, linears):
+    for attr, child in module.named_children():
+        name = f'{prefix}.{attr}'
+        if type(child) is nn.Linear:
+            linears.append((name, module, attr, child))
+        elif type(child).__name__ not in SKIPPED_PARENTS:
+            _collect_linears(child, name, linears)
+
+
+def _target_linears(pipeline):
+    """[(name, parent module, attribute, nn.Linear)] of every linear to quantize."""
+    linears = []
+    for path in QUANTIZED_MODULES:
+        root = pipeline
+        for attr in path.split('.'):
+            root = _unwrap(getattr(root, attr))
+        _collect_linears(root, path, linears)
+    return linears
+
+
+def quantization_key(fingerprint, mode, source_dtype):
+    payload = f'{fingerprint}|{mode}|{source_dtype}|{torch.__version__}|{",".join(QUANTIZED_MODULES)}'
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def _load_saved(path, linears, mode):
+    """The quantized linears saved at `path`, in the order of `linears`, or None to quantize again."""
+    if not os.path.exists(path):
+        return None
+    try:
+        saved = torch.load(path, map_location='cpu', weights_only=True)
+        if set(saved) != {name for name, *_ in linears}:
+            return None
+        loaded = []
+        for name, _, _, linear in linears:
+            quantized = _empty_quantized_linear(linear, mode)
+            quantized.load_state_dict(saved[name])
+            loaded.append(quantized)
+        return loaded
+    except Exception as e:
+        # Torn file, or an unpickler (weights_only) that rejects the packed int8 params of this torch build
+        logger.warning(f'Could not load the quantized weights from {path} ({e!r}), quantizing again')
+        return None
+
+
+@synchronize_timer('Quantization')
+def quantize_pipeline(pipeline, mode='dynamic', cache_dir=None, fingerprint=None):
+    """
+    Replaces the linears of QUANTIZED_MODULES with int8 ones, in place. CPU only.
+    :param mode: 'dynamic' or 'weight_only' (see the module docstring)
+    :param cache_dir: directory of the saved quantized weights; None quantizes every time
+    :param fingerprint: identifies the pipeline's weights (the cache key); needed with cache_dir
+    :return: number of quantized linears
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode {mode!r}, expected one of {QUANTIZATION_MODES}")
+    if pipeline.device.type != 'cpu':
+        raise ValueError(f'int8 quantization needs a pipeline on the CPU, got {pipeline.device}')
+
+    linears = _target_linears(pipeline)
+    if not linears:
+        return 0
+    path = None
+    saved = None
+    if cache_dir:
+        if fingerprint is None:
+            raise ValueError("Unknown pipeline weights: pass a fingerprint to cache the quantized weights")
+        path = os.path.join(cache_dir, f'{quantization_key(fingerprint, mode, linears[0][3].weight.dtype)}.pt')
+        saved = _load_saved(path, linears, mode)
+
+    if saved is not None:
+        for (_, parent, attr, _), quantized in zip(linears, saved):
+            setattr(parent, attr, quantized)
+        logger.info(f'Loaded {len(linears)} {mode} int8 linears from {path}')
+    else:
+        state_dicts = {}
+        for name, parent, attr, linear in linears:
+            quantized = _quantized_linear(linear, mode)
+            setattr(parent, attr, quantized)
+            state_dicts[name] = quantized.state_dict()
+        if path:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            torch.save(state_dicts, tmp_path)
+            os.replace(tmp_path, path)
+        logger.info(f'Quantized {len(linears)} linears ({mode} int8)' + (f', saved to {path}' if path else ''))
+
+    if mode == 'dynamic':
+        # Dynamic int8 linears take fp32 activations: the rest of the DiT and the VAE follow
+        pipeline.model.float()
+        pipeline.vae.float()
+        for module in (_unwrap(pipeline.model), _unwrap(pipeline.vae), pipeline.vae.geo_decoder):
+            if hasattr(module, '_cpu_profile_forward'):
+                # apply_cpu_profile casts the inputs at the module boundary: cast them to fp32 instead
+                _wrap_forward(module, torch.float32)
+        pipeline.dtype = torch.float32
+    return len(linears)
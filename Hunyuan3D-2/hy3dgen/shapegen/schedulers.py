@@ -478,3 +478,159 @@ class ConsistencyFlowMatchEulerDiscreteScheduler(SchedulerMixin, ConfigMixin):
 
     def __len__(self):
         return self.config.num_train_timesteps
+
+
+class FlowMatchHeunDiscreteScheduler(FlowMatchEulerDiscreteScheduler):
+    """
+    Heun (second-order, trapezoidal) solver for the flow-matching ODE, same timestep convention as
+    FlowMatchEulerDiscreteScheduler (t goes from 0 = noise to 1 = data).
+
+    Every interval costs two model evaluations, so like diffusers' HeunDiscreteScheduler the timesteps are
+    interleaved ([t0, t1, t1, t2, t2, ...]) and `step` alternates between an Euler predictor and the
+    trapezoidal corrector; the pipeline's denoising loop needs no changes. Intervals of zero length (the
+    schedule ending exactly at t=1) are dropped instead of costing two evaluations.
+    """
+
+    order = 2
+
+    def set_timesteps(
+        self,
+        num_inference_steps: int = None,
+        device: Union[str, torch.device] = None,
+        sigmas: Optional[List[float]] = None,
+        mu: Optional[float] = None,
+    ):
+        super().set_timesteps(num_inference_steps, device=device, sigmas=sigmas, mu=mu)
+        # Interval end points p_0 < ... < p_k = 1
+        points = torch.unique_consecutive(self.sigmas.clamp(max=1.0))
+        if points[-1] < 1.0:
+            points = torch.cat([points, torch.ones(1, device=points.device)])
+        # Evaluations: p_0, then (p_i for the corrector of interval i-1, p_i for the predictor of interval i)
+        sigmas = torch.cat([points[:1], points[1:-1].repeat_interleave(2), points[-1:]])
+        self.timesteps = (sigmas * self.config.num_train_timesteps).to(device=device)
+        self.sigmas = torch.cat([sigmas, torch.ones(1, device=sigmas.device)])
+        self.num_inference_steps = len(points) - 1
+
+        self.prev_derivative = None
+        self.dt = None
+        self.sample = None
+
+    @property
+    def state_in_first_order(self):
+        return self.dt is None
+
+    def step(
+        self,
+        model_output: torch.FloatTensor,
+        timestep: Union[float, torch.FloatTensor],
+        sample: torch.FloatTensor,
+        generator: Optional[torch.Generator] = None,
+        return_dict: bool = True,
+        **kwargs,
+    ) -> Union[FlowMatchEulerDiscreteSchedulerOutput, Tuple]:
+        if self.step_index is None:
+            self._init_step_index(timestep)
+
+        model_output_fp32 = model_output.to(torch.float32)
+        if self.state_in_first_order:
+            # Predictor: Euler to the end of the interval; the model is evaluated there next
+            sample = sample.to(torch.float32)
+            sigma = self.sigmas[self.step_index]
+            sigma_next = self.sigmas[self.step_index + 1]
+            self.prev_derivative = model_output_fp32
+            self.dt = sigma_next - sigma
+            self.sample = sample
+            prev_sample = sample + self.dt * model_output_fp32
+        else:
+            # Corrector: average the slopes at both ends, restart from the start of the interval
+            derivative = (self.prev_derivative + model_output_fp32) / 2
+            prev_sample = self.sample + self.dt * derivative
+            self.prev_derivative = None
+            self.dt = None
+            self.sample = None
+
+        prev_sample = prev_sample.to(model_output.dtype)
+        self._step_index += 1
+
+        if not return_dict:
+            return (prev_sample,)
+
+        return FlowMatchEulerDiscreteSchedulerOutput(prev_sample=prev_sample)
+
+
+class FlowMatchAB2DiscreteScheduler(FlowMatchEulerDiscreteScheduler):
+    """
+    Second-order Adams-Bashforth multistep solver for the flow-matching ODE: one model evaluation per
+    step, like Euler, but each step extrapolates the velocity from the current and previous evaluation
+    (variable step sizes supported), the same idea as DPM-Solver-2M applied to the velocity.
+
+    The first step is Euler (no history yet) and so is the last one when `lower_order_final` is set,
+    which keeps very short schedules stable.
+    """
+
+    order = 1
+
+    @register_to_config
+    def __init__(
+        self,
+        num_train_timesteps: int = 1000,
+        shift: float = 1.0,
+        use_dynamic_shifting=False,
+        lower_order_final: bool = True,
+    ):
+        super().__init__(num_train_timesteps=num_train_timesteps, shift=shift,
+                         use_dynamic_shifting=use_dynamic_shifting)
+        self.prev_output = None
+        self.prev_dt = None
+
+    def set_timesteps(self, *args, **kwargs):
+        super().set_timesteps(*args, **kwargs)
+        self.prev_output = None
+        self.prev_dt = None
+
+    def step(
+        self,
+        model_output: torch.FloatTensor,
+        timestep: Union[float, torch.FloatTensor],
+        sample: torch.FloatTensor,
+        generator: Optional[torch.Generator] = None,
+        return_dict: bool = True,
+        **kwargs,
+    ) -> Union[FlowMatchEulerDiscreteSchedulerOutput, Tuple]:
+        if self.step_index is None:
+            self._init_step_index(timestep)
+
+        sample = sample.to(torch.float32)
+        model_output_fp32 = model_output.to(torch.float32)
+        sigma = self.sigmas[self.step_index]
+        sigma_next = self.sigmas[self.step_index + 1]
+        dt = sigma_next - sigma
+
+        # The schedule always ends at t=1, so the interval reaching it is the last one that moves the sample
+        is_last = sigma_next >= 1.0
+        use_first_order = (self.prev_output is None or not self.prev_dt > 0
+                           or (self.config.lower_order_final and is_last))
+        if use_first_order:
+            derivative = model_output_fp32
+        else:
+            ratio = dt / (2 * self.prev_dt)
+            derivative = (1 + ratio) * model_output_fp32 - ratio * self.prev_output
+        prev_sample = sample + dt * derivative
+
+        self.prev_output = model_output_fp32
+        self.prev_dt = dt
+        prev_sample = prev_sample.to(model_output.dtype)
+        self._step_index += 1
+
+        if not return_dict:
+            return (prev_sample,)
+
+        return FlowMatchEulerDiscreteSchedulerOutput(prev_sample=prev_sample)
+
+
+# Solvers sharing the flow-matching timestep convention; see Hunyuan3DDiTPipeline.set_scheduler
+SCHEDULERS = {
+    'euler': FlowMatchEulerDiscreteScheduler,
+    'heun': FlowMatchHeunDiscreteScheduler,
+    'ab2': FlowMatchAB2DiscreteScheduler,
+}
@@ -0,0 +1,103 @@
+# Hunyuan 3D is licensed under the TENCENT HUNYUAN NON-COMMERCIAL LICENSE AGREEMENT
+# except for the third-party components listed below.
+# Hunyuan 3D does not impose any additional limitations beyond what is outlined
+# in the repsective licenses of these third-party components.
+# Users must comply with all terms and conditions of original licenses of these third-party
+# components and must ensure that the usage of the third party components adheres to
+# all relevant laws and regulations.
+
+# For avoidance of doubts, Hunyuan 3D means the large language models and
+# their software and algorithms, including trained model weights, parameters (including
+# optimizer states), machine-learning model code, inference-enabling code, training-enabling code,
+# fine-tuning enabling code and other elements of the foregoing made publicly available
+# by Tencent in accordance with TENCENT HUNYUAN COMMUNITY LICENSE AGREEMENT.
+
+"""
+One copy of the pipeline weights for any number of worker processes.
+
+`export_shared_weights` writes the state dicts of a loaded pipeline (already in
+its inference dtype) into one flat file, every tensor aligned to ALIGNMENT
+bytes, plus a JSON index. `load_shared_weights` maps that file copy-on-write
+with `torch.from_file(shared=False)` and returns tensor views into it, so the
+weights are backed by the page cache: every process attaching the same file
+shares the same physical pages, and a worker's own RSS is its activations.
+"""
+
+import json
+import os
+
+import torch
+
+from .utils import logger
+
+ALIGNMENT = 64
+FORMAT_VERSION = 1
+MODULES = ('model', 'vae', 'conditioner')
+
+
+def index_path_for(weights_path):
+    return f'{weights_path}.json'
+
+
+def export_shared_weights(pipeline, weights_path):
+    """
+    Writes the weights of `pipeline` (model, vae, conditioner) to `weights_path` and its index.
+    Written to temp files and renamed, so a reader never sees a half-written file.
+    :return: total size in bytes
+    """
+    tensors = {}
+    offset = 0
+    tmp_path = f'{weights_path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        for module_name in MODULES:
+            for key, tensor in getattr(pipeline, module_name).state_dict().items():
+                data = tensor.detach().to('cpu').contiguous().reshape(-1).view(torch.uint8)
+                padding = -offset % ALIGNMENT
+                f.write(b'\0' * padding)
+                offset += padding
+                f.write(data.numpy().tobytes())
+                tensors[f'{module_name}.{key}'] = {
+                    'offset': offset,
+                    'nbytes': data.numel(),
+                    'dtype': str(tensor.dtype).replace('torch.', ''),
+                    'shape': list(tensor.shape),
+                }
+                offset += data.numel()
+        f.flush()
+        os.fsync(f.fileno())
+
+    index = {'version': FORMAT_VERSION, 'size': offset, 'dtype': str(pipeline.dtype).replace('torch.', ''),
+             'tensors': tensors}
+    with open(f'{index_path_for(weights_path)}.tmp', 'w') as f:
+        json.dump(index, f)
+    # Index first: a weights file is only ever visible together with a matching index
+    os.replace(f'{index_path_for(weights_path)}.tmp', index_path_for(weights_path))
+    os.replace(tmp_path, weights_path)
+    logger.info(f'Exported {len(tensors)} tensors ({offset / 1024 ** 3:.2f} GiB) to {weights_path}')
+    return offset
+
+
+def read_index(weights_path):
+    with open(index_path_for(weights_path)) as f:
+        return json.load(f)
+
+
+def load_shared_weights(weights_path):
+    """
+    Maps `weights_path` copy-on-write and returns {module name: state dict of views into the mapping}.
+    The views are read-only in practice (inference never writes weights); a write would only
+    copy the touched page into this process, never change the file.
+    """
+    index = read_index(weights_path)
+    if index.get('version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported shared weights format {index.get('version')} in {weights_path}")
+    if os.path.getsize(weights_path) != index['size']:
+        raise ValueError(f"{weights_path} does not match its index (re-export it)")
+
+    flat = torch.from_file(weights_path, shared=False, size=index['size'], dtype=torch.uint8)
+    state_dicts = {name: {} for name in MODULES}
+    for key, meta in index['tensors'].items():
+        module_name, name = key.split('.', 1)
+        data = flat[meta['offset']: meta['offset'] + meta['nbytes']]
+        state_dicts[module_name][name] = data.view(getattr(torch, meta['dtype'])).view(meta['shape'])
+    return state_dicts
@@ -12,11 +12,14 @@
 # fine-tuning enabling code and other elements of the foregoing made publicly available
 # by Tencent in accordance with TENCENT HUNYUAN COMMUNITY LICENSE AGREEMENT.
 
+import contextlib
 import logging
 import os
+import time
 from functools import wraps
 
 import torch
+import torch.nn as nn
 
 
 def get_logger(name):
@@ -35,10 +38,32 @@ def get_logger(name):
 logger = get_logger('hy3dgen.shapgen')
 
 
+# Dicts filled by active collect_timings() blocks: timer name -> total milliseconds
+_timing_sinks = []
+
+
+@contextlib.contextmanager
+def collect_timings():
+    """
+    Records every `synchronize_timer` that runs inside the block, whatever HY3DGEN_DEBUG says.
+
+        with collect_timings() as timings:
+            pipeline(image=...)
+        # timings == {'Encode cond': 412.0, 'Diffusion Sampling': 20210.5, ...} (ms, summed per name)
+    """
+    timings = {}
+    _timing_sinks.append(timings)
+    try:
+        yield timings
+    finally:
+        _timing_sinks.remove(timings)
+
+
 class synchronize_timer:
     """ Synchronized timer to count the inference time of `nn.Module.forward`.
 
-        Supports both context manager and decorator usage.
+        Supports both context manager and decorator usage. Uses CUDA events when CUDA is in use
+        and `time.perf_counter` otherwise (CPU-only runs).
 
         Example as context manager:
         ```python
@@ -56,30 +81,46 @@ class synchronize_timer:
 
     def __init__(self, name=None):
         self.name = name
+        self.time = None
+
+    def _enabled(self):
+        return os.environ.get('HY3DGEN_DEBUG', '0') == '1' or bool(_timing_sinks)
 
     def __enter__(self):
         """Context manager entry: start timing."""
-        if os.environ.get('HY3DGEN_DEBUG', '0') == '1':
-            self.start = torch.cuda.Event(enable_timing=True)
-            self.end = torch.cuda.Event(enable_timing=True)
-            self.start.record()
+        self.active = self._enabled()
+        if self.active:
+            self.use_cuda = torch.cuda.is_available() and torch.cuda.is_initialized()
+            if self.use_cuda:
+                self.start = torch.cuda.Event(enable_timing=True)
+                self.end = torch.cuda.Event(enable_timing=True)
+                self.start.record()
+            else:
+                self.start = time.perf_counter()
             return lambda: self.time
 
     def __exit__(self, exc_type, exc_value, exc_tb):
         """Context manager exit: stop timing and log results."""
-        if os.environ.get('HY3DGEN_DEBUG', '0') == '1':
-            self.end.record()
-            torch.cuda.synchronize()
-            self.time = self.start.elapsed_time(self.end)
+        if self.active:
+            if self.use_cuda:
+                self.end.record()
+                torch.cuda.synchronize()
+                self.time = self.start.elapsed_time(self.end)
+            else:
+                self.time = (time.perf_counter() - self.start) * 1000
             if self.name is not None:
-                logger.info(f'{self.name} takes {self.time} ms')
+                if os.environ.get('HY3DGEN_DEBUG', '0') == '1':
+                    logger.info(f'{self.name} takes {self.time} ms')
+                for timings in _timing_sinks:
+                    timings[self.name] = timings.get(self.name, 0.0) + self.time
 
     def __call__(self, func):
         """Decorator: wrap the function to time its execution."""
 
         @wraps(func)
         def wrapper(*args, **kwargs):
-            with self:
+            # A fresh timer per call, so nested or concurrent calls do not share state
+            with synchronize_timer(self.name):
                 result = func(*args, **kwargs)
             return result
 
@@ -124,3 +165,71 @@ def smart_load_model(
     config_path = os.path.join(model_path, 'config.yaml')
     ckpt_path = os.path.join(model_path, ckpt_name)
     return config_path, ckpt_path
+
+
+def empty_weights():
+    """
+    Context manager that creates module parameters on the meta device (no memory, no random init).
+    Buffers stay real, so values computed in `__init__` survive. Falls back to normal
+    construction when accelerate is not installed.
+    """
+    try:
+        from accelerate import init_empty_weights
+    except ImportError:
+        logger.warning('accelerate is not installed, modules are built with random init before loading weights')
+        return contextlib.nullcontext()
+    return init_empty_weights()
+
+
+def load_safetensors(ckpt_path, prefix=''):
+    """
+    Reads the tensors under `prefix` from a memory-mapped safetensors file, with the prefix stripped.
+    Only the requested tensors are read, so loading a pipeline module by module never holds the whole file.
+    """
+    from safetensors import safe_open
+    state_dict = {}
+    with safe_open(ckpt_path, framework='pt', device='cpu') as f:
+        for key in f.keys():
+            if key.startswith(prefix):
+                state_dict[key[len(prefix):]] = f.get_tensor(key)
+    return state_dict
+
+
+def materialize_meta_tensors(module: nn.Module, device='cpu'):
+    """
+    Replaces parameters and buffers still on the meta device (not in the checkpoint) with real ones.
+    Submodules with nothing loaded are re-initialized with `reset_parameters()`; partially
+    loaded ones get zeros for the missing tensors so loaded weights are never overwritten.
+    :return: names of the materialized tensors
+    """
+    materialized = []
+    for module_name, submodule in module.named_modules():
+        params = dict(submodule.named_parameters(recurse=False))
+        buffers = dict(submodule.named_buffers(recurse=False))
+        meta = [name for name, t in {**params, **buffers}.items() if t is not None and t.is_meta]
+        if not meta:
+            continue
+        for name in meta:
+            if name in params:
+                old = params[name]
+                setattr(submodule, name, nn.Parameter(torch.zeros_like(old, device=device),
+                                                      requires_grad=old.requires_grad))
+            else:
+                submodule._buffers[name] = torch.zeros_like(buffers[name], device=device)
+            materialized.append(f'{module_name}.{name}' if module_name else name)
+        if len(meta) == len(params) + len(buffers) and hasattr(submodule, 'reset_parameters'):
+            submodule.reset_parameters()
+    if materialized:
+        logger.warning(f'{len(materialized)} tensors not found in the checkpoint were initialized: '
+                       f'{materialized[:8]}{" ..." if len(materialized) > 8 else ""}')
+    return materialized
+
+
+def assign_state_dict(module: nn.Module, state_dict, strict=True):
+    """
+    Loads `state_dict` into a module built under `empty_weights()` by assigning the checkpoint
+    tensors as parameters (no copy), then materializes whatever the checkpoint did not cover.
+    """
+    result = module.load_state_dict(state_dict, strict=strict, assign=True)
+    materialize_meta_tensors(module)
+    return result
@@ -1,7 +1,10 @@
+import os
 import sys
+import threading
+import time
 from pathlib import Path
 sys.path.insert(0, '/content/Hunyuan3D-2/')
-from hy3dgen.shapegen import Hunyuan3DDiTFlowMatchingPipeline
+# hy3dgen (torch, diffusers, transformers) is imported by get_pipeline(), so importing this module stays cheap
 
 # Get the absolute path of the script (backend_servo.py)
 SCRIPT_DIR = Path(__file__).resolve().parent
@@ -10,38 +13,174 @@ SCRIPT_DIR = Path(__file__).resolve().parent
 PROJECT_ROOT = SCRIPT_DIR.parent
 
 
-# Use the absolute path to the parent folder of 'hunyuan3d-dit-v2-0'
-pipeline = Hunyuan3DDiTFlowMatchingPipeline.from_pretrained(f'{PROJECT_ROOT}/Hunyuan3D-2')
+MODEL_SUBFOLDER = 'hunyuan3d-dit-v2-0'
 
-def img_to_3d(img_name,name_without_ext=""):
+# int8 linears in the DiT and the VAE on CPU nodes: 'dynamic' or 'weight_only' (hy3dgen.shapegen.quantization);
+# unset keeps the float weights. The quantized weights are saved in QUANT_CACHE_DIR for the next start.
+QUANTIZE = os.environ.get('HY3DGEN_QUANTIZE', '')
+QUANT_CACHE_DIR = os.environ.get('HY3DGEN_QUANT_CACHE', str(PROJECT_ROOT / '.quant_cache'))
+
+# Everything that changes the generated mesh; the worker keys its mesh cache on these
+PIPELINE_SETTINGS = dict(
+    # int8 weights build (slightly) different meshes than the float ones
+    model=MODEL_SUBFOLDER + (f'+int8-{QUANTIZE}' if QUANTIZE else ''),
+    num_inference_steps=50,
+    guidance_scale=5.0,
+    octree_resolution=384,
+    mc_level=0.0,
+    num_chunks=8000,
+)
+
+# Path of a flat weights file shared by all worker processes (exported by the first worker
+# that finds it missing). Unset: every worker loads its own copy of the checkpoint.
+SHARED_WEIGHTS = os.environ.get('HY3DGEN_SHARED_WEIGHTS')
+
+# Most jobs a worker builds in one pipeline call (img_to_3d_batch). Batching only changes
+# throughput, not the meshes' settings, so it is not part of PIPELINE_SETTINGS.
+BATCH_SIZE = int(os.environ.get('HY3DGEN_BATCH_SIZE', '4'))
+
+# Conditioner outputs are cached here per image (shared by all workers), so re-submitting an image
+# skips the image encoder. Set HY3DGEN_COND_CACHE to '' to keep the cache in memory only.
+COND_CACHE_DIR = os.environ.get('HY3DGEN_COND_CACHE', str(PROJECT_ROOT / '.cond_cache'))
+
+# On CPU-only nodes: bf16/fp32 per module instead of fp16, tuned threads (hy3dgen.shapegen.cpu_profile).
+# HY3DGEN_COMPILE=1 also compiles the DiT with torch.compile (minutes on the first job, faster after).
+CPU_PROFILE = os.environ.get('HY3DGEN_CPU_PROFILE', '1') == '1'
+COMPILE = os.environ.get('HY3DGEN_COMPILE', '0') == '1'
+
+# Surface extractor (hy3dgen.shapegen.models.autoencoders.SurfaceExtractors): 'mc_parallel' runs marching
+# cubes block-wise on a thread per core, for the same mesh as 'mc', so it is not part of PIPELINE_SETTINGS
+MC_ALGO = os.environ.get('HY3DGEN_MC_ALGO', 'mc')
+
+# Device memory (MB) for the volume decoder's query embeddings, kept from one mesh to the next
+# (pipeline.enable_query_cache); about 1900 holds the coarse grid at octree resolution 384. 0 keeps it off.
+QUERY_CACHE_MB = int(os.environ.get('HY3DGEN_QUERY_CACHE_MB', '0'))
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def _load_shared_pipeline(pipeline_cls, model_path):
+    """Attaches SHARED_WEIGHTS on the CPU, exporting it first if no worker has done so yet."""
+    import fcntl
+    from hy3dgen.shapegen import export_shared_weights
+
+    with open(f'{SHARED_WEIGHTS}.lock', 'w') as lock:
+        # Workers booting together wait here while the first one exports
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if not os.path.exists(SHARED_WEIGHTS):
+            print(f"Exporting shared weights to {SHARED_WEIGHTS}...")
+            loaded = pipeline_cls.from_pretrained(model_path, subfolder=MODEL_SUBFOLDER, device='cpu')
+            if CPU_PROFILE:
+                # Export in the profile's dtypes, so the workers can map the file without casting
+                from hy3dgen.shapegen import apply_cpu_profile
+                apply_cpu_profile(loaded)
+            export_shared_weights(loaded, SHARED_WEIGHTS)
+            del loaded
+    return pipeline_cls.from_shared_weights(SHARED_WEIGHTS, model_path, subfolder=MODEL_SUBFOLDER, device='cpu')
+
+
+# Seconds spent in each startup phase of the pipeline, filled in by get_pipeline()
+STARTUP_TIMINGS = {}
+
+
+def get_pipeline():
+    """
+    Builds the shape pipeline on first use and returns the same instance afterwards.
+    Thread-safe; the first caller pays the imports and the checkpoint load.
+    """
+    global _pipeline
+    if _pipeline is not None:
+        return _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            start = time.perf_counter()
+            from hy3dgen.shapegen import Hunyuan3DDiTFlowMatchingPipeline
+            STARTUP_TIMINGS['imports'] = time.perf_counter() - start
+
+            # Use the absolute path to the parent folder of 'hunyuan3d-dit-v2-0'
+            model_path = f'{PROJECT_ROOT}/Hunyuan3D-2'
+            if SHARED_WEIGHTS:
+                pipeline = _load_shared_pipeline(Hunyuan3DDiTFlowMatchingPipeline, model_path)
+            else:
+                pipeline = Hunyuan3DDiTFlowMatchingPipeline.from_pretrained(model_path, subfolder=MODEL_SUBFOLDER)
+            if CPU_PROFILE and pipeline.device.type == 'cpu':
+                from hy3dgen.shapegen import apply_cpu_profile
+                # Shared weights were exported in the profile's dtypes; casting would copy them
+                apply_cpu_profile(pipeline, cast=not SHARED_WEIGHTS, compile=COMPILE)
+            if QUANTIZE:
+                pipeline.enable_quantization(QUANTIZE, cache_dir=QUANT_CACHE_DIR or None)
+            pipeline.enable_cond_cache(COND_CACHE_DIR or None)
+            pipeline.set_surface_extractor(MC_ALGO)
+            if QUERY_CACHE_MB:
+                pipeline.enable_query_cache(QUERY_CACHE_MB * 1024 ** 2)
+            STARTUP_TIMINGS.update(getattr(pipeline, 'load_timings', {}))
+            STARTUP_TIMINGS['total'] = time.perf_counter() - start
+            print("Pipeline ready: " + ", ".join(f"{k} {v:.2f}s" for k, v in STARTUP_TIMINGS.items()))
+            _pipeline = pipeline
+    return _pipeline
+
+
+def img_to_3d_batch(items, progress=None):
+    """
+    Builds several meshes in one pipeline call: the images are conditioned, denoised and
+    decoded as one batch, then every mesh is exported to static/meshes as .stl and .glb.
+    :param items: list of (img_name, name_without_ext) pairs, images in static/processed
+    :param progress: optional list of progress(stage, **info) callbacks, one per item;
+        every callback sees the events of the whole batch
+    :return: list of True/False per item (False: surface extraction failed for that image)
+    """
+    if not items:
+        return []
+    input_paths = [str(PROJECT_ROOT / 'static' / 'processed' / img_name) for img_name, _ in items]
+    callbacks = [p for p in (progress or []) if p is not None]
+
+    def fan_out(stage, **info):
+        for callback in callbacks:
+            callback(stage, **info)
+
+    call_kwargs = {k: v for k, v in PIPELINE_SETTINGS.items() if k != 'model'}
+    # output_type='mesh' returns the raw vertex/face arrays; export_mesh writes every format from them
+    meshes = get_pipeline()(image=input_paths, progress_callback=fan_out if callbacks else None,
+                            output_type='mesh', **call_kwargs)
+    fan_out('export')
+
+    from hy3dgen.shapegen import export_mesh
+    results = []
+    for (img_name, name_without_ext), mesh in zip(items, meshes):
+        if mesh is None:
+            print(f"Surface extraction failed for {img_name}")
+            results.append(False)
+            continue
+        if name_without_ext == '':
+            name_without_ext = Path(img_name).stem
+
+        # Construct output paths
+        output_glb = PROJECT_ROOT / 'static' / 'meshes' / f'{name_without_ext}.glb'
+        output_stl = PROJECT_ROOT / 'static' / 'meshes' / f'{name_without_ext}.stl'
+
+        # Create directory if it doesn't exist
+        output_glb.parent.mkdir(parents=True, exist_ok=True)
+
+        export_mesh(mesh, [output_glb, output_stl])
+        print(f"glb exported to {output_glb}")
+        print(f"stl exported to {output_stl}")
+        results.append(True)
+    return results
+
+
+def img_to_3d(img_name,name_without_ext="", progress=None):
     """
     Takes img name and pick that image from the static/processed folder
     converts it to 3d model-> .stl and .glb
     saves it at static/meshes folder
     :param img_name:
     :param name_without_ext:
+    :param progress: optional progress(stage, **info) callback (diffusion steps, decoding levels, export)
     :return:
     """
-
-    input_path = PROJECT_ROOT / 'static' / 'processed' / img_name
-    mesh = pipeline(image=str(input_path))[0]
-
-    if name_without_ext == '':
-        name_without_ext = Path(img_name).stem
-
-    # Construct output paths
-    output_glb = PROJECT_ROOT / 'static' / 'meshes' / f'{name_without_ext}.glb'
-    output_stl = PROJECT_ROOT / 'static' / 'meshes' / f'{name_without_ext}.stl'
-
-    # Create directory if it doesn't exist
-    output_glb.parent.mkdir(parents=True, exist_ok=True)
-
-    mesh.export(str(output_glb))
-    print(f"glb exported to {output_glb}")
-
-    mesh.export(str(output_stl))
-    print(f"stl exported to {output_stl}")
-
+    if not img_to_3d_batch([(img_name, name_without_ext)], progress=[progress])[0]:
+        raise RuntimeError(f"Surface extraction failed for {img_name}")
     return True
 
 
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# hy3dgen is imported from this checkout, as run_me.py and the benchmarks do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,94 @@
+import json
+import struct
+from types import SimpleNamespace
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('torch')
+
+from hy3dgen.shapegen.exporters import STL_DTYPE, export_mesh
+
+# Unit cube, outward-facing triangles
+CUBE_CORNERS = np.array([[x, y, z] for x in (0, 1) for y in (0, 1) for z in (0, 1)], dtype=np.float32)
+CUBE_FACES = np.array([
+    [0, 1, 3], [0, 3, 2], [4, 6, 7], [4, 7, 5],  # x = 0, x = 1
+    [0, 4, 5], [0, 5, 1], [2, 3, 7], [2, 7, 6],  # y = 0, y = 1
+    [0, 2, 6], [0, 6, 4], [1, 5, 7], [1, 7, 3],  # z = 0, z = 1
+])
+
+
+def soup_cube():
+    """
+    The cube as a triangle soup (every face with its own three vertices) plus a vertex no face uses,
+    in the winding surface extraction returns (export flips it).
+    """
+    vertices = np.concatenate([CUBE_CORNERS[CUBE_FACES].reshape(-1, 3), [[5, 5, 5]]]).astype(np.float32)
+    faces = np.arange(len(CUBE_FACES) * 3).reshape(-1, 3)[:, ::-1]
+    return SimpleNamespace(mesh_v=vertices, mesh_f=np.ascontiguousarray(faces))
+
+
+def area_and_volume(triangles):
+    a, b, c = triangles[:, 0].astype(np.float64), triangles[:, 1].astype(np.float64), triangles[:, 2].astype(np.float64)
+    cross = np.cross(b - a, c - a)
+    return np.linalg.norm(cross, axis=1).sum() / 2, np.einsum('ij,ij->i', a, cross).sum() / 6
+
+
+def read_stl(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    count, = struct.unpack_from('<I', data, 80)
+    return np.frombuffer(data, dtype=STL_DTYPE, offset=84, count=count)
+
+
+def read_glb(path):
+    """(vertices, faces) of the single primitive export_mesh writes."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, total = struct.unpack_from('<III', data, 0)
+    assert (magic, version, total) == (0x46546C67, 2, len(data))
+    json_length, = struct.unpack_from('<I', data, 12)
+    gltf = json.loads(data[20:20 + json_length])
+    binary = data[20 + json_length + 8:]
+    positions, indices = gltf['accessors']
+    views = gltf['bufferViews']
+    vertices = np.frombuffer(binary, dtype='<f4', count=positions['count'] * 3,
+                             offset=views[positions['bufferView']]['byteOffset']).reshape(-1, 3)
+    faces = np.frombuffer(binary, dtype='<u4', count=indices['count'],
+                          offset=views[indices['bufferView']]['byteOffset']).reshape(-1, 3)
+    return vertices, faces
+
+
+def test_round_trip_through_every_format(tmp_path):
+    glb_path, stl_path = tmp_path / 'cube.glb', tmp_path / 'cube.stl'
+    export_mesh(soup_cube(), [glb_path, stl_path])
+
+    records = read_stl(stl_path)
+    assert len(records) == 12
+    area, volume = area_and_volume(records['vertices'])
+    assert area == pytest.approx(6) and volume == pytest.approx(1)
+    # Facet normals point outwards, away from the cube's center
+    centers = records['vertices'].mean(axis=1)
+    assert (np.einsum('ij,ij->i', records['normal'], centers - 0.5) > 0).all()
+
+    vertices, faces = read_glb(glb_path)
+    # Welded as trimesh welded them: the 8 corners, without the unused vertex
+    assert len(vertices) == 8 and len(faces) == 12
+    assert sorted(map(tuple, vertices.tolist())) == sorted(map(tuple, CUBE_CORNERS.tolist()))
+    area, volume = area_and_volume(vertices[faces])
+    assert area == pytest.approx(6) and volume == pytest.approx(1)
+
+
+def test_matches_trimesh(tmp_path):
+    trimesh = pytest.importorskip('trimesh')
+    mesh_output = soup_cube()
+    export_mesh(mesh_output, [tmp_path / 'cube.glb', tmp_path / 'cube.stl'])
+    # What img_to_3d exported before the single-pass exporter
+    reference = trimesh.Trimesh(mesh_output.mesh_v, mesh_output.mesh_f[:, ::-1])
+
+    for name in ('cube.glb', 'cube.stl'):
+        loaded = trimesh.load(tmp_path / name, force='mesh')
+        assert (len(loaded.vertices), len(loaded.faces)) == (len(reference.vertices), len(reference.faces))
+        assert loaded.area == pytest.approx(reference.area)
+        assert loaded.volume == pytest.approx(reference.volume)
+        assert loaded.is_watertight
@@ -0,0 +1,150 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+np = pytest.importorskip('numpy')
+pytest.importorskip('diffusers')
+nn = torch.nn
+
+from hy3dgen.shapegen import Hunyuan3DDiTFlowMatchingPipeline
+from hy3dgen.shapegen.pipelines import guidance_active, retrieve_timesteps
+from hy3dgen.shapegen.schedulers import FlowMatchEulerDiscreteScheduler
+
+
+class Conditioner(nn.Module):
+    """Image encoder stand-in: (B, 3, 2, 2) images to {'main': (B, 1, 8)}, counting the images it encodes."""
+
+    def __init__(self):
+        super().__init__()
+        self.proj = nn.Linear(12, 8)
+        self.encoded = 0
+
+    def forward(self, image):
+        self.encoded += image.shape[0]
+        return {'main': self.proj(image.flatten(1).to(self.proj.weight.dtype)).unsqueeze(1)}
+
+    def unconditional_embedding(self, batch_size):
+        return {'main': torch.zeros(batch_size, 1, 8, dtype=self.proj.weight.dtype)}
+
+
+class DiT(nn.Module):
+    """Velocity model stand-in that depends on the conditioning, recording the batch of every call."""
+
+    def __init__(self):
+        super().__init__()
+        self.proj = nn.Linear(8, 8)
+        self.batch_sizes = []
+
+    def forward(self, x, t, cond, guidance=None):
+        self.batch_sizes.append(x.shape[0])
+        return self.proj(cond['main']) * (1 + t.view(-1, 1, 1)) - x
+
+
+class VAE(nn.Module):
+    latent_shape = (1, 8)
+    scale_factor = 1.0
+
+
+def make_pipeline(seed=0):
+    torch.manual_seed(seed)
+    return Hunyuan3DDiTFlowMatchingPipeline(
+        vae=VAE(), model=DiT(), scheduler=FlowMatchEulerDiscreteScheduler(num_train_timesteps=1000),
+        conditioner=Conditioner(), image_processor=lambda image: {'image': image},
+        device='cpu', dtype=torch.float32)
+
+
+def images(count, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    return [torch.rand(1, 3, 2, 2, generator=generator) for _ in range(count)]
+
+
+def encode(pipeline, image):
+    return pipeline.encode_cond(image, {}, do_classifier_free_guidance=False, dual_guidance=False)['main']
+
+
+# --- Conditioning cache ---
+
+def test_cond_cache_memory_hit():
+    pipeline = make_pipeline()
+    pipeline.enable_cond_cache(fingerprint='tiny')
+    seen, new = images(2)
+    first = encode(pipeline, seen)
+    assert torch.equal(encode(pipeline, seen), first)
+    assert pipeline.conditioner.encoded == 1
+
+    # In a batch, only the image not seen before goes through the conditioner
+    batch = encode(pipeline, torch.cat([seen, new]))
+    assert pipeline.conditioner.encoded == 2
+    assert torch.equal(batch[:1], first)
+
+
+def test_cond_cache_disk_hit(tmp_path):
+    image, = images(1)
+    writer = make_pipeline()
+    writer.enable_cond_cache(str(tmp_path), fingerprint='tiny')
+    expected = encode(writer, image)
+
+    # Another process with the same weights, sharing the directory
+    reader = make_pipeline()
+    reader.enable_cond_cache(str(tmp_path), fingerprint='tiny')
+    assert torch.equal(encode(reader, image), expected)
+    assert reader.conditioner.encoded == 0 and reader.cond_cache.hits == 1
+
+
+def test_cond_cache_key_changes_with_dtype():
+    pipeline = make_pipeline()
+    pipeline.enable_cond_cache(fingerprint='tiny')
+    image, = images(1)
+    inputs = {'image': image}
+    assert pipeline.cond_cache.key(inputs, torch.float32, 'cpu') != pipeline.cond_cache.key(inputs, torch.float64, 'cpu')
+
+    encode(pipeline, image)
+    pipeline.to(dtype=torch.float64)
+    assert encode(pipeline, image).dtype == torch.float64
+    assert pipeline.conditioner.encoded == 2
+
+
+# --- Guidance interval ---
+
+STEPS = 10
+GUIDANCE_SCALE = 5.0
+
+
+def sample(pipeline, batch, **kwargs):
+    return pipeline(image=batch, num_inference_steps=STEPS, guidance_scale=GUIDANCE_SCALE,
+                    generator=torch.Generator().manual_seed(0), output_type='latent', enable_pbar=False, **kwargs)
+
+
+def full_cfg_reference(pipeline, batch):
+    """The sampling loop as it was before guidance_interval: every step runs the doubled batch."""
+    image = torch.cat(batch)
+    cond = pipeline.encode_cond(image, {}, do_classifier_free_guidance=True, dual_guidance=False)
+    timesteps, _ = retrieve_timesteps(pipeline.scheduler, STEPS, 'cpu', sigmas=np.linspace(0, 1, STEPS))
+    latents = pipeline.prepare_latents(len(batch), torch.float32, 'cpu', torch.Generator().manual_seed(0))
+    for t in timesteps:
+        latent_model_input = torch.cat([latents] * 2)
+        timestep = t.expand(latent_model_input.shape[0]).to(latents.dtype) / pipeline.scheduler.config.num_train_timesteps
+        noise_pred_cond, noise_pred_uncond = pipeline.model(latent_model_input, timestep, cond).chunk(2)
+        noise_pred = noise_pred_uncond + GUIDANCE_SCALE * (noise_pred_cond - noise_pred_uncond)
+        latents = pipeline.scheduler.step(noise_pred, t, latents).prev_sample
+    return latents
+
+
+def test_guidance_interval_doubles_the_batch_only_on_guided_steps():
+    pipeline = make_pipeline()
+    batch = images(2)
+    sample(pipeline, batch, guidance_interval=(0, 0.5))
+
+    guided = [guidance_active(t, pipeline.scheduler, (0, 0.5)) for t in pipeline.scheduler.timesteps]
+    assert 0 < sum(guided) < STEPS
+    assert pipeline.model.batch_sizes == [4 if g else 2 for g in guided]
+
+
+def test_no_guidance_interval_matches_full_cfg():
+    pipeline = make_pipeline()
+    batch = images(2)
+    latents = sample(pipeline, batch)
+    assert pipeline.model.batch_sizes == [4] * STEPS
+
+    assert torch.equal(latents, full_cfg_reference(pipeline, batch))
+    # An interval covering the whole trajectory guides every step too
+    assert torch.equal(sample(pipeline, batch, guidance_interval=(0, 1)), latents)
@@ -0,0 +1,65 @@
+import pickle
+
+import pytest
+
+torch = pytest.importorskip('torch')
+nn = torch.nn
+
+from hy3dgen.shapegen import quantization
+from hy3dgen.shapegen.quantization import quantize_pipeline
+
+
+class TinyVAE(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.transformer = nn.Sequential(nn.Linear(16, 32), nn.GELU(), nn.Linear(32, 16))
+        self.geo_decoder = nn.Sequential(nn.Linear(16, 8))
+
+    def forward(self, x):
+        return self.geo_decoder(self.transformer(x))
+
+
+class TinyPipeline:
+    """The attributes quantize_pipeline touches, with a few small linears."""
+
+    def __init__(self, seed=0):
+        torch.manual_seed(seed)
+        self.device = torch.device('cpu')
+        self.dtype = torch.float32
+        self.model = nn.Sequential(nn.Linear(16, 16), nn.ReLU(), nn.Linear(16, 16))
+        self.vae = TinyVAE()
+
+    def __call__(self, x):
+        with torch.no_grad():
+            return self.vae(self.model(x))
+
+
+@pytest.mark.parametrize('mode', quantization.QUANTIZATION_MODES)
+def test_saved_weights_round_trip(mode, tmp_path, monkeypatch):
+    x = torch.randn(4, 16, generator=torch.Generator().manual_seed(1))
+    first = TinyPipeline()
+    assert quantize_pipeline(first, mode, cache_dir=str(tmp_path), fingerprint='tiny') == 4
+    assert len(list(tmp_path.glob('*.pt'))) == 1
+
+    def quantize_again(linear, mode):
+        raise AssertionError("the saved weights were not loaded")
+
+    monkeypatch.setattr(quantization, '_quantized_linear', quantize_again)
+    second = TinyPipeline()
+    assert quantize_pipeline(second, mode, cache_dir=str(tmp_path), fingerprint='tiny') == 4
+    assert torch.equal(first(x), second(x))
+
+
+@pytest.mark.parametrize('error', [pickle.UnpicklingError("unsupported global"), EOFError(), RuntimeError()])
+def test_unloadable_cache_is_a_miss(error, tmp_path, monkeypatch):
+    x = torch.randn(4, 16, generator=torch.Generator().manual_seed(1))
+    reference = TinyPipeline()
+    quantize_pipeline(reference, 'weight_only', cache_dir=str(tmp_path), fingerprint='tiny')
+
+    def load(*args, **kwargs):
+        raise error
+
+    monkeypatch.setattr(torch, 'load', load)
+    pipeline = TinyPipeline()
+    assert quantize_pipeline(pipeline, 'weight_only', cache_dir=str(tmp_path), fingerprint='tiny') == 4
+    assert torch.equal(reference(x), pipeline(x))
@@ -0,0 +1,64 @@
+import subprocess
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+import run_me
+
+
+class StandInPipeline:
+    """Records the setup get_pipeline() does, in place of the checkpoint load."""
+    loads = 0
+    device = types.SimpleNamespace(type='cuda')
+    load_timings = {'checkpoint': 1.5}
+
+    @classmethod
+    def from_pretrained(cls, model_path, subfolder=None):
+        cls.loads += 1
+        return cls()
+
+    def enable_cond_cache(self, cache_dir):
+        self.cond_cache_dir = cache_dir
+
+    def set_surface_extractor(self, name):
+        self.surface_extractor = name
+
+
+@pytest.fixture
+def stand_in_shapegen(monkeypatch):
+    StandInPipeline.loads = 0
+    shapegen = types.ModuleType('hy3dgen.shapegen')
+    shapegen.Hunyuan3DDiTFlowMatchingPipeline = StandInPipeline
+    monkeypatch.setitem(sys.modules, 'hy3dgen.shapegen', shapegen)
+    monkeypatch.setattr(run_me, '_pipeline', None)
+    monkeypatch.setattr(run_me, 'STARTUP_TIMINGS', {})
+    monkeypatch.setattr(run_me, 'SHARED_WEIGHTS', None)
+    monkeypatch.setattr(run_me, 'QUANTIZE', '')
+    monkeypatch.setattr(run_me, 'QUERY_CACHE_MB', 0)
+
+
+def test_import_does_not_load_the_pipeline():
+    # A fresh interpreter, so modules imported by other tests do not count
+    code = ("import sys, run_me; "
+            "assert run_me._pipeline is None and run_me.STARTUP_TIMINGS == {}; "
+            "loaded = [m for m in ('torch', 'diffusers', 'transformers', 'hy3dgen.shapegen') if m in sys.modules]; "
+            "assert not loaded, loaded")
+    subprocess.run([sys.executable, '-c', code], cwd=Path(run_me.__file__).parent, check=True)
+
+
+def test_first_get_pipeline_fills_startup_timings(stand_in_shapegen):
+    assert run_me.STARTUP_TIMINGS == {}
+    pipeline = run_me.get_pipeline()
+
+    assert isinstance(pipeline, StandInPipeline) and StandInPipeline.loads == 1
+    assert pipeline.surface_extractor == run_me.MC_ALGO
+    timings = run_me.STARTUP_TIMINGS
+    assert {'imports', 'checkpoint', 'total'} <= set(timings)
+    assert timings['checkpoint'] == 1.5 and timings['total'] >= timings['imports'] >= 0
+
+    # Later calls reuse the instance and leave the timings alone
+    timings = dict(timings)
+    assert run_me.get_pipeline() is pipeline
+    assert StandInPipeline.loads == 1 and run_me.STARTUP_TIMINGS == timings
@@ -0,0 +1,56 @@
+import math
+
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('diffusers')
+
+from hy3dgen.shapegen.schedulers import SCHEDULERS
+
+
+def velocity(x, t):
+    """dx/dt = -2 t x, so x(1) = x(t0) * exp(t0^2 - 1)."""
+    return -2 * t * x
+
+
+def solve(name, steps, x0=1.0):
+    """Integrates `velocity` the way the pipeline's denoising loop does; returns x(1), t0 and the evaluations."""
+    scheduler = SCHEDULERS[name]()
+    scheduler.set_timesteps(steps)
+    x = torch.full((4,), x0, dtype=torch.float32)
+    t0 = float(scheduler.timesteps[0]) / scheduler.config.num_train_timesteps
+    evaluations = 0
+    for t in scheduler.timesteps:
+        model_output = velocity(x, t / scheduler.config.num_train_timesteps)
+        evaluations += 1
+        x = scheduler.step(model_output, t, x).prev_sample
+    return x, t0, evaluations
+
+
+def error(name, steps):
+    x, t0, _ = solve(name, steps)
+    return (x - math.exp(t0 ** 2 - 1)).abs().max().item()
+
+
+@pytest.mark.parametrize('name', list(SCHEDULERS))
+def test_converges_to_the_exact_solution(name):
+    assert error(name, 50) < 1e-2
+
+
+@pytest.mark.parametrize('name, order', [('euler', 1), ('heun', 2), ('ab2', 2)])
+def test_convergence_order(name, order):
+    # Twice the intervals: the global error shrinks by 2^order
+    coarse, fine = error(name, 11), error(name, 21)
+    assert 2 ** order * 0.7 < coarse / fine < 2 ** order * 1.3
+
+
+def test_heun_evaluates_the_model_twice_per_interval():
+    _, _, evaluations = solve('heun', 11)
+    assert evaluations == 2 * 10
+
+
+@pytest.mark.parametrize('name', ['heun', 'ab2'])
+def test_second_order_beats_euler_at_equal_evaluations(name):
+    steps = 11
+    _, _, evaluations = solve(name, steps)
+    assert error(name, steps) < error('euler', evaluations) / 2
@@ -0,0 +1,91 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+torch = pytest.importorskip('torch')
+measure = pytest.importorskip('skimage.measure')
+
+from hy3dgen.shapegen.models.autoencoders.sparse_volume import SparseBrickGrid
+from hy3dgen.shapegen.models.autoencoders.surface_extractors import (ParallelMCSurfaceExtractor,
+                                                                     marching_cubes_blocks, marching_cubes_bricks)
+
+
+def random_volume(shape, seed=0):
+    """Independent values on either side of the level 0, never closer to it than 0.05."""
+    rng = np.random.default_rng(seed)
+    return (rng.uniform(0.05, 1.0, shape) * rng.choice([-1.0, 1.0], shape)).astype(np.float32)
+
+
+def checkerboard_volume(shape, seed=0):
+    """Signs alternating from point to point: every cell is an ambiguous case with an interior vertex."""
+    rng = np.random.default_rng(seed)
+    x, y, z = np.indices(shape)
+    return (rng.uniform(0.05, 1.0, shape) * np.where((x + y + z) % 2 == 0, 1.0, -1.0)).astype(np.float32)
+
+
+VOLUMES = [random_volume, checkerboard_volume]
+
+
+def vertex_ids(vertices, shape):
+    """
+    Id of each vertex, independent of the order the extraction emits them in: the grid edge it lies on,
+    or (negative) the cell holding it for the vertices Lewiner's method puts inside a cell.
+    """
+    rounded = np.round(vertices)
+    fractional = np.abs(vertices - rounded) > 1e-4
+    assert fractional.any(axis=1).all(), "test volumes keep every vertex off the grid points"
+    lower = np.where(fractional, np.floor(vertices), rounded).astype(np.int64)
+    points = np.ravel_multi_index(lower.T, shape)
+    return np.where(fractional.sum(axis=1) == 1, points * 3 + np.argmax(fractional, axis=1), -1 - points)
+
+
+def canonical_faces(faces):
+    """Faces rotated to start at their smallest id (orientation kept), in sorted order."""
+    first = np.argmin(faces, axis=1)
+    rows = np.arange(len(faces))
+    faces = np.stack([faces[rows, (first + k) % 3] for k in range(3)], axis=1)
+    return faces[np.lexsort(faces.T[::-1])]
+
+
+def assert_same_mesh(grid, mesh, mc_level=0.0):
+    """`mesh` is the whole-grid skimage mesh of `grid`, up to the order of its vertices and faces."""
+    ref_vertices, ref_faces, _, _ = measure.marching_cubes(grid, mc_level, method='lewiner')
+    vertices, faces = np.asarray(mesh[0], dtype=np.float64), np.asarray(mesh[1])
+    ref_ids, ids = vertex_ids(ref_vertices, grid.shape), vertex_ids(vertices, grid.shape)
+    assert len(np.unique(ref_ids)) == len(ref_ids)
+    assert len(ids) == len(ref_ids) and np.array_equal(np.sort(ids), np.sort(ref_ids))
+    np.testing.assert_allclose(vertices[np.argsort(ids)], ref_vertices[np.argsort(ref_ids)], atol=1e-4)
+    assert np.array_equal(canonical_faces(ids[faces]), canonical_faces(ref_ids[ref_faces]))
+
+
+@pytest.mark.parametrize('make_volume', VOLUMES)
+def test_interior_vertices_exist(make_volume):
+    # The ambiguous cases this file is about: vertices with several fractional coordinates
+    vertices, _, _, _ = measure.marching_cubes(make_volume((12, 12, 12)), 0.0, method='lewiner')
+    assert (vertex_ids(vertices, (12, 12, 12)) < 0).any()
+
+
+@pytest.mark.parametrize('make_volume', VOLUMES)
+def test_bricks_match_whole_grid(make_volume):
+    grid = make_volume((27, 27, 27))
+    bricks = SparseBrickGrid.from_dense(torch.from_numpy(grid), brick_size=8)
+    assert_same_mesh(grid, marching_cubes_bricks(bricks, 0.0))
+
+
+@pytest.mark.parametrize('make_volume', VOLUMES)
+@pytest.mark.parametrize('block_size', [4, 8, 64])
+def test_blocks_match_whole_grid(make_volume, block_size):
+    # Block seams on every axis, and a grid that is not a whole number of blocks
+    grid = make_volume((23, 19, 21))
+    assert_same_mesh(grid, marching_cubes_blocks(grid, 0.0, block_size))
+
+
+@pytest.mark.parametrize('executor', ['thread', 'process'])
+def test_parallel_extractor_matches_whole_grid(executor):
+    grid = checkerboard_volume((25, 25, 25))
+    extractor = ParallelMCSurfaceExtractor(block_size=8, workers=2, executor=executor)
+    try:
+        assert_same_mesh(grid, extractor.marching_cubes(torch.from_numpy(grid), 0.0))
+        bricks = SparseBrickGrid.from_dense(torch.from_numpy(grid), brick_size=8)
+        assert_same_mesh(grid, extractor.marching_cubes(bricks, 0.0))
+    finally:
+        extractor.close()
@@ -0,0 +1,263 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+F = torch.nn.functional
+
+from hy3dgen.shapegen.models.autoencoders import (QUERY_CACHE_BYTES, CrossAttentionDecoder,
+                                                  HierarchicalVolumeDecoding, QueryGridCache, VanillaVolumeDecoder)
+from hy3dgen.shapegen.models.autoencoders.attention_blocks import FourierEmbedder
+from hy3dgen.shapegen.models.autoencoders.query_grid import normalize_bounds
+from hy3dgen.shapegen.models.autoencoders.volume_decoders import extract_near_surface_volume_fn, item_kv
+
+
+def legacy_near_surface(input_tensor: torch.Tensor, alpha: float):
+    """extract_near_surface_volume_fn as it was before the int8 rewrite."""
+    val = input_tensor + alpha
+    valid_mask = val > -9000
+
+    def get_neighbor(t, shift, axis):
+        """t shifted by `shift` along `axis`, replicating the border."""
+        if shift == 0:
+            return t.clone()
+
+        pad_dims = [0, 0, 0, 0, 0, 0]
+
+        if axis == 0:
+            pad_idx = 0 if shift > 0 else 1
+            pad_dims[pad_idx] = abs(shift)
+        elif axis == 1:
+            pad_idx = 2 if shift > 0 else 3
+            pad_dims[pad_idx] = abs(shift)
+        elif axis == 2:
+            pad_idx = 4 if shift > 0 else 5
+            pad_dims[pad_idx] = abs(shift)
+
+        padded = F.pad(t.unsqueeze(0).unsqueeze(0), pad_dims[::-1], mode='replicate')
+
+        slice_dims = [slice(None)] * 3
+        if axis == 0:
+            if shift > 0:
+                slice_dims[0] = slice(shift, None)
+            else:
+                slice_dims[0] = slice(None, shift)
+        elif axis == 1:
+            if shift > 0:
+                slice_dims[1] = slice(shift, None)
+            else:
+                slice_dims[1] = slice(None, shift)
+        elif axis == 2:
+            if shift > 0:
+                slice_dims[2] = slice(shift, None)
+            else:
+                slice_dims[2] = slice(None, shift)
+
+        padded = padded.squeeze(0).squeeze(0)
+        sliced = padded[tuple(slice_dims)]
+        return sliced
+
+    left = get_neighbor(val, 1, axis=0)
+    right = get_neighbor(val, -1, axis=0)
+    back = get_neighbor(val, 1, axis=1)
+    front = get_neighbor(val, -1, axis=1)
+    down = get_neighbor(val, 1, axis=2)
+    up = get_neighbor(val, -1, axis=2)
+
+    def safe_where(neighbor):
+        return torch.where(neighbor > -9000, neighbor, val)
+
+    left = safe_where(left)
+    right = safe_where(right)
+    back = safe_where(back)
+    front = safe_where(front)
+    down = safe_where(down)
+    up = safe_where(up)
+
+    sign = torch.sign(val.to(torch.float32))
+    neighbors_sign = torch.stack([
+        torch.sign(left.to(torch.float32)),
+        torch.sign(right.to(torch.float32)),
+        torch.sign(back.to(torch.float32)),
+        torch.sign(front.to(torch.float32)),
+        torch.sign(down.to(torch.float32)),
+        torch.sign(up.to(torch.float32))
+    ], dim=0)
+
+    same_sign = torch.all(neighbors_sign == sign, dim=0)
+
+    mask = (~same_sign).to(torch.int32)
+    return mask * valid_mask.to(torch.int32)
+
+
+def octree_level(resolution, dtype, seed=0):
+    """Logits like an octree level's: a noisy sphere, ties at exactly 0, undecoded points and a few NaNs."""
+    generator = torch.Generator().manual_seed(seed)
+    axis = torch.linspace(-1, 1, resolution + 1)
+    x, y, z = torch.meshgrid(axis, axis, axis, indexing='ij')
+    logits = (0.6 - (x ** 2 + y ** 2 + z ** 2).sqrt()) * 20
+    logits += torch.randn(logits.shape, generator=generator) * 0.5
+    logits = torch.round(logits * 4) / 4
+    logits[logits.abs() > 3] = -10000.
+    logits[torch.rand(logits.shape, generator=generator) < 1e-3] = float('nan')
+    return logits.to(dtype)
+
+
+@pytest.mark.parametrize('dtype', [torch.float16, torch.float32])
+@pytest.mark.parametrize('alpha', [0.0, 0.25, -0.5])
+@pytest.mark.parametrize('seed', [0, 1])
+def test_near_surface_mask_matches_legacy(dtype, alpha, seed):
+    grid = octree_level(24, dtype, seed)
+    mask = extract_near_surface_volume_fn(grid, alpha)
+    assert mask.dtype == torch.int32
+    assert torch.equal(mask, legacy_near_surface(grid, alpha))
+
+
+def test_near_surface_mask_on_random_signs():
+    noise = torch.randn((17, 19, 23), generator=torch.Generator().manual_seed(0))
+    assert torch.equal(extract_near_surface_volume_fn(noise, 0.0), legacy_near_surface(noise, 0.0))
+
+
+class SphereDecoder(torch.nn.Module):
+    """
+    Geometry decoder stand-in: the logits of a sphere whose radius is the item's only latent.
+    The query embedding is the identity, so cached embeddings and per-chunk queries agree.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.query_proj = torch.nn.Linear(3, 3)
+        with torch.no_grad():
+            self.query_proj.weight.copy_(torch.eye(3))
+            self.query_proj.bias.zero_()
+
+    def precompute_kv(self, latents):
+        return latents, latents
+
+    def embed_queries(self, queries, dtype):
+        return self.query_proj(queries.to(dtype))
+
+    def forward(self, queries=None, query_embeddings=None, kv=None):
+        points = self.embed_queries(queries, queries.dtype) if query_embeddings is None else query_embeddings
+        radius = kv[0][:, :1, :1]
+        return (radius - points.norm(dim=-1, keepdim=True)) * 10
+
+
+def test_sparse_decoding_matches_dense():
+    latents = torch.tensor([0.5, 0.7]).view(2, 1, 1)
+    kwargs = dict(bounds=1.01, num_chunks=5000, mc_level=0.0, octree_resolution=127, min_resolution=31,
+                  enable_pbar=False)
+    geo_decoder = SphereDecoder()
+    dense = HierarchicalVolumeDecoding(sparse=False, query_cache=QueryGridCache())(latents, geo_decoder, **kwargs)
+    sparse = HierarchicalVolumeDecoding(sparse=True, query_cache=QueryGridCache())(latents, geo_decoder, **kwargs)
+
+    assert dense.shape == (2, 128, 128, 128) and len(sparse) == 2
+    for item in range(2):
+        grid = sparse[item].to_dense()
+        decoded = ~torch.isnan(dense[item])
+        # Refinement only decodes around the surface, and both layouts pick the same points
+        assert 0 < decoded.sum() < decoded.numel() / 2
+        assert torch.equal(~torch.isnan(grid), decoded)
+        assert torch.equal(grid[decoded], dense[item][decoded])
+
+
+def tiny_geo_decoder(downsample_ratio=1, seed=0):
+    """A randomly initialized CrossAttentionDecoder, small enough to decode whole grids in a test."""
+    torch.manual_seed(seed)
+    return CrossAttentionDecoder(num_latents=16, out_channels=1, fourier_embedder=FourierEmbedder(num_freqs=4),
+                                 width=32, heads=4, downsample_ratio=downsample_ratio).eval()
+
+
+def tiny_latents(batch_size=1, width=32, seed=0):
+    return torch.randn(batch_size, 16, width, generator=torch.Generator().manual_seed(seed))
+
+
+DENSE_KWARGS = dict(bounds=1.01, num_chunks=2000, octree_resolution=24, enable_pbar=False)
+
+
+def test_warm_query_cache_decodes_the_same_grid():
+    geo_decoder, latents = tiny_geo_decoder(), tiny_latents(2)
+    uncached = VanillaVolumeDecoder(query_cache=QueryGridCache(max_bytes=0))(latents, geo_decoder, **DENSE_KWARGS)
+
+    cache = QueryGridCache(max_bytes=64 * 1024 ** 2)
+    decoder = VanillaVolumeDecoder(query_cache=cache)
+    cold = decoder(latents, geo_decoder, **DENSE_KWARGS)
+    misses = cache.misses
+    warm = decoder(latents, geo_decoder, **DENSE_KWARGS)
+
+    assert cache.misses == misses and cache.hits > 0
+    assert torch.equal(warm, cold)
+    # Embedding the whole grid at once or chunk by chunk only differs by matmul rounding
+    torch.testing.assert_close(cold, uncached)
+
+
+def test_resize_evicts():
+    geo_decoder, latents = tiny_geo_decoder(), tiny_latents()
+    cache = QueryGridCache(max_bytes=64 * 1024 ** 2)
+    decoder = VanillaVolumeDecoder(query_cache=cache)
+    decoder(latents, geo_decoder, **DENSE_KWARGS)
+    assert cache.nbytes > 25 ** 3 * 32 * 4  # the grid's embeddings
+
+    cache.resize(0)
+    assert cache.nbytes == 0
+    misses = cache.misses
+    decoder(latents, geo_decoder, **DENSE_KWARGS)
+    assert cache.misses > misses and cache.nbytes == 0
+
+
+def test_default_budget_keeps_no_whole_grid_embeddings():
+    cache = QueryGridCache()
+    assert cache.max_bytes == QUERY_CACHE_BYTES == 16 * 1024 ** 2
+
+    # The geometry decoder's width, at the usual octree resolutions
+    geo_decoder = torch.nn.Module()
+    geo_decoder.query_proj = torch.nn.Linear(51, 1024)
+
+    def make_queries():
+        raise AssertionError("the grid's embeddings were built")
+
+    for resolution in (256, 384):
+        assert cache.embeddings(geo_decoder, ('dense', resolution), (resolution + 1) ** 3, make_queries) is None
+    # The axis tables still fit
+    cache.axes(normalize_bounds(1.01), 384, 'cpu')
+    assert 0 < cache.nbytes <= QUERY_CACHE_BYTES
+
+
+@pytest.mark.parametrize('downsample_ratio', [1, 2])
+def test_precomputed_kv_matches_per_chunk_latents(downsample_ratio):
+    geo_decoder = tiny_geo_decoder(downsample_ratio)
+    latents = tiny_latents(2, width=32 * downsample_ratio)
+    queries = torch.rand(2, 50, 3, generator=torch.Generator().manual_seed(1)) * 2 - 1
+    with torch.no_grad():
+        kv = geo_decoder.precompute_kv(latents)
+        torch.testing.assert_close(geo_decoder(queries=queries, kv=kv),
+                                   geo_decoder(queries=queries, latents=latents))
+        # One item's keys and values serve a whole batch of query chunks
+        torch.testing.assert_close(geo_decoder(queries=queries, kv=item_kv(kv, 1)),
+                                   geo_decoder(queries=queries, latents=latents[1:].expand(2, -1, -1)))
+
+
+class PerChunkLatents(torch.nn.Module):
+    """The geometry decoder before the K/V cache: every query chunk projects the latents again."""
+
+    def __init__(self, geo_decoder):
+        super().__init__()
+        self.geo_decoder = geo_decoder
+        self.query_proj = geo_decoder.query_proj
+
+    def precompute_kv(self, latents):
+        return latents, latents
+
+    def embed_queries(self, queries, dtype):
+        return self.geo_decoder.embed_queries(queries, dtype)
+
+    def forward(self, queries=None, query_embeddings=None, kv=None):
+        latents = kv[0]
+        batch = (queries if query_embeddings is None else query_embeddings).shape[0]
+        return self.geo_decoder(queries=queries, query_embeddings=query_embeddings,
+                                latents=latents.expand(batch, -1, -1))
+
+
+def test_volume_decoding_with_precomputed_kv_matches_per_chunk_latents():
+    geo_decoder, latents = tiny_geo_decoder(), tiny_latents(2)
+    decoder = VanillaVolumeDecoder(query_cache=QueryGridCache(max_bytes=0))
+    torch.testing.assert_close(decoder(latents, geo_decoder, **DENSE_KWARGS),
+                               decoder(latents, PerChunkLatents(geo_decoder), **DENSE_KWARGS))
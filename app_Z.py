@@ -1,23 +1,33 @@
 import os
-import csv
-import uuid
+import sys
+import threading
+import time
+import json
 from datetime import datetime
-from flask import Flask, render_template_string, request, jsonify, send_from_directory
-import pandas as pd
+from flask import Flask, render_template_string, request, jsonify, send_from_directory, Response, stream_with_context
 from PIL import Image, ImageOps, ImageEnhance, ImageFilter
-import os
 import google.generativeai as genai
 import base64
 import io
 import requests
-from rembg import remove, new_session
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'Hunyuan3D-2'))
+from hy3dgen.rembg import remove_background, warmup_sessions, DEFAULT_POOL_SIZE
 from api_keys import GEMINI_API_KEY
+from job_store import store, HistoryCache
+from job_notify import notify_new_job
+from job_progress import ProgressHub, FINAL_STAGES
+from task_queue import TaskQueue, QueueFull
+from result_cache import LRUDirectoryCache, content_hash, cache_key, PROCESSED_CACHE_BYTES
 
 
 # Configuration
 UPLOAD_FOLDER = 'static/uploads'
 PROCESSED_FOLDER = 'static/processed'
-CSV_FILE = 'submissions.csv'
+REMBG_MODELS = {'human': 'u2net_human_seg', 'anime': 'isnet-anime'}
+REMBG_MODEL = 'anime'  # model used by process_image_pipeline
+DEBUG = True
+BG_REM_WORKERS = DEFAULT_POOL_SIZE        # matches the size of each rembg session pool (HY3DGEN_REMBG_SESSIONS)
+MAX_PENDING_TASKS = 4 * BG_REM_WORKERS    # beyond this, uploads get 429 instead of queueing
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(PROCESSED_FOLDER, exist_ok=True) # <--- Add this
 
@@ -25,44 +35,30 @@ app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 MY_API_KEY = GEMINI_API_KEY
 
+# Processed previews are content-addressed: same image + same settings -> same file
+processed_cache = LRUDirectoryCache(PROCESSED_FOLDER, PROCESSED_CACHE_BYTES)
+
+# The 'Status Queue' panel is polled by every open page; serve it from memory
+history_cache = HistoryCache(store, limit=5)
+
+# Live build progress pushed by the workers, streamed to the page as Server-Sent Events
+progress_hub = ProgressHub()
+PROGRESS_KEEPALIVE = 15  # seconds between SSE keep-alives (and job store re-checks) on a quiet stream
+
+# Background removal runs here, off the Flask request threads
+bg_tasks = TaskQueue(max_workers=BG_REM_WORKERS, max_pending=MAX_PENDING_TASKS)
+
 # --- Backend Logic: Data Management ---
 
 def init_db():
-    """Initialize the CSV file if it doesn't exist."""
-    if not os.path.exists(CSV_FILE):
-        df = pd.DataFrame(columns=[
-            'id', 'image_filename', 'anime_name', 'email_id',
-            'build_status', 'mail_status', 'timestamp'
-        ])
-        df.to_csv(CSV_FILE, index=False)
-
-def get_next_id():
-    """Calculate the next sequential ID."""
-    try:
-        df = pd.read_csv(CSV_FILE)
-        if df.empty:
-            return 1
-        return df['id'].max() + 1
-    except:
-        return 1
+    """Initialize the job store (a fresh store imports the legacy CSV once)."""
+    store.init()
 
 def save_to_csv(filename, anime_name, email):
-    """Save the final submission to CSV."""
-    new_id = get_next_id()
-    new_row = {
-        'id': new_id,
-        'image_filename': filename,
-        'anime_name': anime_name,
-        'email_id': email,
-        'build_status': 'N',
-        'mail_status': 'N',
-        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    }
-
-    df = pd.read_csv(CSV_FILE)
-    df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-    df.to_csv(CSV_FILE, index=False)
-    return new_id
+    """Save the final submission to the job store."""
+    record_id = store.submit(filename, anime_name, email)
+    history_cache.invalidate()
+    return record_id
 
 # --- Backend Logic ---
 
@@ -74,18 +70,22 @@ def bg_rem(in_path, out_path, model="human"):
     :param model:
     :return:
     """
-    if model == "human":
-        model_name = "u2net_human_seg"
-    else:
-        model_name = "isnet-anime"
+    model_name = REMBG_MODELS['human'] if model == "human" else REMBG_MODELS['anime']
 
-    session = new_session(model_name)
     in_img = Image.open(in_path)
 
-    output = remove(in_img, session=session)
-    output.save(f"{out_path}")
+    # The session comes from a warm, process-wide pool instead of reloading the ONNX model per upload
+    output = remove_background(in_img, model_name)
+    # Write then rename, so a cache lookup never sees a half-written file
+    tmp_path = f"{out_path}.{threading.get_ident()}.tmp"
+    output.save(tmp_path, format='PNG')
+    os.replace(tmp_path, out_path)
     return True
 
+def warmup_bg_rem():
+    """Loads one rembg session per model in the background so the first upload doesn't pay for it."""
+    threading.Thread(target=warmup_sessions, args=(REMBG_MODELS.values(),), daemon=True).start()
+
 def generate_anime_image(api_key: MY_API_KEY, input_image_path, prompt):
                               # ,output_path: str = "generated_output.png"):
     """
@@ -102,8 +102,8 @@ def generate_anime_image(api_key: MY_API_KEY, input_image_path, prompt):
     return img
 
 
-def process_image_pipeline(image_path, anime_name):
-    """Runs the transformation pipeline."""
+def process_image_pipeline(image_path, anime_name, output_name=None):
+    """Runs the transformation pipeline. The result is saved as `<output_name>.png` (cache key)."""
     try:
 
         prompt = (f"make this into an anime artwork in {anime_name}'s style, "
@@ -118,7 +118,7 @@ def process_image_pipeline(image_path, anime_name):
         filename = os.path.basename(image_path)
         # Create new filename (e.g., "photo.png") - Force PNG for transparency
         name_only, _ = os.path.splitext(filename)
-        new_filename = f"{name_only}.png"
+        new_filename = f"{output_name or name_only}.png"
         # Define full path for saving
         save_path = os.path.join(PROCESSED_FOLDER, new_filename)
 
@@ -126,7 +126,10 @@ def process_image_pipeline(image_path, anime_name):
         # generate_anime_image(api_key=MY_API_KEY, input_image_path=image_path, prompt=prompt)
 
         # Step 2: Background Removal
-        bg_rem(image_path, save_path, model="anime")
+        bg_rem(image_path, save_path, model=REMBG_MODEL)
+        # Jobs not mailed yet still need their image (to build, or to name a mesh built before names were stored)
+        pending_images, _ = store.unmailed_files()
+        processed_cache.evict(protect={os.path.splitext(f)[0] for f in pending_images | {new_filename}})
 
         return new_filename
 
@@ -140,10 +143,10 @@ def process_image_pipeline(image_path, anime_name):
 @app.route('/')
 def index():
     init_db()
-    # Read CSV to show 'History' in the 3rd section
+    # Read the job store to show 'History' in the 3rd section
     try:
-        history = pd.read_csv(CSV_FILE).tail(5).sort_values(by='id', ascending=False).to_dict(orient='records')
-    except:
+        history, _, _ = history_cache.get()
+    except Exception:
         history = []
     return render_template_string(HTML_TEMPLATE, history=history)
 
@@ -159,24 +162,62 @@ def upload_and_preview():
         return jsonify({'error': 'No selected file'}), 400
 
     if file:
-        # Save Original
+        # Save Original under its content hash, so different images never overwrite each other
         # filename = f"{uuid.uuid4().hex}_{file.filename}"
-        filename = file.filename
+        data = file.read()
+        digest = content_hash(data)
+        filename = f"{digest}{os.path.splitext(file.filename)[1].lower() or '.png'}"
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-
-        # Run Pipeline
-        processed_filename = process_image_pipeline(filepath, anime_name)
-
-        if processed_filename:
+        if not os.path.exists(filepath):
+            with open(filepath, 'wb') as f:
+                f.write(data)
+
+        # Same image + same settings as an earlier upload -> serve the cached preview right away
+        processed_key = cache_key(digest, rembg_model=REMBG_MODELS[REMBG_MODEL],
+                                  anime_name=(anime_name or '').strip().lower())
+        if processed_cache.lookup(processed_key, ['.png']):
             return jsonify({
                 'status': 'success',
                 'original_file': filename,
-                'processed_file': processed_filename,
+                'processed_file': f"{processed_key}.png",
                 'anime_name': anime_name
             })
-        else:
-            return jsonify({'error': 'Processing failed'}), 500
+
+        # Run Pipeline on the background executor; the client polls /api/task/<id>
+        try:
+            task_id = bg_tasks.submit(process_image_pipeline, filepath, anime_name, processed_key,
+                                      meta={'original_file': filename, 'anime_name': anime_name})
+        except QueueFull:
+            response = jsonify({'error': 'Server is busy, please retry in a few seconds'})
+            response.headers['Retry-After'] = '5'
+            return response, 429
+
+        return jsonify({
+            'status': 'queued',
+            'task_id': task_id,
+            'original_file': filename,
+            'anime_name': anime_name
+        }), 202
+
+@app.route('/api/task/<task_id>')
+def get_task(task_id):
+    """Status of a background-removal task; carries the processed file once it is done."""
+    task = bg_tasks.get(task_id)
+    if task is None:
+        return jsonify({'error': 'Unknown task'}), 404
+
+    if task['status'] in ('queued', 'running'):
+        return jsonify({'status': task['status'], 'task_id': task_id})
+
+    if task['status'] == 'done' and task['result']:
+        return jsonify({
+            'status': 'success',
+            'task_id': task_id,
+            'original_file': task['original_file'],
+            'processed_file': task['result'],
+            'anime_name': task['anime_name']
+        })
+    return jsonify({'status': 'failed', 'task_id': task_id, 'error': task['error'] or 'Processing failed'})
 
 @app.route('/submit_final', methods=['POST'])
 def submit_final():
@@ -189,8 +230,12 @@ def submit_final():
         if not all([filename, anime_name, email]):
             return jsonify({'error': 'Missing data'}), 400
 
-        # Save to CSV
+        # Save to the job store
         record_id = save_to_csv(filename, anime_name, email)
+        # Wake the backend worker now instead of waiting for its next poll
+        notify_new_job(record_id)
+        progress_hub.publish({'id': int(record_id), 'stage': 'queued', 't': time.time(),
+                              'position': store.queue_position(record_id)})
 
         return jsonify({'status': 'success', 'id': int(record_id)})
 
@@ -205,14 +250,62 @@ def submit_final():
 def get_history():
     """API endpoint to get the latest history data for the refresh button."""
     try:
-        if os.path.exists(CSV_FILE):
-            # Read CSV to get latest updates on build_status/mail_status
-            history = pd.read_csv(CSV_FILE).tail(5).sort_values(by='id', ascending=False).to_dict(orient='records')
-            return jsonify(history)
-        return jsonify([])
+        # Latest build_status/mail_status, re-read from the job store only after a change
+        history, etag, last_modified = history_cache.get()
+        response = jsonify(history)
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        # Clients must revalidate, but an unchanged history costs them a bodyless 304
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def progress_from_store(job_id):
+    """Coarse progress event from the job store, for jobs the hub has no (recent) event for."""
+    row = store.get(job_id)
+    if row is None:
+        return None
+    if row['mail_status'] == 'Y':
+        stage = 'mailed'
+    elif row['mail_status'] == 'F':
+        stage = 'mail_failed'
+    elif row['build_status'] == 'Y':
+        stage = 'built'
+    else:
+        return {'id': job_id, 'stage': 'queued', 't': time.time(), 'position': store.queue_position(job_id)}
+    return {'id': job_id, 'stage': stage, 't': time.time()}
+
+@app.route('/api/progress/<int:job_id>')
+def job_progress(job_id):
+    """Server-Sent Events stream of one job's progress, ending once it was mailed."""
+    progress_hub.start()
+    seq, first = progress_hub.latest(job_id)
+    if first is None:
+        first = progress_from_store(job_id)
+    if first is None:
+        return jsonify({'error': 'Unknown job'}), 404
+
+    def stream(seq, event):
+        while True:
+            if event is not None:
+                yield f"data: {json.dumps(event)}\n\n"
+                if event['stage'] in FINAL_STAGES:
+                    return
+            seq, event = progress_hub.wait(job_id, seq, timeout=PROGRESS_KEEPALIVE)
+            if event is None:
+                # Quiet stream: keep the connection open and catch transitions the hub never saw
+                fallback = progress_from_store(job_id)
+                if fallback is not None and fallback['stage'] in FINAL_STAGES:
+                    event = fallback
+                else:
+                    yield ": keep-alive\n\n"
+
+    response = Response(stream_with_context(stream(seq, first)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route('/static/uploads/<filename>')
 def uploaded_file(filename):
     return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
@@ -353,6 +446,15 @@ HTML_TEMPLATE = """
                             Success! Your ID is <span id="new-id" class="font-bold"></span>. <br>
                             Your character is queued for 3D generation. Check your email.
                         </p>
+                        <div class="mt-3 w-full">
+                            <div class="w-full bg-green-100 rounded-full h-2 overflow-hidden">
+                                <div id="progress-bar" class="bg-green-500 h-2 rounded-full transition-all duration-500" style="width: 0%"></div>
+                            </div>
+                            <p class="text-xs text-green-700 mt-1">
+                                <span id="progress-stage">Queued</span>
+                                <span id="progress-eta" class="float-right"></span>
+                            </p>
+                        </div>
                     </div>
                 </div>
             </div>
@@ -360,7 +462,7 @@ HTML_TEMPLATE = """
             <div class="bg-indigo-50 rounded-lg p-4 mb-4 shadow-sm">
                 <div class="flex justify-between items-center mb-2">
                     <h3 class="font-semibold text-indigo-900">Live Queue</h3>
-                    <span class="text-xs text-indigo-500">Updates from CSV</span>
+                    <span class="text-xs text-indigo-500">Updates from job store</span>
                 </div>
                 <div class="overflow-x-auto">
                     <table class="min-w-full text-xs">
@@ -426,8 +528,8 @@ HTML_TEMPLATE = """
             icon.classList.add('fa-spin');
 
             try {
-                // Add timestamp to avoid caching
-                const response = await fetch('/api/history?t=' + new Date().getTime());
+                // Revalidate with the server's ETag; an unchanged history comes back as a 304
+                const response = await fetch('/api/history', { cache: 'no-cache' });
                 const data = await response.json();
 
                 const tbody = document.getElementById('statusTableBody');
@@ -476,7 +578,13 @@ HTML_TEMPLATE = """
                     method: 'POST',
                     body: formData
                 });
-                const result = await response.json();
+                let result = await response.json();
+
+                // Background removal runs as a task: poll until it finishes
+                if (result.status === 'queued') {
+                    btnText.textContent = "Removing background...";
+                    result = await waitForTask(result.task_id);
+                }
 
                 if (result.status === 'success') {
                     // Update View
@@ -512,11 +620,72 @@ HTML_TEMPLATE = """
             }
         });
 
+        async function waitForTask(taskId) {
+            while (true) {
+                await new Promise(resolve => setTimeout(resolve, 500));
+                const response = await fetch('/api/task/' + taskId);
+                const task = await response.json();
+                if (task.status !== 'queued' && task.status !== 'running') {
+                    return task;
+                }
+            }
+        }
+
         function regenerate() {
             // Trigger the form submit again to "regenerate"
             document.getElementById('uploadForm').requestSubmit();
         }
 
+        // Human-readable stage names for the progress events streamed by /api/progress/<id>
+        const STAGE_LABELS = {
+            queued: 'Queued',
+            started: 'Starting build',
+            diffusion: 'Generating shape',
+            volume_decoding: 'Decoding volume',
+            surface_extraction: 'Extracting surface',
+            export: 'Exporting mesh',
+            built: 'Mesh ready, sending email',
+            failed: 'Build failed, retrying',
+            mailing: 'Sending email',
+            mailed: 'Emailed!',
+            mail_failed: 'Email could not be sent'
+        };
+        let progressSource = null;
+
+        function formatEta(seconds) {
+            if (seconds === null || seconds === undefined) return '';
+            seconds = Math.round(seconds);
+            if (seconds < 60) return '~' + seconds + 's left';
+            return '~' + Math.floor(seconds / 60) + 'm ' + (seconds % 60) + 's left';
+        }
+
+        function watchProgress(jobId) {
+            if (progressSource) progressSource.close();
+            const bar = document.getElementById('progress-bar');
+            const stage = document.getElementById('progress-stage');
+            const eta = document.getElementById('progress-eta');
+            bar.style.width = '0%';
+
+            progressSource = new EventSource('/api/progress/' + jobId);
+            progressSource.onmessage = function(e) {
+                const ev = JSON.parse(e.data);
+                let label = STAGE_LABELS[ev.stage] || ev.stage;
+                if (ev.stage === 'queued' && ev.position) label += ' (' + ev.position + ' ahead)';
+                if (ev.stage === 'diffusion') label += ' ' + ev.step + '/' + ev.steps;
+                if (ev.stage === 'volume_decoding') label += ' (level ' + (ev.level + 1) + '/' + ev.levels + ')';
+                stage.textContent = label;
+                if (ev.progress !== null && ev.progress !== undefined) bar.style.width = Math.round(ev.progress * 100) + '%';
+                if (ev.stage === 'built' || ev.stage === 'mailing' || ev.stage === 'mailed') bar.style.width = '100%';
+                eta.textContent = formatEta(ev.eta);
+                if (ev.stage === 'built' || ev.stage === 'mailed') refreshStatus();
+                if (ev.stage === 'mailed' || ev.stage === 'mail_failed') {
+                    eta.textContent = '';
+                    progressSource.close();
+                    progressSource = null;
+                }
+            };
+        }
+
         async function submitFinal() {
             if(!currentData.processed_file) return;
 
@@ -531,6 +700,7 @@ HTML_TEMPLATE = """
                 if(result.status === 'success') {
                     document.getElementById('new-id').textContent = '#' + result.id;
                     document.getElementById('success-message').classList.remove('hidden');
+                    watchProgress(result.id);
                     document.getElementById('result-container').classList.add('hidden');
                     document.getElementById('placeholder-state').classList.remove('hidden');
                     document.getElementById('placeholder-state').innerHTML = '<i class="fa-solid fa-check text-green-500 text-6xl mb-4"></i><p>Submitted successfully!</p>';
@@ -555,6 +725,10 @@ HTML_TEMPLATE = """
 
 if __name__ == '__main__':
     init_db()
+    # With debug=True the reloader parent only watches files; warm up the serving process only
+    if not DEBUG or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        warmup_bg_rem()
+        progress_hub.start()
     # app.run(debug=True)
     # app.run(port=5000, debug=True)
-    app.run(host='0.0.0.0', port=8080, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=8080, debug=DEBUG)
\ No newline at end of file
@@ -0,0 +1,144 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: single process only, no cross-process locking
+    fcntl = None
+
+# --- Configuration ---
+JOURNAL_FILE = 'jobs_journal.jsonl'
+SNAPSHOT_FILE = 'jobs_snapshot.json'
+COMPACT_BYTES = 4 * 1024 ** 2  # fold the journal into the snapshot once it grows past this
+
+
+class JobJournal:
+    """
+    Append-only record of job state transitions, fsynced one line at a time.
+
+    Every entry is {"t": ..., "id": ..., "set": {column: value}} and sets
+    absolute values, so replaying an entry twice is harmless. Once the journal
+    grows past `compact_bytes` it is folded into a snapshot (written to a temp
+    file and renamed) and truncated, so a restart only replays the snapshot
+    plus the short tail written since. Several processes may append at once:
+    appends take a shared lock, compaction and replaying() an exclusive one.
+    """
+
+    def __init__(self, path=JOURNAL_FILE, snapshot_path=SNAPSHOT_FILE, compact_bytes=COMPACT_BYTES):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.compact_bytes = compact_bytes
+        self._lock = threading.Lock()
+        self._fd = None
+
+    def _open(self):
+        if self._fd is None:
+            # O_APPEND: each line lands at the current end, even after another process truncated the file
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._fd
+
+    @contextmanager
+    def _locked(self, exclusive):
+        fd = self._open()
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield fd
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    # --- Writes ---
+
+    def append(self, job_id, **fields):
+        """Durably records that row `job_id` now has `fields`. Returns once the line is on disk."""
+        line = json.dumps({'t': time.time(), 'id': int(job_id), 'set': fields}, separators=(',', ':')) + '\n'
+        with self._lock:
+            with self._locked(exclusive=False) as fd:
+                # One write() per line keeps concurrent appenders from interleaving
+                os.write(fd, line.encode())
+                os.fsync(fd)
+                size = os.fstat(fd).st_size
+        if size > self.compact_bytes:
+            self.compact()
+
+    def compact(self):
+        """Folds the journal into the snapshot and truncates it."""
+        with self._lock:
+            with self._locked(exclusive=True) as fd:
+                # Re-check under the exclusive lock: another process may have compacted already
+                if os.fstat(fd).st_size <= self.compact_bytes:
+                    return
+                state = self._load_snapshot()
+                for entry in self._read_tail():
+                    state.setdefault(entry['id'], {}).update(entry['set'])
+
+                tmp_path = f"{self.snapshot_path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'t': time.time(), 'rows': state}, f, separators=(',', ':'))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.snapshot_path)
+                # A crash before this truncate only means the tail is replayed again on top of the snapshot
+                os.ftruncate(fd, 0)
+                os.fsync(fd)
+        print(f"Compacted '{self.path}' into '{self.snapshot_path}' ({len(state)} rows).")
+
+    # --- Reads ---
+
+    def replay(self):
+        """
+        Rebuilds job state from the snapshot plus the journal tail.
+        :return: (state, tail) where state maps id -> fields and tail is the list of entries not yet compacted
+        """
+        with self._lock:
+            with self._locked(exclusive=False):
+                return self._state()
+
+    @contextmanager
+    def replaying(self):
+        """
+        replay() that keeps the journal exclusively locked until the block ends: no process can
+        append or compact while the caller applies the state, so nothing written meanwhile is overtaken.
+        """
+        with self._lock:
+            with self._locked(exclusive=True):
+                yield self._state()
+
+    def _state(self):
+        state = self._load_snapshot()
+        tail = self._read_tail()
+        for entry in tail:
+            state.setdefault(entry['id'], {}).update(entry['set'])
+        return state, tail
+
+    def _load_snapshot(self):
+        if not os.path.exists(self.snapshot_path):
+            return {}
+        with open(self.snapshot_path, encoding='utf-8') as f:
+            rows = json.load(f)['rows']
+        return {int(k): v for k, v in rows.items()}
+
+    def _read_tail(self):
+        entries = []
+        if not os.path.exists(self.path):
+            return entries
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Torn line from a crash mid-write: it was never acknowledged, drop it
+                    continue
+        for entry in entries:
+            entry['id'] = int(entry['id'])
+        return entries
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
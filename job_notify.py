@@ -0,0 +1,91 @@
+import glob
+import json
+import os
+import socket
+import time
+
+# --- Configuration ---
+NOTIFY_DIR = '.job_notify'  # one datagram socket per listening worker lives here
+
+
+class JobListener:
+    """
+    Wake-up channel for a worker: a Unix datagram socket that `notify_new_job`
+    writes to. Blocking on it costs nothing while the queue is idle, and a
+    datagram sent while the worker is busy stays buffered until the next wait().
+    """
+
+    def __init__(self, name=None, notify_dir=NOTIFY_DIR):
+        os.makedirs(notify_dir, exist_ok=True)
+        self.path = os.path.join(notify_dir, f"{name or f'worker-{os.getpid()}'}.sock")
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(self.path)
+
+    @classmethod
+    def open(cls, **kwargs):
+        """Returns a listener, or None where Unix sockets are unavailable (callers then poll)."""
+        if not hasattr(socket, 'AF_UNIX'):
+            return None
+        try:
+            return cls(**kwargs)
+        except OSError as e:
+            print(f"Job notifications unavailable ({e}), falling back to polling.")
+            return None
+
+    def wait(self, timeout=None):
+        """
+        Blocks until at least one notification arrives or `timeout` seconds pass.
+        :param timeout:
+        :return: list of received messages (empty on timeout)
+        """
+        messages = []
+        self.sock.settimeout(timeout)
+        try:
+            messages.append(self.sock.recv(4096))
+        except socket.timeout:
+            return []
+        # Drain whatever else queued up so one scan covers the whole burst
+        self.sock.setblocking(False)
+        try:
+            while True:
+                messages.append(self.sock.recv(4096))
+        except (BlockingIOError, InterruptedError):
+            pass
+        return [json.loads(m) for m in messages]
+
+    def close(self):
+        self.sock.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def notify_new_job(job_id, notify_dir=NOTIFY_DIR):
+    """Wakes every listening worker. Never raises: the timed poll is the fallback."""
+    if not hasattr(socket, 'AF_UNIX'):
+        return 0
+    payload = json.dumps({'id': int(job_id), 'sent_at': time.time()}).encode()
+    sent = 0
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    try:
+        # A busy worker stops reading, and a blocking send to its full queue would hang the request
+        sock.setblocking(False)
+        for path in glob.glob(os.path.join(notify_dir, '*.sock')):
+            try:
+                sock.sendto(payload, path)
+                sent += 1
+            except BlockingIOError:
+                # Its queue is full of unread wakeups, so it scans the queue once it is free anyway
+                sent += 1
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Worker exited without cleaning up its socket
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            except OSError as e:
+                print(f"Could not notify {path}: {e}")
+    finally:
+        sock.close()
+    return sent
@@ -0,0 +1,185 @@
+import json
+import os
+import socket
+import threading
+import time
+
+# --- Configuration ---
+# Bound by the web app, written to by workers. Kept out of NOTIFY_DIR: notify_new_job writes to every socket there
+PROGRESS_DIR = '.job_progress'
+PROGRESS_SOCKET = os.path.join(PROGRESS_DIR, 'progress.sock')
+FINAL_STAGES = ('mailed', 'mail_failed')  # a job's event stream ends here; a failed build is retried, so it is not final
+PROGRESS_TTL = 3600  # seconds a job's last event is kept; older jobs fall back to the job store
+
+# Share of the whole build each stage is assumed to take, used for the overall progress bar
+STAGE_WEIGHTS = {
+    'started': (0.0, 0.02),
+    'diffusion': (0.02, 0.70),
+    'volume_decoding': (0.70, 0.92),
+    'surface_extraction': (0.92, 0.97),
+    'export': (0.97, 1.0),
+}
+
+
+def publish_progress(job_id, stage, path=PROGRESS_SOCKET, **info):
+    """Fire-and-forget progress event for the web app. Never raises and never blocks the worker."""
+    if not hasattr(socket, 'AF_UNIX'):
+        return False
+    event = {'id': int(job_id), 'stage': stage, 't': time.time(), **info}
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    try:
+        sock.setblocking(False)
+        sock.sendto(json.dumps(event).encode(), path)
+        return True
+    except OSError:
+        # App not running, or its buffer is full: progress is best effort
+        return False
+    finally:
+        sock.close()
+
+
+class ProgressReporter:
+    """
+    Per-job progress callback for img_to_3d: reporter(stage, **info).
+
+    Adds an overall `progress` fraction and an `eta` in seconds to every event.
+    During diffusion the ETA comes from the measured step rate, plus the time
+    decoding and export took for the previous job in this worker.
+    """
+
+    # Seconds from the end of diffusion to the exported mesh, for the last job of this process
+    last_tail_seconds = None
+
+    def __init__(self, job_id, publish=publish_progress):
+        self.job_id = job_id
+        self.publish = publish
+        self.started = time.time()
+        self.diffusion_started = None
+        self.diffusion_ended = None
+
+    def __call__(self, stage, **info):
+        now = time.time()
+        progress = None
+        eta = None
+        if stage in STAGE_WEIGHTS:
+            lo, hi = STAGE_WEIGHTS[stage]
+            progress = lo
+        if stage == 'diffusion':
+            step, steps = info['step'], info['steps']
+            if self.diffusion_started is None:
+                self.diffusion_started = now
+            progress = lo + (hi - lo) * step / steps
+            if step > 0:
+                remaining = (now - self.diffusion_started) / step * (steps - step)
+                eta = remaining + (self.last_tail_seconds or 0.0)
+            if step == steps:
+                self.diffusion_ended = now
+        elif stage == 'volume_decoding':
+            # Batched builds refine one mesh after another: item k of n covers its 1/n of the stage
+            level = info.get('level', 0) / max(info.get('levels', 1), 1)
+            progress = lo + (hi - lo) * (info.get('item', 0) + level) / max(info.get('items', 1), 1)
+        elif stage == 'built':
+            progress = 1.0
+            if self.diffusion_ended is not None:
+                ProgressReporter.last_tail_seconds = now - self.diffusion_ended
+
+        if eta is None and progress is not None and self.diffusion_ended is not None and self.last_tail_seconds:
+            eta = max(0.0, self.last_tail_seconds - (now - self.diffusion_ended))
+        self.publish(self.job_id, stage, progress=progress, eta=eta, elapsed=now - self.started, **info)
+
+
+def is_progress_event(event):
+    """True for a datagram shaped like publish_progress's: a dict with an integer id, a stage name and a time."""
+    if not isinstance(event, dict):
+        return False
+    job_id, stage, t = event.get('id'), event.get('stage'), event.get('t')
+    return (isinstance(job_id, int) and not isinstance(job_id, bool) and isinstance(stage, str)
+            and isinstance(t, (int, float)) and not isinstance(t, bool))
+
+
+class ProgressHub:
+    """
+    App-side end of the channel: receives worker events on a Unix datagram
+    socket and keeps the latest event per job for the SSE endpoint.
+    Subscribers block on a condition variable, so idle streams cost nothing.
+    """
+
+    def __init__(self, path=PROGRESS_SOCKET, ttl=PROGRESS_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._events = {}  # job id -> (sequence number, event)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Binds the socket and starts the receiver thread. Returns False where Unix sockets are unavailable."""
+        with self._start_lock:
+            if self._thread is not None:
+                return True
+            if not hasattr(socket, 'AF_UNIX'):
+                return False
+            return self._bind()
+
+    def _bind(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            sock.bind(self.path)
+        except OSError as e:
+            print(f"Progress events unavailable ({e}).")
+            sock.close()
+            return False
+        self._thread = threading.Thread(target=self._receive, args=(sock,), name='progress-hub', daemon=True)
+        self._thread.start()
+        return True
+
+    def _receive(self, sock):
+        while True:
+            try:
+                event = json.loads(sock.recv(65536))
+            except (OSError, ValueError):
+                continue
+            if not is_progress_event(event):
+                # Stray datagram (e.g. a job notification): subscribers index 'stage' and _prune 't'
+                continue
+            try:
+                self.publish(event)
+            except Exception as e:
+                # One bad event must not end the receiver thread: start() never restarts it
+                print(f"Dropped progress event {event!r}: {e}")
+
+    def publish(self, event):
+        with self._cond:
+            self._seq += 1
+            self._events[int(event['id'])] = (self._seq, event)
+            self._prune()
+            self._cond.notify_all()
+
+    def latest(self, job_id):
+        """:return: (seq, event) of the newest event for `job_id`, or (0, None)"""
+        with self._cond:
+            return self._events.get(int(job_id), (0, None))
+
+    def wait(self, job_id, after_seq=0, timeout=15):
+        """
+        Blocks until job `job_id` has an event newer than `after_seq`.
+        :return: (seq, event), or (after_seq, None) on timeout
+        """
+        job_id = int(job_id)
+        with self._cond:
+            def newer():
+                entry = self._events.get(job_id)
+                return entry is not None and entry[0] > after_seq
+            if not self._cond.wait_for(newer, timeout=timeout):
+                return after_seq, None
+            return self._events[job_id]
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        stale = [k for k, (_, e) in self._events.items() if e['t'] < cutoff]
+        for k in stale:
+            del self._events[k]
@@ -0,0 +1,456 @@
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from job_journal import JobJournal
+
+# --- Configuration ---
+DB_FILE = 'submissions.db'
+CSV_FILE = 'submissions.csv'  # legacy store, seeds a fresh database
+LEASE_SECONDS = 120  # a claimed row goes back to the queue if its worker stops heartbeating this long
+
+COLUMNS = [
+    'id', 'image_filename', 'anime_name', 'email_id',
+    'build_status', 'mail_status', 'timestamp'
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id             INTEGER PRIMARY KEY AUTOINCREMENT,
+    image_filename TEXT NOT NULL,
+    anime_name     TEXT NOT NULL,
+    email_id       TEXT NOT NULL,
+    build_status   TEXT NOT NULL DEFAULT 'N',
+    mail_status    TEXT NOT NULL DEFAULT 'N',
+    timestamp      TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_submissions_build ON submissions (build_status, id);
+CREATE INDEX IF NOT EXISTS idx_submissions_mail ON submissions (mail_status, build_status, id);
+CREATE INDEX IF NOT EXISTS idx_submissions_timestamp ON submissions (timestamp);
+"""
+
+# Columns added after the first release, created on existing databases by init()
+EXTRA_COLUMNS = {
+    'submitted_at': 'REAL',  # time.time() at submit, for submit-to-start latency
+    'started_at': 'REAL',    # time.time() when a worker picked the build up
+    'worker_id': 'TEXT',     # current lease holder, NULL when the row is free
+    'lease_expires': 'REAL', # time.time() after which the lease counts as stale
+    'mesh_name': 'TEXT',     # mesh cache stem of the build, recorded with build_status = 'Y'
+}
+
+# Columns whose changes are written to the journal (leases and timings are not worth an fsync)
+JOURNALED_COLUMNS = [c for c in COLUMNS if c != 'id'] + ['submitted_at', 'mesh_name']
+
+# Statuses start at 'N' and only ever move on from it ('Y', or 'F' for a mail that cannot be sent)
+STATUS_COLUMNS = ('build_status', 'mail_status')
+
+PENDING_CONDITIONS = {
+    'build': "build_status = 'N'",
+    'mail': "mail_status = 'N' AND build_status = 'Y'",
+}
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class JobStore:
+    """
+    SQLite-backed store for submissions, shared by the Flask app and the worker.
+
+    Every operation touches a single row through the primary key or one of the
+    status indexes, so submit / claim / history stay O(log n) however long the
+    history grows. WAL mode lets the app keep reading while the worker writes.
+
+    Submissions and status transitions are also appended to a JobJournal
+    before they touch the database, and init() replays the journal (snapshot
+    and tail) into the database, so an acknowledged transition survives even
+    a database commit lost to a power cut.
+    """
+
+    def __init__(self, path=DB_FILE, legacy_csv=CSV_FILE, journal=None):
+        self.path = path
+        self.legacy_csv = legacy_csv
+        self.journal = journal
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def connect(self):
+        """Returns this thread's connection (sqlite3 connections are not shareable across threads)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def init(self):
+        """
+        Creates the schema once per process. Safe to call on every request.
+        A fresh store is seeded from the legacy CSV, if there is one.
+        """
+        if self._initialized:
+            return
+        with self._init_lock:
+            if self._initialized:
+                return
+            conn = self.connect()
+            conn.executescript(SCHEMA)
+            existing = {r['name'] for r in conn.execute('PRAGMA table_info(submissions)')}
+            for column, column_type in EXTRA_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f'ALTER TABLE submissions ADD COLUMN {column} {column_type}')
+            self._initialized = True
+            empty = conn.execute('SELECT 1 FROM submissions LIMIT 1').fetchone() is None
+            if empty and self.legacy_csv:
+                imported = self.migrate_csv(self.legacy_csv)
+                if imported:
+                    print(f"Imported {imported} row(s) from '{self.legacy_csv}' into '{self.path}'.")
+            if self.journal is not None:
+                self._replay_journal(conn)
+
+    def _replay_journal(self, conn):
+        """
+        Re-applies the journal (snapshot plus the tail since the last compaction) to the database.
+
+        Every worker replays on startup, while others keep working, so replay only moves rows
+        forward: it recreates lost rows, fills columns the database lost and advances a status
+        from 'N', but never takes one back. Re-applying an old submit entry is then harmless.
+        """
+        with self.journal.replaying() as (state, _):
+            if not state:
+                return
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # The state is the snapshot with the tail applied: the latest fields of every row
+                for job_id, fields in state.items():
+                    self._apply_entry(conn, {'id': job_id, 'set': fields})
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        print(f"Replayed the journal of {len(state)} row(s) into '{self.path}'.")
+
+    @staticmethod
+    def _apply_entry(conn, entry):
+        fields = {k: v for k, v in entry['set'].items() if k in JOURNALED_COLUMNS}
+        if not fields:
+            return
+        if 'image_filename' in fields:
+            # A submit entry: recreate the row if the database lost it
+            conn.execute(
+                f'INSERT OR IGNORE INTO submissions (id, {", ".join(fields)}) '
+                f'VALUES ({", ".join("?" * (len(fields) + 1))})',
+                [entry['id']] + list(fields.values())
+            )
+        for column, value in fields.items():
+            if column in STATUS_COLUMNS:
+                if value == 'N':
+                    continue  # the initial status: nothing to advance to
+                conn.execute(
+                    f"UPDATE submissions SET {column} = ? WHERE id = ? AND ({column} IS NULL OR {column} = 'N')",
+                    (value, entry['id'])
+                )
+            else:
+                conn.execute(f'UPDATE submissions SET {column} = COALESCE({column}, ?) WHERE id = ?',
+                             (value, entry['id']))
+
+    # --- Writes ---
+
+    def submit(self, filename, anime_name, email):
+        """Inserts a new pending submission and returns its id."""
+        self.init()
+        row = {
+            'image_filename': filename, 'anime_name': anime_name, 'email_id': email,
+            'build_status': 'N', 'mail_status': 'N',
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 'submitted_at': time.time(),
+        }
+        conn = self.connect()
+        # The write lock keeps the id picked here free until the row is inserted
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # The id AUTOINCREMENT would assign (never reusing the id of a deleted row)
+            job_id = conn.execute(
+                "SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'submissions'), 0), "
+                "COALESCE((SELECT MAX(id) FROM submissions), 0)) + 1"
+            ).fetchone()[0]
+            if self.journal is not None:
+                # Write-ahead, as in _set_fields: an acknowledged submission survives a lost commit
+                self.journal.append(job_id, **row)
+            conn.execute(
+                f'INSERT INTO submissions (id, {", ".join(row)}) VALUES ({", ".join("?" * (len(row) + 1))})',
+                [job_id] + list(row.values())
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return job_id
+
+    def mark_started(self, job_id):
+        """
+        Records when a worker started building the row.
+        :param job_id:
+        :return: submit-to-start latency in seconds, or None for rows submitted before it was tracked
+        """
+        self.init()
+        now = time.time()
+        conn = self.connect()
+        conn.execute('UPDATE submissions SET started_at = ? WHERE id = ?', (now, int(job_id)))
+        row = conn.execute('SELECT submitted_at FROM submissions WHERE id = ?', (int(job_id),)).fetchone()
+        if row is None or row['submitted_at'] is None:
+            return None
+        return now - row['submitted_at']
+
+    def set_build_status(self, job_id, status, mesh_name=None):
+        """
+        :param mesh_name: mesh cache stem of the files just built, stored with the status so the
+            mailer sends exactly those, whatever the settings or the cache look like by then
+        """
+        fields = {'build_status': status}
+        if mesh_name is not None:
+            fields['mesh_name'] = mesh_name
+        self._set_fields(job_id, **fields)
+
+    def set_mail_status(self, job_id, status):
+        self._set_fields(job_id, mail_status=status)
+
+    def _set_fields(self, job_id, **fields):
+        self.init()
+        if self.journal is not None:
+            # Write-ahead: once this returns, the transition survives a crash of the database write below
+            self.journal.append(job_id, **fields)
+        self.connect().execute(
+            f'UPDATE submissions SET {", ".join(f"{k} = ?" for k in fields)} WHERE id = ?',
+            list(fields.values()) + [int(job_id)]
+        )
+
+    # --- Leases ---
+
+    def claim(self, worker_id, lease_seconds=LEASE_SECONDS, kinds=('build', 'mail')):
+        """
+        Atomically leases the oldest row that still needs a build or a mail.
+        Rows whose lease expired (crashed or hung worker) are handed out again.
+        :param worker_id:
+        :param lease_seconds:
+        :param kinds: which pending steps to look for ('build' and/or 'mail')
+        :return: the claimed row, or None if nothing is pending
+        """
+        self.init()
+        conn = self.connect()
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers can never pick the same row
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            candidates = [
+                conn.execute(
+                    f'SELECT * FROM submissions WHERE {condition} '
+                    'AND (lease_expires IS NULL OR lease_expires < ?) ORDER BY id LIMIT 1',
+                    (now,)
+                ).fetchone()
+                for condition in (PENDING_CONDITIONS[kind] for kind in kinds)
+            ]
+            candidates = [r for r in candidates if r is not None]
+            if not candidates:
+                conn.execute('COMMIT')
+                return None
+            row = dict(min(candidates, key=lambda r: r['id']))
+            conn.execute(
+                'UPDATE submissions SET worker_id = ?, lease_expires = ? WHERE id = ?',
+                (worker_id, now + lease_seconds, row['id'])
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        if row['worker_id'] is not None:
+            print(f"Reclaimed row {row['id']} from stale lease of {row['worker_id']}")
+        row['worker_id'], row['lease_expires'] = worker_id, now + lease_seconds
+        return row
+
+    def heartbeat(self, job_id, worker_id, lease_seconds=LEASE_SECONDS):
+        """Extends the lease. Returns False if the row is no longer leased to `worker_id`."""
+        self.init()
+        cur = self.connect().execute(
+            'UPDATE submissions SET lease_expires = ? WHERE id = ? AND worker_id = ?',
+            (time.time() + lease_seconds, int(job_id), worker_id)
+        )
+        return cur.rowcount == 1
+
+    def release(self, job_id, worker_id):
+        self.init()
+        self.connect().execute(
+            'UPDATE submissions SET worker_id = NULL, lease_expires = NULL WHERE id = ? AND worker_id = ?',
+            (int(job_id), worker_id)
+        )
+
+    @contextmanager
+    def hold_lease(self, job_id, worker_id, lease_seconds=LEASE_SECONDS):
+        """Keeps the lease alive from a background thread while the body runs, then releases it."""
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(lease_seconds / 4):
+                if not self.heartbeat(job_id, worker_id, lease_seconds):
+                    print(f"WARNING: lost the lease on row {job_id}")
+                    return
+
+        thread = threading.Thread(target=beat, name=f'lease-{job_id}', daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+            self.release(job_id, worker_id)
+
+    # --- Reads ---
+
+    def get(self, job_id):
+        self.init()
+        row = self.connect().execute('SELECT * FROM submissions WHERE id = ?', (int(job_id),)).fetchone()
+        return dict(row) if row else None
+
+    def queue_position(self, job_id):
+        """Number of unbuilt rows submitted before `job_id`."""
+        self.init()
+        return self.connect().execute(
+            "SELECT COUNT(*) FROM submissions WHERE build_status = 'N' AND id < ?", (int(job_id),)
+        ).fetchone()[0]
+
+    def recent(self, limit=5):
+        """Latest submissions, newest first (what the 'Status Queue' panel shows)."""
+        self.init()
+        rows = self.connect().execute('SELECT * FROM submissions ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+        return [dict(r) for r in rows]
+
+    def unmailed_files(self):
+        """
+        Files the rows still waiting for a build or a mail depend on, to keep them out of cache eviction.
+        Mailed rows and rows whose mail failed for good ('F') are done with theirs.
+        :return: (image filenames, mesh names); mesh names only for rows built since they are recorded
+        """
+        self.init()
+        rows = self.connect().execute(
+            "SELECT image_filename, mesh_name FROM submissions WHERE mail_status = 'N'"
+        ).fetchall()
+        return ({r['image_filename'].strip() for r in rows},
+                {r['mesh_name'] for r in rows if r['mesh_name']})
+
+    def start_latency_stats(self, limit=100):
+        """Submit-to-start latency (seconds) over the last `limit` started builds."""
+        self.init()
+        rows = self.connect().execute(
+            'SELECT started_at - submitted_at AS latency FROM submissions '
+            'WHERE started_at IS NOT NULL AND submitted_at IS NOT NULL ORDER BY id DESC LIMIT ?',
+            (limit,)
+        ).fetchall()
+        latencies = sorted(r['latency'] for r in rows)
+        if not latencies:
+            return None
+        return {
+            'count': len(latencies),
+            'p50': latencies[len(latencies) // 2],
+            'p95': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            'max': latencies[-1],
+        }
+
+    # --- Migration ---
+
+    def migrate_csv(self, csv_path=CSV_FILE):
+        """
+        Imports rows from the legacy submissions.csv, keeping their ids.
+        Rows already present are left untouched, so running it twice is harmless.
+        :param csv_path:
+        :return: number of rows imported
+        """
+        self.init()
+        if not os.path.exists(csv_path):
+            return 0
+
+        with open(csv_path, mode='r', newline='', encoding='utf-8') as f:
+            rows = [
+                tuple((row.get(col) or '').strip() for col in COLUMNS)
+                for row in csv.DictReader(f)
+                if (row.get('id') or '').strip()
+            ]
+
+        conn = self.connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            before = conn.total_changes
+            conn.executemany(
+                f'INSERT OR IGNORE INTO submissions ({", ".join(COLUMNS)}) VALUES ({", ".join("?" * len(COLUMNS))})',
+                rows
+            )
+            imported = conn.total_changes - before
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return imported
+
+
+class HistoryCache:
+    """
+    In-memory copy of store.recent(limit) for the history panel and its pollers.
+
+    Serving it costs one `PRAGMA data_version` on a dedicated connection: that
+    counter only moves when some other connection (a worker, another request
+    thread) commits, and it is answered from the WAL index in shared memory,
+    without reading the database file. The rows are re-read only then, or
+    after invalidate(). The etag is a digest of the rows, so commits that do
+    not change what the panel shows (lease heartbeats) keep the same etag.
+    """
+
+    def __init__(self, store, limit=5):
+        self.store = store
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._conn = None
+        self._version = None
+        self._entry = None  # (rows, etag, last_modified)
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+
+    def get(self):
+        """
+        :return: (rows, etag, last_modified) where last_modified is the time.time() the rows last changed
+        """
+        with self._lock:
+            if self._conn is None:
+                self.store.init()
+                self._conn = sqlite3.connect(self.store.path, timeout=30, isolation_level=None,
+                                             check_same_thread=False)
+            version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+            if self._entry is not None and version == self._version:
+                return self._entry
+
+            # Only the public columns: leases and timings are worker bookkeeping
+            rows = [{c: r[c] for c in COLUMNS} for r in self.store.recent(self.limit)]
+            etag = hashlib.sha1(json.dumps(rows, sort_keys=True, default=str).encode()).hexdigest()
+            if self._entry is None or self._entry[1] != etag:
+                self._entry = (rows, etag, time.time())
+            self._version = version
+            return self._entry
+
+
+# Process-wide default store, used by app_Z.py and the backend workers.
+store = JobStore(journal=JobJournal())
+
+
+if __name__ == '__main__':
+    count = store.migrate_csv()
+    print(f"Imported {count} row(s) from '{CSV_FILE}' into '{DB_FILE}'.")
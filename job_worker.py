@@ -0,0 +1,210 @@
+import contextlib
+import os
+from pathlib import Path
+from os.path import dirname, join, abspath
+import sys
+sys.path.insert(0, join(dirname(__file__), 'Hunyuan3D-2'))
+import api_keys as a
+from job_store import store, default_worker_id
+from job_progress import ProgressReporter, publish_progress
+from mailer import Mailer, build_message, SMTP_HOST, SMTP_PORT
+from result_cache import LRUDirectoryCache, file_hash, cache_key, MESH_CACHE_BYTES
+# Cheap: the pipeline itself is built on the first job (run_me.get_pipeline)
+from run_me import img_to_3d_batch, get_pipeline, PIPELINE_SETTINGS, BATCH_SIZE  # Shows Error (Red underline) in IDE but will work fine
+
+# --- Configuration ---
+# Shared by be_server.py (one pass over the queue) and be_server_2.py (long-running workers)
+# Your Gmail account credentials
+SENDER_EMAIL = a.SENDER_EMAIL
+SENDER_PASSWORD = a.SENDER_PASSWORD  # Use an App Password, not your regular password!
+
+WORKER_ID = default_worker_id()  # lease owner name; unique per worker process
+MAIL_LEASE_SECONDS = 3600  # a row handed to the mailer stays leased until sent (or the worker dies)
+
+# Meshes are content-addressed: same processed image + same pipeline settings -> same files
+mesh_cache = LRUDirectoryCache('static/meshes', MESH_CACHE_BYTES)
+
+SUBJECT = 'Your 3D Mesh is ready!'
+BODY = 'Please find the file attached for your review.'
+
+# One persistent SMTP connection per worker process, driven by its own thread
+mailer = Mailer(SENDER_EMAIL, SENDER_PASSWORD, host=SMTP_HOST, port=SMTP_PORT)
+
+def send_email_with_attachments(file_path, RECEIVER_EMAIL, on_sent=None, on_failed=None):
+    """Queues an email with the attachment for the background mailer (Gmail SMTP server)."""
+    msg = build_message(SENDER_EMAIL, RECEIVER_EMAIL, SUBJECT, BODY, [file_path])
+    if not mailer.is_alive():
+        mailer.start()
+    mailer.submit(msg, on_sent=on_sent, on_failed=on_failed)
+
+# --- Main Logic ---
+def process_csv(worker_id=WORKER_ID, batch_size=BATCH_SIZE):
+    """
+    Drains the job store: builds pending meshes (up to `batch_size` per pipeline call) and mails them.
+    Rows are leased to `worker_id`, so any number of workers can drain the queue together.
+    """
+    updates_made = False
+
+    # Rows built earlier (or whose mail failed) go to the mailer first
+    updates_made |= queue_pending_mails(worker_id)
+
+    # 1. Lease the oldest rows that still need a build (indexed lookup, no full scan)
+    while True:
+        rows = []
+        while len(rows) < max(batch_size, 1):
+            row = store.claim(worker_id, kinds=('build',))
+            if row is None:
+                break
+            rows.append(row)
+        if not rows:
+            break
+
+        with contextlib.ExitStack() as leases:
+            for row in rows:
+                leases.enter_context(store.hold_lease(row['id'], worker_id))
+            updates_made |= process_rows(rows)
+        # The mails go out on the mailer thread while we start the next build
+        queue_pending_mails(worker_id)
+
+    if updates_made:
+        print(f"\nSuccess: job store '{store.path}' has been updated.")
+        stats = store.start_latency_stats()
+        if stats:
+            print(f"Submit-to-start latency over last {stats['count']} builds: "
+                  f"p50 {stats['p50'] * 1000:.0f} ms, p95 {stats['p95'] * 1000:.0f} ms, max {stats['max'] * 1000:.0f} ms")
+    else:
+        print("\nNo pending tasks found. No changes made to the job store.")
+
+
+def mesh_name_for(img_name):
+    """Cache key of the mesh built from static/processed/<img_name> with the current PIPELINE_SETTINGS."""
+    processed_path = f'static/processed/{img_name}'
+    if not os.path.exists(processed_path):
+        return Path(img_name).stem
+    return cache_key(file_hash(processed_path), **PIPELINE_SETTINGS)
+
+
+def queue_pending_mails(worker_id=WORKER_ID):
+    """
+    Leases every built-but-not-mailed row and queues its mail. The lease is
+    released by the mailer callbacks, so a row is never queued twice and a
+    worker crash only delays its mails until the lease expires.
+    """
+    queued = False
+    while True:
+        row = store.claim(worker_id, lease_seconds=MAIL_LEASE_SECONDS, kinds=('mail',))
+        if row is None:
+            return queued
+
+        id = row['id']
+        # The name recorded at build time; rows built before it was recorded fall back to the current settings
+        mesh_name = row['mesh_name'] or mesh_name_for(row['image_filename'].strip())
+        paths = mesh_cache.lookup(mesh_name, ['.stl'])
+        if paths is None:
+            # Never mail without the mesh: the row fails instead of coming back on every scan
+            store.set_mail_status(id, 'F')
+            store.release(id, worker_id)
+            publish_progress(id, 'mail_failed', error=f"mesh {mesh_name} is missing")
+            print(f"Mesh {mesh_name} of row {id} is missing, mail not sent.")
+            continue
+        filepath = paths[0]
+
+        def on_sent(id=id):
+            store.set_mail_status(id, 'Y')
+            store.release(id, worker_id)
+            publish_progress(id, 'mailed')
+            print(f"Mail for row {id} sent.")
+
+        def on_failed(error, permanent, id=id):
+            if permanent:
+                # A refused address or bad credentials fail the same way on every retry
+                store.set_mail_status(id, 'F')
+                store.release(id, worker_id)
+                publish_progress(id, 'mail_failed', error=str(error))
+                print(f"Mail for row {id} failed for good: {error}")
+            else:
+                # Leave mail_status at N so a later scan retries it
+                store.release(id, worker_id)
+                publish_progress(id, 'mailing', error=str(error))
+                print(f"Mail for row {id} failed: {error}")
+
+        publish_progress(id, 'mailing')
+        print("calling fns 2 : send_email_with_attachments")
+        send_email_with_attachments(filepath, row['email_id'].strip(), on_sent=on_sent, on_failed=on_failed)
+        print("fns 2 : send_email_with_attachments queued")
+        queued = True
+
+
+def process_rows(rows):
+    """
+    Runs the build step of leased rows: cache hits are reused, the rest are built
+    together in one batched pipeline call. Returns True if anything changed.
+    """
+    updates_made = False
+    to_build = {}  # mesh name -> (image name, rows needing it); identical uploads are built once
+
+    for row in rows:
+        id = row['id']
+        print("reading row no. : ",id)
+        print(row)
+
+        img_name = row['image_filename'].strip()
+        name_without_ext = mesh_name_for(img_name)
+        build_status = row['build_status'].strip()
+
+        # Condition 1: If build is N -> Run Func 1, Update Build to Y
+        # Condition 2 (build is Y AND mail is N -> mail it) is handled by queue_pending_mails
+        if build_status != 'N':
+            continue
+
+        latency = store.mark_started(id)
+        if latency is not None:
+            print(f"Submit-to-start latency for row {id}: {latency * 1000:.0f} ms")
+        # Streams diffusion steps / decoding levels to the web app (Server-Sent Events on /api/progress/<id>)
+        progress = ProgressReporter(id)
+        progress('started')
+        if mesh_cache.lookup(name_without_ext, ['.glb', '.stl']):
+            # Identical image and settings were built before: reuse the cached GLB/STL
+            print(f"Mesh cache hit for row {id}: {name_without_ext}")
+            finish_build(id, progress, name_without_ext)
+            updates_made = True
+        else:
+            to_build.setdefault(name_without_ext, (img_name, []))[1].append((id, progress))
+
+    if not to_build:
+        return updates_made
+
+    names = list(to_build)
+    reporters = [progress for name in names for _, progress in to_build[name][1]]
+    print(f"calling fns 1 on {len(names)} image(s)")
+    try:
+        results = img_to_3d_batch([(to_build[name][0], name) for name in names], progress=reporters)
+    except Exception as e:
+        for progress in reporters:
+            progress('failed', error=str(e))
+        raise
+    print("fns 1 completed")
+    # Meshes of rows that are not mailed yet must survive, whoever built them
+    mesh_cache.evict(protect=set(names) | store.unmailed_files()[1])
+
+    failed = []
+    for name, built in zip(names, results):
+        for id, progress in to_build[name][1]:
+            if built:
+                finish_build(id, progress, name)
+                updates_made = True
+            else:
+                progress('failed', error="surface extraction failed")
+                failed.append(id)
+    if failed:
+        # Built rows are already persisted; the failed ones stay at N for the next scan
+        raise RuntimeError(f"Surface extraction failed for rows {failed}")
+
+    return updates_made
+
+
+def finish_build(id, progress, mesh_name):
+    """Marks a leased row as built from the mesh `mesh_name` and tells the browser."""
+    progress('built')
+    # 2. Persist the transition right away so a crash never rebuilds a finished mesh
+    store.set_build_status(id, 'Y', mesh_name=mesh_name)
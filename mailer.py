@@ -0,0 +1,197 @@
+import os
+import queue
+import smtplib
+import threading
+import time
+from email import encoders
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+# --- Configuration ---
+SMTP_HOST = os.environ.get('SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', 587))
+
+
+def build_message(sender, receiver, subject, body, attachments=()):
+    """Creates the MIME message with every readable file in `attachments` attached."""
+    # 1. Create the email message container
+    msg = MIMEMultipart()
+    msg['From'] = sender
+    msg['To'] = receiver
+    msg['Subject'] = subject
+
+    # Attach the email body text
+    msg.attach(MIMEText(body, 'plain'))
+
+    # 2. Attach the files
+    for file_path in attachments:
+        try:
+            filename = os.path.basename(file_path)
+            file_size_mb = os.path.getsize(file_path) / (1024 * 1024)
+            print(f"Attaching {filename} (Size: {file_size_mb:.2f} MB)")
+            with open(file_path, 'rb') as attachment:
+                part = MIMEBase('application', 'octet-stream')
+                part.set_payload(attachment.read())
+
+            # Encode the file contents in Base64
+            encoders.encode_base64(part)
+            part.add_header(
+                'Content-Disposition',
+                f"attachment; filename= {filename}",
+            )
+            msg.attach(part)
+
+        except FileNotFoundError:
+            print(f"Error: File not found at {file_path}. Skipping attachment.")
+
+        except Exception as e:
+            print(f"An error occurred while attaching {file_path}: {e}")
+
+    return msg
+
+
+class Mailer(threading.Thread):
+    """
+    Background mail delivery over one persistent, authenticated SMTP connection.
+
+    Messages are queued with submit() and sent in batches by this thread, so the
+    caller (the inference loop) never waits on TLS handshakes or network I/O.
+    The connection is reused across batches, closed after `idle_timeout` seconds
+    without mail, and re-established on failure; transient errors are retried up
+    to `max_attempts` times. Point it at a local SMTP stand-in with
+    starttls=False and no password to test it.
+    """
+
+    def __init__(self, sender, password=None, host=SMTP_HOST, port=SMTP_PORT, starttls=True,
+                 batch_size=20, idle_timeout=60, max_attempts=3, timeout=60):
+        super().__init__(name='mailer', daemon=True)
+        self.sender = sender
+        self.password = password
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        self.batch_size = batch_size
+        self.idle_timeout = idle_timeout
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.queue = queue.Queue()
+        self.server = None
+        self.sent_count = 0
+        self.connect_count = 0
+
+    def submit(self, msg, on_sent=None, on_failed=None):
+        """
+        Queues `msg` for delivery.
+        :param on_sent: called with no arguments from the mailer thread after delivery
+        :param on_failed: called with (exception, permanent) once the mailer gives up on `msg`;
+            permanent is True for a refused recipient or rejected credentials, which no retry
+            can fix, and False once the attempts on a transient error are used up
+        """
+        self.queue.put((msg, on_sent, on_failed, 1))
+
+    def flush(self):
+        """Blocks until every queued message was delivered or given up on."""
+        self.queue.join()
+
+    def stop(self):
+        self.queue.put(None)
+        self.join()
+
+    # --- Mailer thread ---
+
+    def run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                self._disconnect()
+                continue
+            if item is None:
+                self.queue.task_done()
+                break
+
+            batch = [item]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    nxt = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    self.queue.task_done()
+                    stop = True
+                    break
+                batch.append(nxt)
+
+            self._send_batch(batch)
+            if stop:
+                break
+        self._disconnect()
+
+    def _connect(self):
+        print(f"Connecting to SMTP server {self.host}:{self.port}...")
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                server.starttls()
+            if self.password:
+                server.login(self.sender, self.password)
+        except Exception:
+            server.close()
+            raise
+        self.server = server
+        self.connect_count += 1
+        print("Login successful.")
+
+    def _disconnect(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except Exception:
+                self.server.close()
+            self.server = None
+            print("Connection closed.")
+
+    def _send_batch(self, batch):
+        retry = []
+        for msg, on_sent, on_failed, attempt in batch:
+            try:
+                if self.server is None:
+                    self._connect()
+                self.server.send_message(msg)
+            except (smtplib.SMTPAuthenticationError, smtplib.SMTPRecipientsRefused) as e:
+                # Permanent: retrying with the same credentials / address cannot help
+                print(f"SMTP Error occurred (not retrying): {e}")
+                if isinstance(e, smtplib.SMTPAuthenticationError):
+                    print("Authentication Error: The username or password was incorrect. Did you use an App Password?")
+                    self._disconnect()
+                self._callback(on_failed, e, True)
+            except (smtplib.SMTPException, OSError) as e:
+                print(f"SMTP Error occurred (attempt {attempt}/{self.max_attempts}): {e}")
+                self._disconnect()
+                if attempt < self.max_attempts:
+                    retry.append((msg, on_sent, on_failed, attempt + 1))
+                else:
+                    self._callback(on_failed, e, False)
+            else:
+                self.sent_count += 1
+                print(f"✅ Email successfully sent to {msg['To']}!")
+                self._callback(on_sent)
+
+        if retry:
+            # Back off before the next connection attempt, then requeue ahead of task_done
+            time.sleep(2 ** retry[0][3])
+            for item in retry:
+                self.queue.put(item)
+        for _ in batch:
+            self.queue.task_done()
+
+    @staticmethod
+    def _callback(fn, *args):
+        if fn is None:
+            return
+        try:
+            fn(*args)
+        except Exception as e:
+            print(f"Mail callback failed: {e}")
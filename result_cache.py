@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# --- Configuration ---
+PROCESSED_CACHE_BYTES = 2 * 1024 ** 3   # static/processed
+MESH_CACHE_BYTES = 10 * 1024 ** 3       # static/meshes (GLB + STL pairs)
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(path, chunk_size=1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_key(digest, **params) -> str:
+    """
+    File stem for a cached result: content hash plus a digest of everything that changes the output.
+    :param digest: content_hash / file_hash of the input
+    :param params: e.g. rembg model, anime style, pipeline settings
+    :return:
+    """
+    params_digest = content_hash(json.dumps(params, sort_keys=True, default=str).encode())
+    return f"{digest[:32]}_{params_digest[:12]}"
+
+
+class LRUDirectoryCache:
+    """
+    Size-bounded LRU over the files of one directory.
+
+    Entries are grouped by file stem (a mesh's .glb and .stl are one entry) and
+    recency is the newest mtime in the group: hits are touched, eviction removes
+    the least recently used groups until the directory fits in `max_bytes`.
+    """
+
+    def __init__(self, folder, max_bytes):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def path(self, stem, ext):
+        return os.path.join(self.folder, f"{stem}{ext}")
+
+    def lookup(self, stem, exts):
+        """Returns the paths for `stem` if every extension in `exts` is cached (and marks it used), else None."""
+        paths = [self.path(stem, ext) for ext in exts]
+        if not all(os.path.exists(p) for p in paths):
+            return None
+        now = time.time()
+        for p in paths:
+            try:
+                os.utime(p, (now, now))
+            except OSError:
+                return None  # evicted under our feet
+        return paths
+
+    def evict(self, protect=()):
+        """
+        Deletes least recently used entries until the folder fits in `max_bytes`.
+        :param protect: stems that must survive (e.g. the result being served right now)
+        :return: number of bytes freed
+        """
+        with self._lock:
+            groups = {}
+            total = 0
+            with os.scandir(self.folder) as it:
+                for entry in it:
+                    if not entry.is_file():
+                        continue
+                    st = entry.stat()
+                    stem = os.path.splitext(entry.name)[0]
+                    size, mtime, paths = groups.get(stem, (0, 0.0, []))
+                    groups[stem] = (size + st.st_size, max(mtime, st.st_mtime), paths + [entry.path])
+                    total += st.st_size
+
+            freed = 0
+            for stem, (size, _, paths) in sorted(groups.items(), key=lambda kv: kv[1][1]):
+                if total - freed <= self.max_bytes:
+                    break
+                if stem in protect:
+                    continue
+                for p in paths:
+                    try:
+                        os.remove(p)
+                    except OSError:
+                        pass
+                freed += size
+            if freed:
+                print(f"Cache {self.folder}: evicted {freed / 1024 ** 2:.1f} MB")
+            return freed
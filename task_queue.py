@@ -0,0 +1,74 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFull(Exception):
+    """Raised by TaskQueue.submit when the admission limit is reached."""
+
+
+class TaskQueue:
+    """
+    Bounded executor for request-side work (background removal) with a task registry.
+
+    At most `max_pending` tasks may be queued or running at once; beyond that,
+    submit() raises QueueFull so the caller can answer 429 instead of piling up
+    threads. Finished tasks are kept for `ttl` seconds so clients can fetch them.
+    """
+
+    def __init__(self, max_workers, max_pending, ttl=3600):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='task')
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._tasks = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, meta=None, **kwargs):
+        """
+        Queues fn(*args, **kwargs).
+        :param meta: extra fields echoed back by get()
+        :return: task id
+        """
+        if not self._slots.acquire(blocking=False):
+            raise QueueFull(f"{self.max_pending} tasks already pending")
+
+        task_id = uuid.uuid4().hex
+        task = {'id': task_id, 'status': 'queued', 'result': None, 'error': None,
+                'created': time.time(), 'finished': None, **(meta or {})}
+        with self._lock:
+            self._prune()
+            self._tasks[task_id] = task
+
+        def run():
+            task['status'] = 'running'
+            try:
+                task['result'] = fn(*args, **kwargs)
+                task['status'] = 'done'
+            except Exception as e:
+                task['error'] = str(e)
+                task['status'] = 'failed'
+            finally:
+                task['finished'] = time.time()
+                self._slots.release()
+
+        try:
+            self.executor.submit(run)
+        except Exception:
+            self._slots.release()
+            with self._lock:
+                self._tasks.pop(task_id, None)
+            raise
+        return task_id
+
+    def get(self, task_id):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            return dict(task) if task else None
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        expired = [k for k, t in self._tasks.items() if t['finished'] is not None and t['finished'] < cutoff]
+        for k in expired:
+            del self._tasks[k]
@@ -0,0 +1,134 @@
+import io
+import os
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('flask')
+pytest.importorskip('PIL')
+pytest.importorskip('google.generativeai')
+pytest.importorskip('rembg')
+
+from job_store import HistoryCache, JobStore
+from result_cache import LRUDirectoryCache
+from task_queue import TaskQueue
+
+
+@pytest.fixture
+def app_Z(tmp_path, monkeypatch):
+    """The app on a scratch job store and scratch folders, with one background-removal slot."""
+    monkeypatch.chdir(tmp_path)
+    import app_Z
+
+    store = JobStore(str(tmp_path / 'submissions.db'), legacy_csv=None)
+    (tmp_path / 'uploads').mkdir()
+    monkeypatch.setattr(app_Z, 'store', store)
+    monkeypatch.setattr(app_Z, 'history_cache', HistoryCache(store, limit=5))
+    monkeypatch.setattr(app_Z, 'PROCESSED_FOLDER', str(tmp_path / 'processed'))
+    monkeypatch.setattr(app_Z, 'processed_cache', LRUDirectoryCache(str(tmp_path / 'processed'), 1024 ** 2))
+    monkeypatch.setattr(app_Z, 'bg_tasks', TaskQueue(max_workers=1, max_pending=1))
+    monkeypatch.setitem(app_Z.app.config, 'UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+    return app_Z
+
+
+@pytest.fixture
+def client(app_Z):
+    return app_Z.app.test_client()
+
+
+@pytest.fixture
+def pipeline(app_Z, monkeypatch):
+    """process_image_pipeline without rembg: writes the preview once `release` is set."""
+    calls = []
+    release = threading.Event()
+
+    def process(image_path, anime_name, output_name=None):
+        calls.append(image_path)
+        release.wait(5)
+        with open(os.path.join(app_Z.PROCESSED_FOLDER, f'{output_name}.png'), 'wb') as f:
+            f.write(b'preview')
+        return f'{output_name}.png'
+
+    monkeypatch.setattr(app_Z, 'process_image_pipeline', process)
+    yield calls, release
+    release.set()
+
+
+def upload(client, data):
+    return client.post('/upload_and_preview', content_type='multipart/form-data',
+                       data={'image': (io.BytesIO(data), 'photo.png'), 'anime_name': 'Naruto'})
+
+
+def wait_for_task(client, task_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        body = client.get(f'/api/task/{task_id}').get_json()
+        if body['status'] not in ('queued', 'running'):
+            return body
+        time.sleep(0.01)
+    raise AssertionError(f"task {task_id} did not finish")
+
+
+def test_full_queue_answers_429(client, pipeline):
+    calls, release = pipeline
+    first = upload(client, b'first image')
+    assert first.status_code == 202
+
+    response = upload(client, b'second image')
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '5'
+    assert len(calls) == 1
+
+    # The slot frees up once the running task is done
+    release.set()
+    wait_for_task(client, first.get_json()['task_id'])
+    deadline = time.monotonic() + 5
+    while (response := upload(client, b'second image')).status_code == 429 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert response.status_code == 202
+
+
+def test_repeated_upload_is_served_from_the_cache(client, pipeline):
+    calls, release = pipeline
+    release.set()
+    queued = upload(client, b'same image')
+    assert queued.status_code == 202
+    done = wait_for_task(client, queued.get_json()['task_id'])
+    assert done['status'] == 'success'
+
+    again = upload(client, b'same image')
+    assert again.status_code == 200
+    assert again.get_json()['status'] == 'success'
+    assert again.get_json()['processed_file'] == done['processed_file']
+    assert len(calls) == 1
+
+
+def test_history_revalidates_with_etag(client):
+    response = client.get('/api/history')
+    assert response.status_code == 200 and response.get_json() == []
+    etag = response.headers['ETag']
+
+    unchanged = client.get('/api/history', headers={'If-None-Match': etag})
+    assert unchanged.status_code == 304 and unchanged.data == b''
+
+    submitted = client.post('/submit_final', json={'processed_file': 'a.png', 'anime_name': 'Naruto',
+                                                   'email': 'a@example.com'})
+    assert submitted.status_code == 200
+    changed = client.get('/api/history', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+    assert [row['image_filename'] for row in changed.get_json()] == ['a.png']
+
+
+def test_history_sees_commits_of_other_connections(app_Z, client):
+    job_id = app_Z.store.submit('a.png', 'Naruto', 'a@example.com')
+    etag = client.get('/api/history').headers['ETag']
+
+    # A worker process commits through its own connection; nothing invalidates the cache,
+    # PRAGMA data_version moves on its own
+    worker = JobStore(app_Z.store.path, legacy_csv=None)
+    worker.set_build_status(job_id, 'Y', mesh_name='abc_123')
+
+    changed = client.get('/api/history', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+    assert changed.get_json()[0]['build_status'] == 'Y'
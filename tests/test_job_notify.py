@@ -0,0 +1,40 @@
+import socket
+import threading
+
+import pytest
+
+from job_notify import JobListener, notify_new_job
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason="needs Unix sockets")
+
+
+@pytest.fixture
+def listener(tmp_path):
+    listener = JobListener(name='worker-0', notify_dir=str(tmp_path))
+    yield listener
+    listener.close()
+
+
+def test_notifies_every_listener(tmp_path, listener):
+    other = JobListener(name='worker-1', notify_dir=str(tmp_path))
+    try:
+        assert notify_new_job(3, notify_dir=str(tmp_path)) == 2
+        assert [m['id'] for m in listener.wait(timeout=5)] == [3]
+        assert [m['id'] for m in other.wait(timeout=5)] == [3]
+    finally:
+        other.close()
+
+
+def test_busy_worker_does_not_block_submissions(tmp_path, listener):
+    # The worker is building and never reads: its queue fills up after a few wakeups
+    results = []
+    sender = threading.Thread(
+        target=lambda: results.extend(notify_new_job(n, notify_dir=str(tmp_path)) for n in range(100)),
+        daemon=True)
+    sender.start()
+    sender.join(timeout=5)
+
+    assert not sender.is_alive(), "notify_new_job blocked on a full socket"
+    assert results == [1] * 100
+    # Once free, the worker wakes on what did get queued
+    assert listener.wait(timeout=5)
@@ -0,0 +1,55 @@
+import json
+import socket
+
+import pytest
+
+from job_notify import JobListener, notify_new_job
+from job_progress import ProgressHub, is_progress_event, publish_progress
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason="needs Unix sockets")
+
+
+@pytest.fixture
+def hub(tmp_path, monkeypatch):
+    # Default (relative) socket paths, as the app and the workers use them
+    monkeypatch.chdir(tmp_path)
+    hub = ProgressHub()
+    assert hub.start()
+    return hub
+
+
+def test_job_notification_does_not_reach_the_hub(hub):
+    listener = JobListener(name='worker-0')
+    try:
+        # What app_Z does on submit, while the hub is running
+        assert notify_new_job(7) == 1
+        assert [m['id'] for m in listener.wait(timeout=5)] == [7]
+    finally:
+        listener.close()
+
+    assert publish_progress(7, 'started', progress=0.0)
+    seq, event = hub.wait(7, timeout=5)
+    assert event['stage'] == 'started'
+    assert hub._thread.is_alive()
+
+
+def test_malformed_datagrams_are_dropped(hub):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    try:
+        for payload in [b'not json', b'[1, 2]', json.dumps({'id': 3, 'sent_at': 0.0}).encode(),
+                        json.dumps({'id': 'x', 'stage': 'started', 't': 0.0}).encode()]:
+            sock.sendto(payload, hub.path)
+    finally:
+        sock.close()
+
+    assert publish_progress(3, 'diffusion', step=1, steps=10)
+    seq, event = hub.wait(3, timeout=5)
+    assert event['stage'] == 'diffusion'
+    assert hub._thread.is_alive()
+
+
+def test_is_progress_event():
+    assert is_progress_event({'id': 1, 'stage': 'export', 't': 1.5})
+    assert not is_progress_event({'id': 1, 'sent_at': 1.5})
+    assert not is_progress_event({'id': True, 'stage': 'export', 't': 1.5})
+    assert not is_progress_event(['id', 'stage', 't'])
@@ -0,0 +1,159 @@
+import threading
+import time
+
+import pytest
+
+from job_journal import JobJournal
+from job_store import JobStore
+from result_cache import LRUDirectoryCache
+
+
+@pytest.fixture
+def store(tmp_path):
+    journal = JobJournal(str(tmp_path / 'journal.jsonl'), str(tmp_path / 'snapshot.json'))
+    yield JobStore(str(tmp_path / 'submissions.db'), legacy_csv=None, journal=journal)
+    journal.close()
+
+
+def test_mesh_name_is_recorded_with_the_build(store):
+    job_id = store.submit('a.png', 'Naruto', 'a@example.com')
+    store.set_build_status(job_id, 'Y', mesh_name='abc_123')
+    row = store.get(job_id)
+    assert (row['build_status'], row['mesh_name']) == ('Y', 'abc_123')
+
+
+def test_unmailed_files(store):
+    pending = store.submit('pending.png', 'Naruto', 'a@example.com')
+    built = store.submit('built.png', 'Naruto', 'b@example.com')
+    mailed = store.submit('mailed.png', 'Naruto', 'c@example.com')
+    store.set_build_status(built, 'Y', mesh_name='built_mesh')
+    store.set_build_status(mailed, 'Y', mesh_name='mailed_mesh')
+    store.set_mail_status(mailed, 'Y')
+
+    images, meshes = store.unmailed_files()
+    assert images == {'pending.png', 'built.png'}
+    assert meshes == {'built_mesh'}
+    assert store.get(pending)['mesh_name'] is None
+
+
+def test_failed_mail_releases_its_files(store, tmp_path):
+    meshes = LRUDirectoryCache(str(tmp_path / 'meshes'), max_bytes=0)
+    for name in ['waiting', 'refused']:
+        job_id = store.submit(f'{name}.png', 'Naruto', f'{name}@example.com')
+        store.set_build_status(job_id, 'Y', mesh_name=f'{name}_mesh')
+        (tmp_path / 'meshes' / f'{name}_mesh.stl').write_bytes(b'solid')
+    store.set_mail_status(job_id, 'F')
+
+    images, protected = store.unmailed_files()
+    assert images == {'waiting.png'} and protected == {'waiting_mesh'}
+    meshes.evict(protect=protected)
+    assert sorted(p.name for p in (tmp_path / 'meshes').iterdir()) == ['waiting_mesh.stl']
+
+
+def reopen(store):
+    return JobStore(store.path, legacy_csv=None, journal=store.journal)
+
+
+def test_replay_never_takes_a_status_back(store):
+    job_id = store.submit('a.png', 'Naruto', 'a@example.com')
+    store.set_build_status(job_id, 'Y', mesh_name='abc_123')
+    store.set_mail_status(job_id, 'Y')
+
+    # Another worker starting up replays the whole tail, submit entry included
+    row = reopen(store).get(job_id)
+    assert (row['build_status'], row['mail_status'], row['mesh_name']) == ('Y', 'Y', 'abc_123')
+
+
+def test_replay_restores_transitions_the_database_lost(store):
+    job_id = store.submit('a.png', 'Naruto', 'a@example.com')
+    store.set_build_status(job_id, 'Y', mesh_name='abc_123')
+    # The database write after the journal append never made it to disk
+    store.connect().execute("UPDATE submissions SET build_status = 'N', mesh_name = NULL WHERE id = ?", (job_id,))
+
+    row = reopen(store).get(job_id)
+    assert (row['build_status'], row['mail_status'], row['mesh_name']) == ('Y', 'N', 'abc_123')
+
+
+def test_replay_recreates_lost_rows(store, tmp_path):
+    job_id = store.submit('a.png', 'Naruto', 'a@example.com')
+    store.set_build_status(job_id, 'Y', mesh_name='abc_123')
+
+    row = JobStore(str(tmp_path / 'fresh.db'), legacy_csv=None, journal=store.journal).get(job_id)
+    assert (row['image_filename'], row['build_status'], row['mesh_name']) == ('a.png', 'Y', 'abc_123')
+
+
+def test_replay_recreates_rows_only_in_the_snapshot(store, tmp_path):
+    job_id = store.submit('a.png', 'Naruto', 'a@example.com')
+    store.set_build_status(job_id, 'Y', mesh_name='abc_123')
+    store.journal.compact_bytes = 0
+    store.journal.compact()
+    assert store.journal.replay()[1] == []
+
+    row = JobStore(str(tmp_path / 'fresh.db'), legacy_csv=None, journal=store.journal).get(job_id)
+    assert (row['image_filename'], row['build_status'], row['mesh_name']) == ('a.png', 'Y', 'abc_123')
+
+
+def test_submission_is_journaled_before_the_insert(store, monkeypatch):
+    store.submit('a.png', 'Naruto', 'a@example.com')
+
+    def crash(job_id, **fields):
+        # The insert has not happened when the journal is written
+        assert store.get(job_id) is None
+        raise OSError("disk full")
+
+    monkeypatch.setattr(store.journal, 'append', crash)
+    with pytest.raises(OSError):
+        store.submit('b.png', 'Naruto', 'b@example.com')
+    # A submission the journal could not record is not acknowledged, nor left in the database
+    assert [r['image_filename'] for r in store.recent()] == ['a.png']
+    monkeypatch.undo()
+    assert store.submit('c.png', 'Naruto', 'c@example.com') == 2
+
+
+def test_concurrent_claims_never_share_a_row(store):
+    ids = {store.submit(f'{n}.png', 'Naruto', f'{n}@example.com') for n in range(40)}
+    # One JobStore per worker process, each claiming from several threads
+    workers = [JobStore(store.path, legacy_csv=None) for _ in range(4)]
+    claimed = []
+    start = threading.Barrier(8)
+
+    def drain(worker, worker_id):
+        start.wait()
+        while True:
+            row = worker.claim(worker_id, kinds=('build',))
+            if row is None:
+                return
+            claimed.append(row['id'])
+
+    threads = [threading.Thread(target=drain, args=(workers[n % 4], f'worker-{n}')) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(claimed) == sorted(ids)
+
+
+def test_expired_lease_is_reclaimed(store):
+    job_id = store.submit('a.png', 'Naruto', 'a@example.com')
+    assert store.claim('worker-a', lease_seconds=0.1)['id'] == job_id
+    assert store.claim('worker-b') is None
+
+    # worker-a stops heartbeating (crashed or hung) and its lease runs out
+    time.sleep(0.2)
+    row = store.claim('worker-b')
+    assert (row['id'], row['worker_id']) == (job_id, 'worker-b')
+    # The stale holder finds out on its next heartbeat, and cannot release the new lease
+    assert not store.heartbeat(job_id, 'worker-a')
+    store.release(job_id, 'worker-a')
+    assert store.get(job_id)['worker_id'] == 'worker-b'
+
+
+def test_heartbeat_keeps_the_lease(store):
+    job_id = store.submit('a.png', 'Naruto', 'a@example.com')
+    store.claim('worker-a', lease_seconds=0.2)
+    with store.hold_lease(job_id, 'worker-a', lease_seconds=0.2):
+        time.sleep(0.5)
+        assert store.claim('worker-b') is None
+    # Released once the body is done
+    assert store.claim('worker-b')['id'] == job_id
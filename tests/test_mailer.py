@@ -0,0 +1,250 @@
+import socketserver
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import mailer as mailer_module
+from mailer import Mailer, build_message
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """
+    Just enough of an SMTP server for smtplib (no TLS, no auth), with faults to inject:
+    `drop_data` connections are cut while a message is being sent, `close_after_message`
+    hangs up after each delivered message (as a server closing an idle connection does),
+    and `refuse` answers 550 to every recipient.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.messages = []
+        self.connections = 0
+        self.drop_data = 0
+        self.close_after_message = False
+        self.refuse = False
+        self._lock = threading.Lock()
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        with server._lock:
+            server.connections += 1
+        self.reply('220 localhost stand-in ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.split(b' ', 1)[0].strip().upper()
+            if command == b'EHLO':
+                self.reply('250-localhost')
+                self.reply('250 OK')
+            elif command in (b'HELO', b'MAIL', b'RSET', b'NOOP'):
+                self.reply('250 OK')
+            elif command == b'RCPT':
+                self.reply('550 No such user' if server.refuse else '250 OK')
+            elif command == b'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                for line in iter(self.rfile.readline, b''):
+                    if line == b'.\r\n':
+                        break
+                    data.append(line)
+                with server._lock:
+                    drop = server.drop_data > 0
+                    server.drop_data -= drop
+                if drop:
+                    return
+                with server._lock:
+                    server.messages.append(b''.join(data))
+                self.reply('250 OK queued')
+                if server.close_after_message:
+                    return
+            elif command == b'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('500 Unknown command')
+
+
+@pytest.fixture
+def smtp_server():
+    server = SMTPStandIn()
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    # Record the retry backoff instead of waiting for it
+    sleeps = []
+    monkeypatch.setattr(mailer_module, 'time', SimpleNamespace(sleep=sleeps.append))
+    return sleeps
+
+
+@pytest.fixture
+def make_mailer(smtp_server):
+    mailers = []
+
+    def make(**kwargs):
+        mailer = Mailer('sender@example.com', host='127.0.0.1', port=smtp_server.server_address[1],
+                        starttls=False, timeout=5, **kwargs)
+        mailer.start()
+        mailers.append(mailer)
+        return mailer
+
+    yield make
+    for mailer in mailers:
+        mailer.stop()
+
+
+class Callbacks:
+    def __init__(self):
+        self.sent = []
+        self.failed = []
+
+    def submit(self, mailer, n):
+        msg = build_message('sender@example.com', f'user{n}@example.com', 'Your 3D Mesh is ready!', f'mail {n}')
+        mailer.submit(msg, on_sent=lambda: self.sent.append(n), on_failed=lambda e, permanent: self.failed.append((n, e, permanent)))
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_batch_shares_one_connection(smtp_server, make_mailer):
+    mailer = make_mailer()
+    callbacks = Callbacks()
+    for n in range(5):
+        callbacks.submit(mailer, n)
+    mailer.flush()
+
+    assert sorted(callbacks.sent) == list(range(5)) and callbacks.failed == []
+    assert len(smtp_server.messages) == 5
+    assert mailer.connect_count == smtp_server.connections == 1
+
+
+def test_dropped_connection_is_retried_after_backoff(smtp_server, make_mailer, sleeps):
+    smtp_server.drop_data = 1
+    mailer = make_mailer()
+    callbacks = Callbacks()
+    callbacks.submit(mailer, 0)
+    mailer.flush()
+
+    assert callbacks.sent == [0] and callbacks.failed == []
+    assert sleeps == [4]  # 2 ** attempt, before the second attempt
+    assert mailer.connect_count == 2
+    assert len(smtp_server.messages) == 1
+
+
+def test_reconnects_after_the_server_closed_an_idle_connection(smtp_server, make_mailer, sleeps):
+    smtp_server.close_after_message = True
+    mailer = make_mailer()
+    callbacks = Callbacks()
+    callbacks.submit(mailer, 0)
+    mailer.flush()
+    # The mailer still holds the connection the server hung up on
+    callbacks.submit(mailer, 1)
+    mailer.flush()
+
+    assert callbacks.sent == [0, 1] and callbacks.failed == []
+    assert mailer.connect_count == 2
+    assert len(smtp_server.messages) == 2
+
+
+def test_idle_connection_is_closed_and_reopened(smtp_server, make_mailer):
+    mailer = make_mailer(idle_timeout=0.1)
+    callbacks = Callbacks()
+    callbacks.submit(mailer, 0)
+    mailer.flush()
+    assert wait_for(lambda: mailer.server is None)
+
+    callbacks.submit(mailer, 1)
+    mailer.flush()
+    assert callbacks.sent == [0, 1]
+    assert mailer.connect_count == smtp_server.connections == 2
+
+
+def test_on_failed_once_attempts_are_used_up(smtp_server, make_mailer, sleeps):
+    smtp_server.drop_data = 10
+    mailer = make_mailer(max_attempts=3)
+    callbacks = Callbacks()
+    callbacks.submit(mailer, 0)
+    mailer.flush()
+
+    assert callbacks.sent == []
+    assert [(n, permanent) for n, _, permanent in callbacks.failed] == [(0, False)]
+    assert sleeps == [4, 8]
+    assert smtp_server.messages == []
+
+
+def test_refused_recipient_is_not_retried(smtp_server, make_mailer, sleeps):
+    smtp_server.refuse = True
+    mailer = make_mailer()
+    callbacks = Callbacks()
+    callbacks.submit(mailer, 0)
+    mailer.flush()
+
+    assert callbacks.sent == [] and len(callbacks.failed) == 1
+    assert callbacks.failed[0][2] is True
+    assert sleeps == []
+
+
+@pytest.fixture
+def worker(tmp_path, monkeypatch, make_mailer, sleeps):
+    """job_worker on a scratch store and mesh cache, mailing through the stand-in server."""
+    monkeypatch.chdir(tmp_path)
+    import job_worker
+    from job_store import JobStore
+    from result_cache import LRUDirectoryCache
+
+    meshes = LRUDirectoryCache(str(tmp_path / 'meshes'), 1024 ** 2)
+    (tmp_path / 'meshes' / 'abc_123.stl').write_bytes(b'solid mesh')
+    monkeypatch.setattr(job_worker, 'store', JobStore(str(tmp_path / 'submissions.db'), legacy_csv=None))
+    monkeypatch.setattr(job_worker, 'mesh_cache', meshes)
+    monkeypatch.setattr(job_worker, 'mailer', make_mailer(max_attempts=1))
+    return job_worker
+
+
+def mail_built_row(worker):
+    job_id = worker.store.submit('a.png', 'Naruto', 'nobody@example.com')
+    worker.store.set_build_status(job_id, 'Y', mesh_name='abc_123')
+    assert worker.queue_pending_mails('worker-0')
+    worker.mailer.flush()
+    return worker.store.get(job_id)
+
+
+def test_refused_recipient_fails_the_row(smtp_server, worker):
+    smtp_server.refuse = True
+    row = mail_built_row(worker)
+
+    assert (row['mail_status'], row['worker_id']) == ('F', None)
+    # The next scan does not send it again
+    assert not worker.queue_pending_mails('worker-0')
+    assert smtp_server.messages == []
+
+
+def test_transient_failure_leaves_the_row_for_the_next_scan(smtp_server, worker):
+    smtp_server.drop_data = 1
+    row = mail_built_row(worker)
+    assert (row['mail_status'], row['worker_id']) == ('N', None)
+
+    assert worker.queue_pending_mails('worker-0')
+    worker.mailer.flush()
+    assert worker.store.get(row['id'])['mail_status'] == 'Y'
+    assert len(smtp_server.messages) == 1